@@ -0,0 +1,298 @@
+import os
+import re
+import queue
+import random
+import logging
+import threading
+from time import sleep, monotonic
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.misc import load_object
+from twisted.internet.defer import DeferredSemaphore
+from twisted.internet.task import deferLater
+from twisted.internet.threads import deferToThread
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+except ImportError:  # Solo necesario si algún sitio activa el renderizado
+    webdriver = None
+
+# Valores por defecto; cada sitio puede cambiarlos en los "settings" de crawler_sites.json
+RENDER_POOL_SIZE = int(os.getenv("RENDER_POOL_SIZE", 2))
+# Cada navegador se cierra y se sustituye tras este número de páginas (Chrome va acumulando memoria)
+RENDER_MAX_PAGES = int(os.getenv("RENDER_MAX_PAGES", 50))
+# Espera adicional tras la carga para que terminen las peticiones de la propia página
+RENDER_WAIT_SECONDS = float(os.getenv("RENDER_WAIT_SECONDS", 0))
+# Por debajo de este número de caracteres de texto visible, una página con scripts se considera solo-JS
+RENDER_JS_MIN_TEXT = 200
+
+def chrome_driver(page_load_timeout=None, user_agent=None):
+    if webdriver is None:
+        raise RuntimeError("El renderizado de páginas necesita selenium (pip install selenium) y Chrome.")
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    if user_agent:
+        options.add_argument(f"--user-agent={user_agent}")
+    driver = webdriver.Chrome(service=Service(os.getenv("CHROMEDRIVER_PATH")), options=options)
+    if page_load_timeout:
+        driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+def set_user_agent(driver, user_agent):
+    """
+    Cambia el agente de usuario de un navegador ya abierto. Chrome lo permite por CDP; con otros drivers se
+    mantiene el de arranque.
+    """
+    if hasattr(driver, "execute_cdp_cmd"):
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": user_agent})
+
+class BrowserPool:
+    """
+    Pequeño conjunto de navegadores sin interfaz. No se arranca ninguno hasta la primera página que haya que
+    renderizar, como mucho hay `size` abiertos a la vez, y cada uno se recicla tras `max_pages` páginas.
+    `render` es bloqueante: se llama desde un hilo, nunca desde el reactor.
+    """
+    def __init__(self, size=None, max_pages=None, wait_seconds=None, driver_factory=None):
+        self.size = size or RENDER_POOL_SIZE
+        self.max_pages = max_pages or RENDER_MAX_PAGES
+        self.wait_seconds = RENDER_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self.driver_factory = driver_factory or chrome_driver
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.open = 0
+        self.rendered = 0
+        self.closed = False
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            can_start = self.open < self.size
+            if can_start:
+                self.open += 1
+        if not can_start:
+            return self.idle.get()
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self.lock:
+                self.open -= 1
+            raise
+        with self.lock:
+            self.started += 1
+        logging.info(f"Navegador iniciado ({self.open}/{self.size} abiertos)")
+        # Navegador, páginas renderizadas y agente de usuario aplicado
+        return [driver, 0, None]
+
+    def release(self, entry, broken=False):
+        if broken or self.closed or entry[1] >= self.max_pages:
+            self.discard(entry)
+        else:
+            self.idle.put(entry)
+
+    def discard(self, entry):
+        try:
+            entry[0].quit()
+        except Exception as e:
+            logging.error(f"Error al cerrar el navegador: {e}")
+        with self.lock:
+            self.open -= 1
+
+    def render(self, url, user_agent=None):
+        """
+        :param user_agent: Agente de usuario del sitio (los navegadores se comparten entre sitios).
+        :return: URL final (tras redirecciones) y HTML de la página ya renderizada.
+        """
+        entry = self.acquire()
+        try:
+            driver = entry[0]
+            if user_agent and user_agent != entry[2]:
+                set_user_agent(driver, user_agent)
+                entry[2] = user_agent
+            driver.get(url)
+            if self.wait_seconds:
+                sleep(self.wait_seconds)
+            result = driver.current_url, driver.page_source
+        except Exception:
+            self.release(entry, broken=True)
+            raise
+        entry[1] += 1
+        with self.lock:
+            self.rendered += 1
+        self.release(entry)
+        return result
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+        if self.started:
+            logging.info(f"Navegadores cerrados: {self.rendered} páginas renderizadas con {self.started} instancias")
+
+def looks_js_only(response, min_text=RENDER_JS_MIN_TEXT):
+    """
+    Página cuyo contenido lo genera JavaScript: apenas tiene texto visible pero sí scripts.
+    """
+    if not isinstance(response, HtmlResponse) or not response.css("script"):
+        return False
+    text = response.xpath(
+        "//body//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::noscript)]"
+    ).getall()
+    return len("".join(t.strip() for t in text)) < min_text
+
+class DynamicRenderingMiddleware:
+    """
+    Middleware de descarga que renderiza con un navegador solo las páginas que lo necesitan:
+        - las que piden `meta["render_js"] = True`,
+        - las URL que coinciden con RENDER_JS_PATTERNS (expresiones regulares del sitio),
+        - con RENDER_JS_DETECT, las que al descargarlas de forma normal resultan ser solo-JS.
+    Todo lo demás sigue por el descargador asíncrono de Scrapy. Se activa por sitio con RENDER_JS_ENABLED;
+    desactivado no se carga y no tiene coste. Los sitios de un mismo proceso comparten el conjunto de navegadores.
+    Las páginas renderizadas no pasan por las colas del descargador, así que el middleware aplica por su cuenta
+    la cortesía del sitio: como mucho CONCURRENT_REQUESTS_PER_DOMAIN a la vez por dominio, la espera entre
+    páginas del slot del descargador (DOWNLOAD_DELAY, ajustado por AUTOTHROTTLE) y el USER_AGENT del sitio.
+    En total, su concurrencia la limita RENDER_POOL_SIZE.
+    El tamaño y el reciclado del conjunto los fija el primer sitio que lo abre. RENDER_DRIVER_FACTORY permite
+    sustituir Chrome por otro navegador (una función sin argumentos que devuelve un driver de Selenium).
+    """
+    pool = None
+    users = 0
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.patterns = [re.compile(pattern) for pattern in settings.getlist("RENDER_JS_PATTERNS")]
+        self.detect = settings.getbool("RENDER_JS_DETECT")
+        self.min_text = settings.getint("RENDER_JS_MIN_TEXT", RENDER_JS_MIN_TEXT)
+        self.pool_settings = {
+            "size": settings.getint("RENDER_POOL_SIZE", RENDER_POOL_SIZE),
+            "max_pages": settings.getint("RENDER_MAX_PAGES", RENDER_MAX_PAGES),
+            "wait_seconds": settings.getfloat("RENDER_WAIT_SECONDS", RENDER_WAIT_SECONDS),
+            "page_load_timeout": settings.getfloat("DOWNLOAD_TIMEOUT"),
+        }
+        self.semaphore = None
+        # Cortesía del sitio (ver render_with_site_limits)
+        self.user_agent = settings.get("USER_AGENT")
+        self.delay = settings.getfloat("DOWNLOAD_DELAY")
+        if settings.getbool("AUTOTHROTTLE_ENABLED"):
+            self.delay = max(self.delay, settings.getfloat("AUTOTHROTTLE_START_DELAY", 5.0))
+        self.randomize_delay = settings.getbool("RANDOMIZE_DOWNLOAD_DELAY", True)
+        self.domain_concurrency = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN", 8)
+        self.domains = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("RENDER_JS_ENABLED"):
+            raise NotConfigured
+        if webdriver is None and not crawler.settings.get("RENDER_DRIVER_FACTORY"):
+            logging.warning("RENDER_JS_ENABLED sin selenium instalado: las páginas se descargarán sin renderizar.")
+            raise NotConfigured
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        cls = DynamicRenderingMiddleware
+        if cls.pool is None:
+            factory = self.crawler.settings.get("RENDER_DRIVER_FACTORY")
+            if isinstance(factory, str):
+                factory = load_object(factory)
+            page_load_timeout = self.pool_settings["page_load_timeout"]
+            user_agent = self.user_agent
+            cls.pool = BrowserPool(
+                self.pool_settings["size"],
+                self.pool_settings["max_pages"],
+                self.pool_settings["wait_seconds"],
+                factory or (lambda: chrome_driver(page_load_timeout, user_agent)),
+            )
+            cls.semaphore = DeferredSemaphore(cls.pool.size)
+        cls.users += 1
+        self.semaphore = cls.semaphore
+
+    def spider_closed(self, spider):
+        cls = DynamicRenderingMiddleware
+        cls.users -= 1
+        if cls.users == 0 and cls.pool is not None:
+            cls.pool.close()
+            cls.pool = None
+            cls.semaphore = None
+
+    def should_render(self, request):
+        if request.meta.get("rendered"):
+            return False
+        if request.meta.get("render_js"):
+            return True
+        return any(pattern.search(request.url) for pattern in self.patterns)
+
+    def domain_delay(self, slot_key):
+        """
+        Espera entre páginas de un dominio: la del slot del descargador si ya existe (DOWNLOAD_DELAY con la
+        variación aleatoria y los ajustes de AUTOTHROTTLE) o, si no, la configurada para el sitio.
+        """
+        slot = self.crawler.engine.downloader.slots.get(slot_key)
+        if slot is not None:
+            return slot.download_delay()
+        if self.randomize_delay:
+            return random.uniform(0.5 * self.delay, 1.5 * self.delay)
+        return self.delay
+
+    async def render_with_site_limits(self, request):
+        """
+        Renderiza respetando los límites del sitio por dominio y, después, el hueco en el conjunto de navegadores
+        compartido. Cada página reserva su turno antes de esperar, así que las páginas concurrentes de un
+        mismo dominio quedan separadas por la espera configurada.
+        """
+        from twisted.internet import reactor  # El reactor ya está instalado cuando se procesan peticiones
+
+        slot_key = self.crawler.engine.downloader.get_slot_key(request)
+        domain = self.domains.setdefault(slot_key, {"slots": DeferredSemaphore(self.domain_concurrency), "next_at": 0.0})
+        await maybe_deferred_to_future(domain["slots"].acquire())
+        try:
+            # El semáforo reserva el navegador antes de ocupar un hilo del reactor esperando por él
+            await maybe_deferred_to_future(self.semaphore.acquire())
+            try:
+                now = monotonic()
+                start_at = max(now, domain["next_at"])
+                domain["next_at"] = start_at + self.domain_delay(slot_key)
+                if start_at > now:
+                    await maybe_deferred_to_future(deferLater(reactor, start_at - now, lambda: None))
+                pool = DynamicRenderingMiddleware.pool
+                return await maybe_deferred_to_future(deferToThread(pool.render, request.url, self.user_agent))
+            finally:
+                self.semaphore.release()
+        finally:
+            domain["slots"].release()
+
+    async def process_request(self, request, spider=None):
+        if not self.should_render(request):
+            return None
+        try:
+            url, html = await self.render_with_site_limits(request)
+        except Exception as e:
+            logging.warning(f"No se pudo renderizar {request.url} ({e}); se descarga sin navegador.")
+            # Marcada como ya intentada para que la detección de páginas solo-JS no vuelva a enviarla aquí
+            request.meta["rendered"] = True
+            return None
+        request.meta["rendered"] = True
+        self.crawler.stats.inc_value("render_js/pages")
+        return HtmlResponse(url=url, body=html, encoding="utf-8", request=request, flags=["rendered"])
+
+    def process_response(self, request, response, spider=None):
+        if self.detect and not request.meta.get("rendered") and looks_js_only(response, self.min_text):
+            logging.info(f"Página solo-JS detectada, se renderiza: {request.url}")
+            self.crawler.stats.inc_value("render_js/detected")
+            return request.replace(meta={**request.meta, "render_js": True}, dont_filter=True)
+        return response
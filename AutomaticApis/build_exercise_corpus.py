@@ -0,0 +1,119 @@
+import os
+import re
+import json
+import logging
+from crawler_engine import load_site_configs, iter_saved_pages
+
+STRUCTURED_DATA_DIR = "structured_data"
+# Ruta que lee modules/exercise_index.py (EXERCISE_CORPUS_PATH)
+EXERCISE_CORPUS_FILE = os.path.join(STRUCTURED_DATA_DIR, "exercises.json")
+
+# Palabras clave (en URL, título y encabezados) de cada etiqueta del índice de ejercicios
+MUSCLE_KEYWORDS = {
+    "chest": ["chest", "pectoral", "pecs"],
+    "back": ["back", "lats", "latissimus", "trapezius", "traps", "rhomboid", "row"],
+    "shoulders": ["shoulder", "deltoid", "delts"],
+    "arms": ["biceps", "triceps", "forearm", "curl"],
+    "legs": ["quadriceps", "quads", "hamstring", "thigh", "squat", "lunge", "leg press"],
+    "glutes": ["glute", "hip thrust", "hip extension"],
+    "core": ["abdominal", "abs", "core", "oblique", "waist", "plank", "crunch"],
+    "calves": ["calf", "calves", "gastrocnemius", "soleus"],
+}
+EQUIPMENT_KEYWORDS = {
+    "barbell": ["barbell"],
+    "dumbbell": ["dumbbell"],
+    "kettlebell": ["kettlebell"],
+    "cable": ["cable"],
+    "machine": ["machine", "lever", "sled", "smith"],
+    "band": ["band"],
+    "pull_up_bar": ["pull-up", "pull up", "pullup", "chin-up", "chin up"],
+}
+DIFFICULTY_KEYWORDS = {
+    "beginner": ["beginner", "novice"],
+    "intermediate": ["intermediate"],
+    "advanced": ["advanced"],
+}
+# Frases del texto que marcan una contraindicación
+CONTRAINDICATION_KEYWORDS = {
+    "knee": ["knee pain", "knee injur"],
+    "lower_back": ["back pain", "lower back injur", "low back injur"],
+    "shoulder": ["shoulder pain", "shoulder injur", "impingement"],
+    "wrist": ["wrist pain", "wrist injur"],
+    "elbow": ["elbow pain", "elbow injur"],
+}
+
+def find_tags(text, keywords):
+    return [tag for tag, words in keywords.items() if any(re.search(rf"\b{re.escape(word)}", text) for word in words)]
+
+def page_to_exercise(page, source):
+    """
+    Convierte una página de ejercicio en un registro del corpus. Las etiquetas se deducen por palabras clave
+    de la URL, el título y los encabezados; la dificultad y las contraindicaciones, del texto de la página.
+    """
+    headings = page.get("headings") or {}
+    name = next(iter(headings.get("h1") or []), None) or page.get("title")
+    if not name:
+        return None
+    name = name.split("|")[0].strip()
+    url_words = re.sub(r"[/_\-]+", " ", page.get("url", ""))
+    labels = " ".join([url_words, name, *sum((headings.get(f"h{level}") or [] for level in range(1, 4)), [])]).lower()
+    text = " ".join(page.get("paragraphs") or []).lower()
+
+    muscle_groups = find_tags(labels, MUSCLE_KEYWORDS)
+    if not muscle_groups:
+        return None
+    equipment = find_tags(labels, EQUIPMENT_KEYWORDS) or ["bodyweight"]
+    difficulty = find_tags(labels + " " + text, DIFFICULTY_KEYWORDS)
+    return {
+        "name": name,
+        "muscle_groups": muscle_groups,
+        "equipment": equipment[0],
+        "difficulty": difficulty[0] if difficulty else "beginner",
+        "contraindications": find_tags(text, CONTRAINDICATION_KEYWORDS),
+        "source": source,
+        "url": page.get("url"),
+    }
+
+def build_exercise_corpus(output_file=EXERCISE_CORPUS_FILE, sites_file=None):
+    """
+    Genera el corpus de modules/exercise_index.py a partir de las páginas de ejercicios de los sitios que definen
+    `exercise_url_pattern` en crawler_sites.json. Si no hay ninguna, no se escribe nada y el índice sigue usando
+    su catálogo básico.
+
+    :return: Número de ejercicios guardados.
+    """
+    exercises = {}
+    for name, site in load_site_configs(sites_file).items():
+        pattern = site.get("exercise_url_pattern")
+        if not pattern:
+            continue
+        pattern = re.compile(pattern)
+        for page in iter_saved_pages(name):
+            if not pattern.search(page.get("url") or ""):
+                continue
+            exercise = page_to_exercise(page, name)
+            if not exercise:
+                continue
+            key = exercise["name"].lower()
+            if key in exercises:
+                # El mismo ejercicio en varios sitios: se combinan grupos musculares y contraindicaciones
+                previous = exercises[key]
+                previous["muscle_groups"] = sorted(set(previous["muscle_groups"]) | set(exercise["muscle_groups"]))
+                previous["contraindications"] = sorted(set(previous["contraindications"]) | set(exercise["contraindications"]))
+            else:
+                exercises[key] = exercise
+
+    if not exercises:
+        logging.warning("No se encontraron páginas de ejercicios; se conserva el corpus anterior (o el catálogo básico).")
+        return 0
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"exercises": list(exercises.values())}, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_file, output_file)
+    logging.info(f"Corpus de ejercicios guardado en {output_file} ({len(exercises)} ejercicios)")
+    return len(exercises)
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+    build_exercise_corpus()
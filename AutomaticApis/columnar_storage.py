@@ -0,0 +1,196 @@
+import os
+import operator
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow import fs as pafs
+    from pyarrow import ipc
+except ImportError:  # Solo necesario para los formatos columnares
+    pa = None
+
+# Formato de salida de structured_data: ndjson (por defecto), parquet o arrow (Arrow IPC / Feather v2)
+STRUCTURED_FORMAT = os.getenv("STRUCTURED_FORMAT", "ndjson").lower()
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+COLUMNAR_BATCH_SIZE = int(os.getenv("COLUMNAR_BATCH_SIZE", 10000))
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+FILTER_OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Los formatos parquet/arrow necesitan pyarrow (pip install pyarrow).")
+
+def is_columnar(path):
+    return path.endswith(tuple(COLUMNAR_FORMATS.values()))
+
+def format_of(path):
+    return "parquet" if path.endswith(".parquet") else "arrow"
+
+class ColumnarWriter:
+    """
+    Escribe registros (diccionarios) en Parquet o Arrow IPC por lotes de `batch_size`, sin mantener el
+    conjunto completo en memoria. El esquema se deduce del primer lote; las columnas que en él solo tienen
+    nulos se retrasan hasta ver un valor (como mucho unos pocos lotes) y, si no aparece, se guardan como texto.
+    """
+    MAX_PENDING_BATCHES = 10
+
+    def __init__(self, path, fmt=None, batch_size=None):
+        require_pyarrow()
+        self.path = path
+        self.fmt = fmt or format_of(path)
+        self.batch_size = batch_size or COLUMNAR_BATCH_SIZE
+        self.schema = None
+        self.writer = None
+        self.rows = []
+        self.pending = []
+        self.count = 0
+        self.tmp_path = path + ".tmp"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        if self.schema is not None:
+            self.write_rows(rows)
+            return
+        self.pending.append(rows)
+        schema = pa.Table.from_pylist([row for batch in self.pending for row in batch]).schema
+        if any(pa.types.is_null(field.type) for field in schema) and len(self.pending) < self.MAX_PENDING_BATCHES:
+            return
+        self.start(schema)
+
+    def start(self, schema=None):
+        rows = [row for batch in self.pending for row in batch]
+        self.pending = []
+        if schema is None:
+            schema = pa.Table.from_pylist(rows).schema
+        self.schema = pa.schema([
+            field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema
+        ])
+        if self.fmt == "parquet":
+            self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression=PARQUET_COMPRESSION)
+        else:
+            self.writer = ipc.new_file(self.tmp_path, self.schema)
+        if rows:
+            self.write_rows(rows)
+
+    def write_rows(self, rows):
+        try:
+            table = pa.Table.from_pylist(rows, schema=self.schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise RuntimeError(
+                f"Tipos incompatibles con el esquema de {self.path}: {str(e)}. "
+                "Declara el tipo del campo en mappings.json (\"type\")."
+            )
+        self.writer.write_table(table)
+        self.count += len(rows)
+
+    def close(self):
+        self.flush()
+        if self.schema is None:
+            # Pocos registros o columnas siempre nulas; sin registros queda un fichero vacío pero válido
+            self.start()
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def write_records(records, path, fmt=None, batch_size=None):
+    """
+    Guarda un iterable de registros en formato columnar.
+
+    :return: Número de registros escritos.
+    """
+    with ColumnarWriter(path, fmt, batch_size) as writer:
+        for record in records:
+            writer.add(record)
+    return writer.count
+
+def write_dataframe(frame, path, fmt=None):
+    """
+    Guarda un DataFrame de pandas (por ejemplo, una tabla de OpenSim) en formato columnar.
+    """
+    require_pyarrow()
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    tmp_path = path + ".tmp"
+    if (fmt or format_of(path)) == "parquet":
+        pq.write_table(table, tmp_path, compression=PARQUET_COMPRESSION)
+    else:
+        with ipc.new_file(tmp_path, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+def build_filter(filters):
+    """
+    Convierte filtros sencillos en una expresión de pyarrow.dataset:
+        [("calories", ">", 100), ("name", "in", ["apple", "pear"])]
+    Se combinan con AND. También acepta directamente una expresión de pyarrow.
+    """
+    if filters is None or isinstance(filters, ds.Expression):
+        return filters
+    expression = None
+    for column, op, value in filters:
+        field = ds.field(column)
+        if op == "in":
+            condition = field.isin(value)
+        elif op == "not in":
+            condition = ~field.isin(value)
+        elif op in FILTER_OPERATORS:
+            condition = FILTER_OPERATORS[op](field, value)
+        else:
+            raise ValueError(f"Operador de filtro no soportado: {op}")
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def open_dataset(path):
+    """
+    Abre un fichero (o un directorio de ficheros del mismo formato) con lectura por memoria mapeada.
+    """
+    require_pyarrow()
+    fmt = "parquet" if path.endswith(".parquet") or (os.path.isdir(path) and any(
+        name.endswith(".parquet") for name in os.listdir(path))) else "ipc"
+    return ds.dataset(os.path.abspath(path), format=fmt, filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+def read_columns(path, columns=None, filters=None):
+    """
+    Lee solo las columnas indicadas y las filas que cumplen `filters`. En Parquet los filtros se evalúan
+    con las estadísticas de cada grupo de filas, de modo que los grupos descartados ni se leen.
+
+    :return: Tabla de pyarrow (usar `.to_pandas()` o `.to_pylist()` según convenga).
+    """
+    return open_dataset(path).to_table(columns=columns, filter=build_filter(filters))
+
+def iter_records(path, columns=None, filters=None):
+    """
+    Recorre los registros como diccionarios lote a lote, sin cargar el fichero entero.
+    """
+    for batch in open_dataset(path).to_batches(columns=columns, filter=build_filter(filters)):
+        yield from batch.to_pylist()
@@ -0,0 +1,329 @@
+import os
+import json
+import sqlite3
+import logging
+import argparse
+from time import time
+from datetime import datetime
+import scrapy
+from scrapy.crawler import CrawlerProcess
+from scrapy.linkextractors import LinkExtractor
+from scrapy.utils.log import configure_logging
+from columnar_storage import STRUCTURED_FORMAT, COLUMNAR_FORMATS, write_records, iter_records
+
+SITES_FILE = os.getenv("CRAWLER_SITES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "crawler_sites.json"))
+VISITED_DB = os.getenv("CRAWLER_VISITED_DB", "visited_urls.db")
+# Las URL visitadas se confirman en SQLite por bloques en lugar de una a una
+VISITED_COMMIT_EVERY = 100
+CHUNK_SIZE = 100
+
+def load_site_configs(file_path=None):
+    """
+    Configuración de los sitios: ajustes comunes ("defaults") y, por sitio, URL de inicio, dominios, prefijo
+    válido, patrones excluidos y ajustes propios de Scrapy (cortesía, concurrencia, agente de usuario...).
+    """
+    with open(file_path or SITES_FILE, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    sites = {}
+    for name, site in config["sites"].items():
+        site = dict(site, name=name)
+        site["settings"] = {**config.get("defaults", {}), **site.get("settings", {})}
+        sites[name] = site
+    return sites
+
+class VisitedStore:
+    """
+    Registro de URL visitadas compartido por todos los sitios (una sola base SQLite con columna `site`).
+    Todos los spiders corren en el mismo reactor, así que una única conexión basta. Se mantiene una caché
+    en memoria por sitio y las inserciones se confirman por bloques.
+    """
+    def __init__(self, path=VISITED_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS visited (site TEXT NOT NULL, url TEXT NOT NULL, visited_at TEXT, PRIMARY KEY (site, url))"
+        )
+        self.conn.commit()
+        self.cache = {}
+        self.uncommitted = 0
+
+    def urls(self, site):
+        if site not in self.cache:
+            rows = self.conn.execute("SELECT url FROM visited WHERE site = ?", (site,))
+            self.cache[site] = {url for (url,) in rows}
+        return self.cache[site]
+
+    def is_visited(self, site, url):
+        return url in self.urls(site)
+
+    def add(self, site, url):
+        self.urls(site).add(url)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO visited (site, url, visited_at) VALUES (?, ?, ?)",
+            (site, url, datetime.now().isoformat()),
+        )
+        self.uncommitted += 1
+        if self.uncommitted >= VISITED_COMMIT_EVERY:
+            self.commit()
+
+    def reset(self, site):
+        self.conn.execute("DELETE FROM visited WHERE site = ?", (site,))
+        self.conn.commit()
+        self.cache[site] = set()
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+def clean_text(text_list):
+    return [
+        text.strip().replace("\n", " ").encode("ascii", "ignore").decode("ascii")
+        for text in text_list if text and text.strip()
+    ]
+
+def extract_headings(response):
+    headings = {}
+    try:
+        for level in range(1, 7):
+            headings[f"h{level}"] = clean_text(response.css(f"h{level}::text").getall())
+    except Exception as e:
+        logging.error(f"Error al extraer encabezados: {e}")
+    return headings
+
+def extract_tables(response):
+    tables = []
+    try:
+        for table in response.css("table"):
+            rows = []
+            for row in table.css("tr"):
+                cells = [
+                    {
+                        "text": clean_text([cell.css("::text").get()])[0] if cell.css("::text").get() else "",
+                        "html": cell.get()
+                    }
+                    for cell in row.css("td, th")
+                ]
+                rows.append(cells)
+            tables.append(rows)
+    except Exception as e:
+        logging.error(f"Error al extraer tablas: {e}")
+    return tables
+
+def extract_lists(response):
+    lists = {
+        "unordered": [],
+        "ordered": [],
+    }
+    try:
+        for ul in response.css("ul"):
+            lists["unordered"].append(clean_text(ul.css("li::text").getall()))
+        for ol in response.css("ol"):
+            lists["ordered"].append(clean_text(ol.css("li::text").getall()))
+    except Exception as e:
+        logging.error(f"Error al extraer listas: {e}")
+    return lists
+
+def extract_page(response):
+    """
+    Extracción común a todos los sitios: título, encabezados, párrafos, tablas y listas.
+    """
+    return {
+        "url": response.url,
+        "title": response.css("title::text").get(),
+        "headings": extract_headings(response),
+        "paragraphs": clean_text(response.css("p::text").getall()),
+        "tables": extract_tables(response),
+        "lists": extract_lists(response),
+    }
+
+class SiteSpider(scrapy.Spider):
+    """
+    Spider genérico: el sitio concreto lo fija `site` (ver make_spider_class). Cada sitio es un crawler
+    distinto dentro del mismo CrawlerProcess, con su propio downloader y sus propios límites de cortesía.
+    """
+    site = None
+    visited_store = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.start_time = time()
+        self.scraped_data = []
+        self.start_urls = self.site["start_urls"]
+        self.allowed_domains = self.site["allowed_domains"]
+        self.link_extractor = LinkExtractor(allow_domains=self.allowed_domains)
+        self.excluded_patterns = self.site.get("exclude_patterns", [])
+
+    @property
+    def visited(self):
+        if SiteSpider.visited_store is None:
+            SiteSpider.visited_store = VisitedStore()
+        return SiteSpider.visited_store
+
+    def parse(self, response):
+        logging.info(f"Scraping {response.url}")
+        if self.visited.is_visited(self.name, response.url):
+            # Sus datos ya están guardados, pero se siguen sus enlaces para llegar a las páginas nuevas
+            logging.info(f"URL ya procesada: {response.url}")
+        else:
+            self.visited.add(self.name, response.url)
+            try:
+                page_data = extract_page(response)
+                if not page_data["tables"] and not page_data["lists"] and not page_data["paragraphs"]:
+                    logging.warning(f"La página {response.url} no contiene datos útiles.")
+                self.scraped_data.append(page_data)
+            except Exception as e:
+                logging.error(f"Error inesperado al procesar {response.url}: {e}")
+
+        # Dentro de una ejecución, el filtro de duplicados de Scrapy evita pedir dos veces la misma URL
+        for link in self.link_extractor.extract_links(response):
+            if self.is_valid_url(link.url):
+                yield scrapy.Request(link.url, callback=self.parse)
+
+    def is_valid_url(self, url):
+        return (
+            url.startswith(self.site["url_prefix"]) and
+            not any(pattern in url for pattern in self.excluded_patterns)
+        )
+
+    def closed(self, reason):
+        elapsed_time = time() - self.start_time
+        logging.info(f"[{self.name}] Scraping completado en {elapsed_time:.2f} segundos ({len(self.scraped_data)} páginas). Guardando datos...")
+        self.visited.commit()
+        if not self.scraped_data:
+            # Todas las URL estaban ya visitadas: se conserva la salida de la ejecución anterior
+            logging.info(f"[{self.name}] Sin páginas nuevas; no se sobrescriben los datos guardados.")
+            return
+        try:
+            save_scraped_data(self.name, self.scraped_data)
+        except Exception as e:
+            logging.error(f"[{self.name}] Error al guardar los datos: {e}")
+
+def iter_saved_pages(name):
+    """
+    Páginas guardadas de un sitio (`<sitio>_final_data` en JSON o columnar). Si hay salidas en varios formatos,
+    se lee primero la del formato actual (STRUCTURED_FORMAT).
+    """
+    current = COLUMNAR_FORMATS.get(STRUCTURED_FORMAT, ".json")
+    for ext in [current] + [ext for ext in (*COLUMNAR_FORMATS.values(), ".json") if ext != current]:
+        path = f"{name}_final_data{ext}"
+        if not os.path.exists(path):
+            continue
+        if ext == ".json":
+            with open(path, "r", encoding="utf-8") as f:
+                yield from json.load(f).get("data", [])
+        else:
+            yield from iter_records(path)
+        return
+
+def save_scraped_data(name, pages):
+    """
+    Salida común de todos los sitios: `<sitio>_final_data.json` más los bloques `<sitio>_data_part_N.json` o,
+    con STRUCTURED_FORMAT=parquet/arrow, un único fichero columnar. Las páginas nuevas se combinan con las
+    guardadas en ejecuciones anteriores (por URL; la versión nueva sustituye a la anterior).
+    """
+    merged = {page["url"]: page for page in iter_saved_pages(name)}
+    previous = len(merged)
+    merged.update((page["url"], page) for page in pages)
+    pages = list(merged.values())
+    logging.info(f"[{name}] {len(pages) - previous} páginas nuevas, {len(pages)} en total")
+    if STRUCTURED_FORMAT in COLUMNAR_FORMATS:
+        # Una fila por página; las columnas anidadas (encabezados, tablas, listas) se guardan como tipos anidados de Arrow
+        output_path = os.path.join(os.getcwd(), f"{name}_final_data{COLUMNAR_FORMATS[STRUCTURED_FORMAT]}")
+        write_records(pages, output_path, STRUCTURED_FORMAT)
+        logging.info(f"Datos guardados en {output_path}")
+        return
+    output_data = {
+        "scraped_at": datetime.now().isoformat(),
+        "total_pages": len(pages),
+        "data": pages,
+    }
+    output_path = os.path.join(os.getcwd(), f"{name}_final_data.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=4, ensure_ascii=False)
+    logging.info(f"Datos guardados en {output_path}")
+    for i in range(0, len(pages), CHUNK_SIZE):
+        chunk_path = os.path.join(os.getcwd(), f"{name}_data_part_{i // CHUNK_SIZE + 1}.json")
+        with open(chunk_path, "w", encoding="utf-8") as f:
+            json.dump(pages[i:i + CHUNK_SIZE], f, indent=4, ensure_ascii=False)
+        logging.info(f"Chunk guardado en {chunk_path}")
+
+def make_spider_class(site):
+    """
+    Crea la clase de spider de un sitio. Los ajustes por sitio van en `custom_settings`, que Scrapy aplica a
+    cada crawler por separado (DOWNLOAD_DELAY, CONCURRENT_REQUESTS, AUTOTHROTTLE_*, USER_AGENT...).
+    """
+    return type(site.get("spider_class", f"{site['name'].capitalize()}Spider"), (SiteSpider,), {
+        "name": site["name"],
+        "site": site,
+        "custom_settings": dict(site["settings"]),
+    })
+
+def run_crawl(site_names=None, sites_file=None, fresh=False):
+    """
+    Lanza los sitios indicados (por defecto, todos) en un único CrawlerProcess: comparten reactor y se
+    ejecutan a la vez, de modo que el total dura aproximadamente lo que el sitio más lento.
+
+    :param fresh: Olvida las URL visitadas de esos sitios antes de empezar.
+    :return: Diccionario sitio -> {"pages", "seconds", "finish_reason"}.
+    """
+    sites = load_site_configs(sites_file)
+    unknown = set(site_names or []) - set(sites)
+    if unknown:
+        raise ValueError(f"Sitios no configurados: {', '.join(sorted(unknown))}")
+    selected = [sites[name] for name in (site_names or sites)]
+
+    if fresh:
+        store = SiteSpider.visited_store or VisitedStore()
+        SiteSpider.visited_store = store
+        for site in selected:
+            store.reset(site["name"])
+
+    start = time()
+    process = CrawlerProcess()
+    crawlers = []
+    for site in selected:
+        crawler = process.create_crawler(make_spider_class(site))
+        crawlers.append(crawler)
+        process.crawl(crawler)
+    process.start()
+
+    summary = {}
+    for crawler in crawlers:
+        spider = crawler.spider
+        summary[spider.name] = {
+            "pages": len(spider.scraped_data),
+            "seconds": round(crawler.stats.get_value("elapsed_time_seconds", 0), 1),
+            "finish_reason": crawler.stats.get_value("finish_reason"),
+        }
+    if SiteSpider.visited_store is not None:
+        SiteSpider.visited_store.close()
+        SiteSpider.visited_store = None
+    for name, stats in summary.items():
+        logging.info(f"[{name}] {stats['pages']} páginas en {stats['seconds']} s ({stats['finish_reason']})")
+    logging.info(f"Crawl completado en {time() - start:.1f} s ({len(selected)} sitios)")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawler de los sitios de ejercicio y salud configurados en crawler_sites.json.")
+    parser.add_argument("sites", nargs="*", help="Sitios a recorrer (por defecto, todos)")
+    parser.add_argument("--sites-file", help="Fichero de configuración de sitios")
+    parser.add_argument("--fresh", action="store_true", help="Ignora las URL visitadas en ejecuciones anteriores")
+    args = parser.parse_args(argv)
+
+    configure_logging(install_root_handler=False)
+    logging.basicConfig(
+        handlers=[
+            logging.FileHandler("crawler_info.log", mode="a"),
+            logging.StreamHandler()
+        ],
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    run_crawl(args.sites or None, args.sites_file, args.fresh)
+
+if __name__ == "__main__":
+    main()
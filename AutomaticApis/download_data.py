@@ -1,47 +1,346 @@
 import os
+import re
+import gzip
 import json
+import time
+import random
+import hashlib
+import tempfile
+import threading
 import requests
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv()
 
 CONFIG_FILE = "config/apis_config.json"
 RAW_DATA_DIR = "raw_data"
+FETCH_STATE_FILE = os.path.join(RAW_DATA_DIR, ".fetch_state.json")
+
+MAX_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 8))
+PER_HOST_LIMIT = int(os.getenv("DOWNLOAD_PER_HOST_LIMIT", 2))
+CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", 60))
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024
+# Guarda los ficheros crudos comprimidos (.json.gz)
+COMPRESS_RAW = os.getenv("DOWNLOAD_GZIP", "false").lower() == "true"
+
+ENV_PATTERN = re.compile(r"\$\{(\w+)\}")
+
+_host_limits = {}
+_host_limits_lock = threading.Lock()
+_fetch_state_lock = threading.Lock()
+
 
 def load_config(file_path):
     with open(file_path, "r") as f:
         return json.load(f)
 
 def replace_env_variables(params):
-    for key, value in params.items():
-        if isinstance(value, str) and value.startswith("${"):
-            env_var = value[2:-1]
-            params[key] = os.getenv(env_var)
-    return params
+    """
+    Sustituye las referencias ${VARIABLE} por su valor en el entorno, también dentro de textos
+    (por ejemplo, "token ${GITHUB_API_KEY}" o una URL base).
+    """
+    def expand(value):
+        if not isinstance(value, str):
+            return value
+        if ENV_PATTERN.fullmatch(value):
+            return os.getenv(value[2:-1])
+        return ENV_PATTERN.sub(lambda m: os.getenv(m.group(1), ""), value)
+
+    if isinstance(params, str):
+        return expand(params)
+    return {key: expand(value) for key, value in params.items()}
+
+def create_session():
+    """
+    Sesión HTTP compartida por todos los hilos, con un pool de conexiones reutilizables por host.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def host_limit(url):
+    host = urlsplit(url).netloc
+    with _host_limits_lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+        return _host_limits[host]
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Espera exponencial con jitter completo; respeta Retry-After si el servidor lo indica en segundos.
+    """
+    if retry_after and retry_after.isdigit():
+        return min(BACKOFF_MAX, float(retry_after))
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def load_fetch_state():
+    """
+    Validadores (ETag / Last-Modified) y ficheros de cada página descargada en la ejecución anterior.
+    """
+    if not os.path.exists(FETCH_STATE_FILE):
+        return {}
+    with open(FETCH_STATE_FILE, "r") as f:
+        return json.load(f)
+
+def save_fetch_state(state):
+    tmp_file = FETCH_STATE_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, FETCH_STATE_FILE)
+
+def open_raw(path, binary=False):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb") if binary else gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "rb") if binary else open(path, "r", encoding="utf-8")
+
+def read_raw(path):
+    with open_raw(path) as f:
+        return json.load(f)
+
+def raw_file_path(api_name, page_number, paginated):
+    suffix = f".p{page_number + 1:04d}" if paginated else ""
+    extension = ".json.gz" if COMPRESS_RAW else ".json"
+    return os.path.join(RAW_DATA_DIR, f"{api_name.lower()}{suffix}{extension}")
+
+def write_body(response, target):
+    """
+    Copia el cuerpo de la respuesta al disco por bloques, sin cargarlo entero en memoria. Se escribe en
+    un fichero temporal que sustituye al destino solo cuando la descarga termina bien.
+    """
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            out = gzip.GzipFile(fileobj=raw, mode="wb") if target.endswith(".gz") else raw
+            with out:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    out.write(chunk)
+        os.replace(tmp_file, target)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+def request_with_retries(session, method, url, headers, params, target):
+    """
+    Descarga `url` en `target`. Devuelve la respuesta ya cerrada (cabeceras disponibles); si el
+    servidor contesta 304 el fichero existente no se toca.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        retry_after = None
+        try:
+            with host_limit(url):
+                response = session.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    params=params,
+                    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                    stream=True
+                )
+                with response:
+                    if response.status_code == 304:
+                        return response
+                    if response.status_code not in RETRY_STATUS:
+                        response.raise_for_status()
+                        write_body(response, target)
+                        return response
+                    retry_after = response.headers.get("Retry-After")
+                    error = requests.HTTPError(f"{response.status_code} para {url}", response=response)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            error = e
+
+        print(f"Intento {attempt + 1} fallido: {error}")
+        if attempt == MAX_ATTEMPTS - 1:
+            raise error
+        time.sleep(backoff_delay(attempt, retry_after))
+
+def lookup_key(payload, dotted_key):
+    for key in dotted_key.split("."):
+        payload = payload.get(key) if isinstance(payload, dict) else None
+    return payload
+
+def extract_items(payload, results_key):
+    if results_key:
+        payload = lookup_key(payload, results_key)
+    return payload if isinstance(payload, list) else None
+
+def request_key(url, params):
+    # Huella de la petición (sin guardar claves de API en claro) para saber si los validadores siguen valiendo
+    return hashlib.sha1(json.dumps([url, params], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def fetch_pages(session, api_name, api_config, previous_pages):
+    """
+    Descarga las páginas de una fuente según su configuración de paginación:
+        "pagination": {"type": "page", "param": "pageNumber", "start": 1, "max_pages": 10, "results_key": "foods"}
+        "pagination": {"type": "offset", "param": "offset", "size_param": "number", "size": 50, "max_pages": 10}
+        "pagination": {"type": "link", "next_key": "links.next", "max_pages": 10}
+    "link" sigue la cabecera Link (rel="next") o, si se indica, la URL en `next_key` de la respuesta.
+    La descarga se detiene al llegar a `max_pages` o a una página sin resultados. Con "offset" sin `size`, el
+    desplazamiento avanza el número de resultados de cada página; si no se pueden contar, se detiene.
+    Cada página se pide con If-None-Match / If-Modified-Since si ya se descargó antes; un 304 reutiliza
+    el fichero existente.
+
+    :return: Tupla (entradas de estado de cada página, si alguna página cambió).
+    """
+    pagination = api_config.get("pagination") or {}
+    kind = pagination.get("type")
+    max_pages = pagination.get("max_pages", 1 if not kind else 100)
+    results_key = pagination.get("results_key")
+
+    method = api_config.get("method", "GET")
+    url = replace_env_variables(api_config["url"])
+    headers = replace_env_variables(api_config.get("headers", {}))
+    params = replace_env_variables(api_config.get("params", {}))
+    size = pagination.get("size")
+    if kind == "offset" and pagination.get("size_param") and size:
+        params[pagination["size_param"]] = size
+
+    pages = []
+    changed = False
+    offset = pagination.get("start", 0)
+    for page_number in range(max_pages):
+        if kind == "page":
+            params[pagination.get("param", "page")] = pagination.get("start", 1) + page_number
+        elif kind == "offset":
+            params[pagination.get("param", "offset")] = offset
+
+        target = raw_file_path(api_name, page_number, bool(kind))
+        key = request_key(url, params)
+        cached = previous_pages[page_number] if page_number < len(previous_pages) else None
+        if not (cached and cached.get("key") == key and cached.get("file") == target and os.path.exists(target)):
+            cached = None
+
+        request_headers = dict(headers)
+        if cached and cached.get("etag"):
+            request_headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            request_headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = request_with_retries(session, method, url, request_headers, params, target)
+        if response.status_code == 304:
+            entry = cached
+        else:
+            changed = True
+            entry = {
+                "key": key,
+                "file": target,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            if kind:
+                # Solo las fuentes paginadas necesitan leer la página para decidir si seguir
+                payload = read_raw(target)
+                items = extract_items(payload, results_key)
+                entry["items"] = None if items is None else len(items)
+                if kind == "link":
+                    next_url = response.links.get("next", {}).get("url")
+                    if pagination.get("next_key"):
+                        next_url = lookup_key(payload, pagination["next_key"])
+                    entry["next"] = next_url
+                del payload
+        pages.append(entry)
+
+        if not kind or entry.get("items") == 0:
+            break
+        if kind == "offset":
+            step = size or entry.get("items")
+            if not step:
+                # Sin "size" ni resultados reconocibles (results_key) el desplazamiento no avanzaría
+                print(f"{api_name}: paginación por desplazamiento sin 'size' ni resultados reconocibles; se detiene en la página {page_number + 1}.")
+                break
+            offset += step
+        if kind == "link":
+            if not entry.get("next"):
+                break
+            url, params = entry["next"], {}
+    return pages, changed
+
+def remove_stale_files(api_name, keep):
+    """
+    Borra páginas de una descarga anterior que ya no forman parte de la fuente (menos páginas, o
+    cambio entre .json y .json.gz).
+    """
+    for file_name in os.listdir(RAW_DATA_DIR):
+        path = os.path.join(RAW_DATA_DIR, file_name)
+        if file_name.split(".")[0] != api_name.lower() or path in keep:
+            continue
+        if file_name.endswith(".json") or file_name.endswith(".json.gz"):
+            os.remove(path)
+
+def download_source(session, api_name, api_config, state):
+    print(f"Descargando datos de {api_name}...")
+    start = time.perf_counter()
+    previous_pages = state.get(api_name, {}).get("pages", [])
+
+    pages, changed = fetch_pages(session, api_name, api_config, previous_pages)
+    files = [page["file"] for page in pages]
+    remove_stale_files(api_name, set(files))
+
+    with _fetch_state_lock:
+        state[api_name] = {
+            "results_key": (api_config.get("pagination") or {}).get("results_key"),
+            "pages": pages,
+        }
+        save_fetch_state(state)
+
+    elapsed = time.perf_counter() - start
+    if changed:
+        print(f"Datos guardados: {', '.join(files)} ({len(pages)} páginas, {elapsed:.1f} s)")
+    else:
+        print(f"{api_name} sin cambios desde la última descarga ({elapsed:.1f} s)")
+    return changed
+
+def downloadable_sources(config):
+    """
+    Fuentes HTTP descargables: se omiten las entradas sin URL (Kaggle, OpenSim, extractores) y
+    las URL con plantillas sin resolver (por ejemplo, {barcode}).
+    """
+    sources = {}
+    for api_name, api_config in config.items():
+        url = api_config.get("url")
+        if not url:
+            continue
+        if re.search(r"\{\w+\}", ENV_PATTERN.sub("", url)):
+            print(f"Omitiendo {api_name}: la URL requiere parámetros ({url}).")
+            continue
+        sources[api_name] = api_config
+    return sources
 
 def download_data():
     os.makedirs(RAW_DATA_DIR, exist_ok=True)
     config = load_config(CONFIG_FILE)
+    sources = downloadable_sources(config)
 
-    for api_name, api_config in config.items():
-        print(f"Descargando datos de {api_name}...")
-        for attempt in range(3):
+    state = load_fetch_state()
+    start = time.perf_counter()
+    failures = {}
+    unchanged = 0
+    session = create_session()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(download_source, session, api_name, api_config, state): api_name
+            for api_name, api_config in sources.items()
+        }
+        for future in as_completed(futures):
+            api_name = futures[future]
             try:
-                params = replace_env_variables(api_config["params"])
-                response = requests.request(
-                    method=api_config["method"],
-                    url=api_config["url"],
-                    headers=api_config["headers"],
-                    params=params
-                )
-                response.raise_for_status()
-                
-                raw_file = os.path.join(RAW_DATA_DIR, f"{api_name.lower()}.json")
-                with open(raw_file, "w") as f:
-                    json.dump(response.json(), f, indent=4)
-                print(f"Datos guardados: {raw_file}")
-                break
+                if not future.result():
+                    unchanged += 1
             except Exception as e:
-                print(f"Intento {attempt + 1} fallido: {e}")
-                if attempt == 2:
-                    raise
+                print(f"Error descargando {api_name}: {e}")
+                failures[api_name] = e
+    session.close()
+
+    print(f"Descarga completada en {time.perf_counter() - start:.1f} s ({len(sources) - len(failures)}/{len(sources)} fuentes, {unchanged} sin cambios)")
+    if failures:
+        raise RuntimeError(f"Fallaron las descargas de: {', '.join(sorted(failures))}")
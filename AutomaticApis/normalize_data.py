@@ -1,41 +1,464 @@
 import os
+import re
 import json
+import time
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from download_data import load_fetch_state, open_raw, read_raw, extract_items
+from columnar_storage import STRUCTURED_FORMAT, COLUMNAR_FORMATS, is_columnar, iter_records, write_records
+
+try:
+    import ijson
+except ImportError:  # El normalizador recurre a un lector incremental propio basado en json.JSONDecoder
+    ijson = None
 
 RAW_DATA_DIR = "raw_data"
 STRUCTURED_DATA_DIR = "structured_data"
 MAPPINGS_FILE = "config/mappings.json"
+CHUNK_SIZE = 64 * 1024
+# Procesos para normalizar en paralelo (1 = en este mismo proceso)
+NORMALIZE_WORKERS = int(os.getenv("NORMALIZE_WORKERS", 1))
+# Los ficheros NDJSON sin comprimir mayores que esto se reparten en trozos por rango de bytes
+NORMALIZE_CHUNK_BYTES = int(float(os.getenv("NORMALIZE_CHUNK_MB", 256)) * 1024 * 1024)
+STRUCTURED_EXTENSIONS = {"ndjson": ".ndjson", **COLUMNAR_FORMATS}
+RAW_EXTENSIONS = (".json", ".json.gz", ".ndjson", ".ndjson.gz", ".jsonl", ".jsonl.gz")
+NDJSON_EXTENSIONS = (".ndjson", ".ndjson.gz", ".jsonl", ".jsonl.gz")
+
+_SEPARATORS = re.compile(r"[\s,]*")
 
 def load_mappings(file_path):
     with open(file_path, "r") as f:
         return json.load(f)
 
-def normalize_record(record, mapping):
-    normalized = {}
-    for key, path in mapping.items():
-        keys = path.split(".")
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "si", "sí")
+    return bool(value)
+
+TYPE_COERCIONS = {
+    "str": str,
+    "int": lambda value: int(float(value)),
+    "float": float,
+    "bool": _to_bool,
+}
+
+# Factores multiplicativos para "convert"
+UNIT_CONVERSIONS = {
+    "kj_to_kcal": 1 / 4.184,
+    "kcal_to_kj": 4.184,
+    "g_to_mg": 1000.0,
+    "mg_to_g": 0.001,
+    "mcg_to_mg": 0.001,
+    "oz_to_g": 28.349523125,
+    "lb_to_kg": 0.45359237,
+}
+
+_PATH_PART = re.compile(r"([^\[\]]*)((?:\[\d+\])*)")
+
+def parse_path(path):
+    """
+    Convierte "foodNutrients[0].value" en la secuencia de accesos ["foodNutrients", 0, "value"].
+    """
+    steps = []
+    for part in path.split("."):
+        match = _PATH_PART.fullmatch(part)
+        if not match:
+            raise ValueError(f"Ruta de mapeo no válida: {path}")
+        key, indexes = match.groups()
+        if key:
+            steps.append(key)
+        steps.extend(int(index) for index in re.findall(r"\d+", indexes))
+    return steps
+
+def compile_path(path):
+    """
+    Compila una ruta en una función de acceso. Una clave o índice inexistente (incluido un índice fuera de
+    rango) devuelve None en lugar de lanzar una excepción.
+    """
+    steps = parse_path(path)
+    if len(steps) == 1 and isinstance(steps[0], str):
+        key = steps[0]
+        return lambda record: record.get(key) if isinstance(record, dict) else None
+
+    def getter(record):
         value = record
-        for k in keys:
-            if "[" in k:
-                k, index = k[:-1].split("[")
-                value = value.get(k, [])[int(index)]
-            else:
-                value = value.get(k)
+        for step in steps:
+            try:
+                value = value[step]
+            except (KeyError, IndexError, TypeError):
+                return None
             if value is None:
+                return None
+        return value
+    return getter
+
+def compile_field(spec):
+    """
+    Compila la definición de un campo de mappings.json. Puede ser una ruta o un objeto:
+        "calories": "foodNutrients[0].value"
+        "energy_kcal": {"path": "nutrients.ENERC_KJ", "type": "float", "convert": "kj_to_kcal", "default": 0}
+        "protein_mg": {"path": "foodNutrients[1].amount", "type": "float", "scale": 1000}
+    `type` es str, int, float o bool; `convert` es una de UNIT_CONVERSIONS y `scale` un factor libre.
+    Si el valor no existe o no se puede convertir se usa `default` (None si no se indica).
+    """
+    if isinstance(spec, str):
+        return compile_path(spec)
+
+    getter = compile_path(spec["path"])
+    default = spec.get("default")
+    coerce = TYPE_COERCIONS.get(spec["type"]) if "type" in spec else None
+    if "type" in spec and coerce is None:
+        raise ValueError(f"Tipo no soportado en el mapeo: {spec['type']}")
+    if "convert" in spec and spec["convert"] not in UNIT_CONVERSIONS:
+        raise ValueError(f"Conversión no soportada en el mapeo: {spec['convert']}")
+    factor = UNIT_CONVERSIONS[spec["convert"]] if "convert" in spec else 1.0
+    factor *= spec.get("scale", 1.0)
+
+    if coerce is None and factor == 1.0:
+        def field(record):
+            value = getter(record)
+            return default if value is None else value
+        return field
+
+    def field(record):
+        value = getter(record)
+        if value is None:
+            return default
+        try:
+            if coerce is not None:
+                value = coerce(value)
+            if factor != 1.0:
+                value = value * factor
+        except (TypeError, ValueError):
+            return default
+        return value
+    return field
+
+def compile_mapping(mapping):
+    """
+    Compila un mapeo completo una sola vez; la función resultante se aplica a cada registro.
+    """
+    fields = [(name, compile_field(spec)) for name, spec in mapping.items()]
+
+    def normalize(record):
+        return {name: field(record) for name, field in fields}
+    return normalize
+
+def normalize_record(record, mapping):
+    # Para un único registro; en bucles se debe reutilizar compile_mapping(mapping)
+    return compile_mapping(mapping)(record)
+
+def raw_files_by_source():
+    """
+    Agrupa los ficheros crudos por fuente: una fuente paginada se guarda en varias páginas
+    (`usda.p0001.json`, `usda.p0002.json`...), cualquiera puede estar comprimida (.json.gz) y los
+    volcados masivos pueden venir en NDJSON (.ndjson / .jsonl).
+    """
+    sources = {}
+    for file_name in sorted(os.listdir(RAW_DATA_DIR)):
+        path = os.path.join(RAW_DATA_DIR, file_name)
+        if file_name.startswith(".") or not os.path.isfile(path):
+            continue
+        if not file_name.endswith(RAW_EXTENSIONS):
+            continue
+        sources.setdefault(file_name.split(".")[0], []).append(path)
+    return sources
+
+def iter_json_array(f):
+    """
+    Recorre los elementos de un array JSON de primer nivel leyendo el fichero por bloques, sin cargarlo
+    entero: la memoria depende del tamaño de cada registro, no del fichero.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos = "", 0
+    started = eof = False
+    read_size = CHUNK_SIZE
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Se esperaba un array JSON")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            # Un valor que llega justo al final del bloque puede estar cortado (por ejemplo, un número)
+            if end is not None and (end < len(buffer) or eof):
+                yield record
+                pos = end
+                read_size = CHUNK_SIZE
+                continue
+        if eof:
+            raise ValueError("JSON incompleto o mal formado")
+        chunk = f.read(read_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        # Registros mayores que el bloque: se duplica la lectura para no re-analizar en bucle
+        read_size = max(CHUNK_SIZE, len(buffer))
+
+def first_char(path):
+    with open_raw(path) as f:
+        while True:
+            chunk = f.read(1024)
+            if not chunk:
+                return ""
+            stripped = chunk.lstrip()
+            if stripped:
+                return stripped[0]
+
+def iter_raw_records(paths, results_key=None):
+    """
+    Registros de los ficheros crudos de una fuente, leídos de forma incremental. El NDJSON se lee por líneas; los arrays de primer
+    nivel se recorren siempre en streaming; los objetos con `results_key` solo si `ijson` está instalado
+    (si no, se cargan enteros), y cualquier otro objeto cuenta como un único registro.
+    """
+    for path in paths:
+        if path.endswith(NDJSON_EXTENSIONS):
+            with open_raw(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        elif first_char(path) == "[":
+            if ijson:
+                with open_raw(path, binary=True) as f:
+                    yield from ijson.items(f, "item", use_float=True)
+            else:
+                with open_raw(path) as f:
+                    yield from iter_json_array(f)
+        elif results_key and ijson:
+            with open_raw(path, binary=True) as f:
+                yield from ijson.items(f, f"{results_key}.item", use_float=True)
+        else:
+            payload = read_raw(path)
+            items = extract_items(payload, results_key)
+            yield from items if items is not None else [payload]
+
+def iter_structured_records(path, columns=None, filters=None):
+    """
+    Registros de un fichero de `structured_data`, línea a línea en NDJSON (o el JSON con lista de versiones
+    anteriores). En Parquet / Arrow se leen por lotes y admiten `columns` y `filters` (ver columnar_storage).
+    """
+    if is_columnar(path):
+        yield from iter_records(path, columns, filters)
+        return
+    if not path.endswith(".ndjson"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_ndjson_range(path, start, end):
+    """
+    Registros de un NDJSON cuya línea empieza en [start, end). Los trozos contiguos no se solapan: la línea
+    que cruza `start` pertenece al trozo anterior.
+    """
+    with open(path, "rb") as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
                 break
-        normalized[key] = value
-    return normalized
+            pos += len(line)
+            if line.strip():
+                yield json.loads(line)
+
+def write_ndjson(records, normalize, output_path):
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    count = 0
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        write = out.write
+        for record in records:
+            write(dumps(normalize(record)) + "\n")
+            count += 1
+    os.replace(tmp_path, output_path)
+    return count
+
+def normalize_source(paths, mapping, results_key, output_path):
+    """
+    Normaliza los ficheros de una fuente y escribe el resultado registro a registro, en NDJSON o en
+    Parquet / Arrow según la extensión de `output_path`.
+
+    :return: Número de registros escritos.
+    """
+    normalize = compile_mapping(mapping)
+    if is_columnar(output_path):
+        return write_records((normalize(record) for record in iter_raw_records(paths, results_key)), output_path)
+    return write_ndjson(iter_raw_records(paths, results_key), normalize, output_path)
+
+_compiled_mappings = {}
+
+def normalize_part(task):
+    """
+    Normaliza una parte (un fichero o un rango de bytes de un NDJSON) en un fichero parcial. Se ejecuta en
+    los procesos del pool; los errores se devuelven en el resultado para no afectar al resto de partes.
+    """
+    start = time.perf_counter()
+    result = {"source": task["source"], "part": task["part"], "path": task["path"], "output": task["output"], "pid": os.getpid(), "records": 0, "error": None}
+    try:
+        key = json.dumps(task["mapping"], sort_keys=True)
+        if key not in _compiled_mappings:
+            _compiled_mappings[key] = compile_mapping(task["mapping"])
+        if task["range"]:
+            records = iter_ndjson_range(task["path"], *task["range"])
+        else:
+            records = iter_raw_records([task["path"]], task["results_key"])
+        result["records"] = write_ndjson(records, _compiled_mappings[key], task["output"])
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {str(e)}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def plan_parts(source, paths, mapping, results_key, parts_dir, chunk_bytes=None):
+    chunk_bytes = chunk_bytes or NORMALIZE_CHUNK_BYTES
+    tasks = []
+    for path in paths:
+        ranges = [None]
+        # Solo el NDJSON sin comprimir admite saltar a un offset y empezar en un límite de registro
+        if path.endswith((".ndjson", ".jsonl")) and os.path.getsize(path) > chunk_bytes:
+            size = os.path.getsize(path)
+            ranges = [(offset, min(offset + chunk_bytes, size)) for offset in range(0, size, chunk_bytes)]
+        for byte_range in ranges:
+            part = len(tasks)
+            tasks.append({
+                "source": source,
+                "part": part,
+                "path": path,
+                "range": byte_range,
+                "mapping": mapping,
+                "results_key": results_key,
+                "output": os.path.join(parts_dir, f"{source}.{part:05d}.ndjson"),
+            })
+    return tasks
 
-def normalize_data():
+def merge_parts(results, output_path):
+    """
+    Une las partes de una fuente en su orden original y sustituye la salida de una sola vez. Si la salida es
+    Parquet / Arrow, las partes (NDJSON) se convierten por lotes al unirlas.
+    """
+    parts = [result["output"] for result in sorted(results, key=lambda r: r["part"])]
+    if is_columnar(output_path):
+        write_records((record for part in parts for record in iter_structured_records(part)), output_path)
+        return
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        for part_path in parts:
+            with open(part_path, "rb") as part:
+                shutil.copyfileobj(part, out, CHUNK_SIZE * 16)
+    os.replace(tmp_path, output_path)
+
+def normalize_sources(sources, mappings_by_source, results_keys, output_dir, workers=None, chunk_bytes=None, output_format=None):
+    """
+    Normaliza varias fuentes repartiendo ficheros (y trozos de ficheros NDJSON grandes) entre `workers`
+    procesos. Si una parte falla, la salida anterior de esa fuente se conserva y el resto sigue adelante.
+    `output_format` es ndjson, parquet o arrow (por defecto, STRUCTURED_FORMAT).
+
+    :return: Diccionario con el resultado por fuente ("sources"), las estadísticas por proceso ("workers")
+             y el tiempo total ("seconds").
+    """
+    workers = workers or NORMALIZE_WORKERS
+    extension = STRUCTURED_EXTENSIONS[output_format or STRUCTURED_FORMAT]
+    parts_dir = os.path.join(output_dir, ".parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    tasks = []
+    for source, paths in sources.items():
+        tasks.extend(plan_parts(source, paths, mappings_by_source.get(source, {}), results_keys.get(source), parts_dir, chunk_bytes))
+
+    start = time.perf_counter()
+    results = []
+    if workers > 1:
+        # Procesos iniciados con "spawn": `pipeline_runner` ejecuta esta etapa desde un hilo y un "fork" con otros
+        # hilos activos puede heredar bloqueos tomados (logging, E/S) y dejar al proceso hijo bloqueado
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(normalize_part, task): task for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # Por ejemplo, un proceso que muere (BrokenProcessPool)
+                    task = futures[future]
+                    results.append({
+                        "source": task["source"], "part": task["part"], "path": task["path"], "output": task["output"],
+                        "pid": None, "records": 0, "seconds": 0.0, "error": f"{type(e).__name__}: {str(e)}",
+                    })
+    else:
+        results = [normalize_part(task) for task in tasks]
+    elapsed = time.perf_counter() - start
+
+    by_source = {}
+    for result in results:
+        by_source.setdefault(result["source"], []).append(result)
+
+    summary = {"sources": {}, "workers": {}, "seconds": elapsed}
+    for source, source_results in by_source.items():
+        errors = [f"{os.path.basename(r['path'])}: {r['error']}" for r in source_results if r["error"]]
+        output_path = os.path.join(output_dir, f"{source}_structured{extension}")
+        if not errors:
+            try:
+                merge_parts(source_results, output_path)
+            except Exception as e:
+                errors.append(f"{os.path.basename(output_path)}: {type(e).__name__}: {str(e)}")
+        for r in source_results:
+            if os.path.exists(r["output"]):
+                os.remove(r["output"])
+        summary["sources"][source] = {
+            "records": sum(r["records"] for r in source_results),
+            "errors": errors,
+            "output": None if errors else output_path,
+        }
+
+    for result in results:
+        stats = summary["workers"].setdefault(result["pid"], {"parts": 0, "records": 0, "seconds": 0.0})
+        stats["parts"] += 1
+        stats["records"] += result["records"]
+        stats["seconds"] += result["seconds"]
+    for stats in summary["workers"].values():
+        stats["records_per_sec"] = stats["records"] / stats["seconds"] if stats["seconds"] else 0.0
+
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    return summary
+
+def print_worker_summary(summary):
+    print(f"Normalización completada en {summary['seconds']:.1f} s")
+    for pid, stats in sorted(summary["workers"].items(), key=lambda item: str(item[0])):
+        print(f"  proceso {pid}: {stats['parts']} partes, {stats['records']} registros, {stats['records_per_sec']:.0f} reg/s")
+
+def normalize_data(workers=None):
     os.makedirs(STRUCTURED_DATA_DIR, exist_ok=True)
     mappings = load_mappings(MAPPINGS_FILE)
+    mappings_by_source = {name.lower(): mapping for name, mapping in mappings.items()}
+    fetch_state = {name.lower(): entry for name, entry in load_fetch_state().items()}
+    results_keys = {source: entry.get("results_key") for source, entry in fetch_state.items()}
+
+    summary = normalize_sources(raw_files_by_source(), mappings_by_source, results_keys, STRUCTURED_DATA_DIR, workers)
 
-    for file_name in os.listdir(RAW_DATA_DIR):
-        api_name = file_name.split(".")[0].capitalize()
-        mapping = mappings.get(api_name, {})
-        
-        with open(os.path.join(RAW_DATA_DIR, file_name), "r") as f:
-            raw_data = json.load(f)
+    failures = []
+    for source, result in summary["sources"].items():
+        if result["errors"]:
+            failures.append(source)
+            print(f"Error normalizando {source} (se conserva la salida anterior): {'; '.join(result['errors'])}")
+            continue
+        # Se eliminan las salidas de la fuente en otros formatos (incluida la lista JSON indentada anterior)
+        for extension in (".json", *STRUCTURED_EXTENSIONS.values()):
+            stale_path = os.path.join(STRUCTURED_DATA_DIR, f"{source}_structured{extension}")
+            if stale_path != result["output"] and os.path.exists(stale_path):
+                os.remove(stale_path)
+        print(f"Normalizados {result['records']} registros de {source}: {result['output']}")
+    print_worker_summary(summary)
 
-        structured_data = [normalize_record(record, mapping) for record in raw_data]
-        with open(os.path.join(STRUCTURED_DATA_DIR, f"{api_name.lower()}_structured.json"), "w") as f:
-            json.dump(structured_data, f, indent=4)
+    if failures:
+        raise RuntimeError(f"Fallaron las normalizaciones de: {', '.join(sorted(failures))}")
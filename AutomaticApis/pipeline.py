@@ -1,74 +1,20 @@
 import os
-from scripts.download_data import download_data
-from scripts.normalize_data import normalize_data
-from scripts.sync_firestore import sync_firestore
-from scripts.process_opensim import process_opensim_data
-from scripts.process_acsm import process_acsm_data
-from scripts.process_ninds import process_ninds_data
-from scripts.process_musclewiki import process_musclewiki_data
-from scripts.process_exrx import process_exrx_data
-from scripts.logging_utils import setup_logger
-
-# Configurar logging
-logger = setup_logger("pipeline.log")
+from pipeline_runner import run_pipeline, default_stages, logger
 
 def main():
     """
     Pipeline principal para:
-    1. Descargar datos desde APIs configuradas y Kaggle.
+    1. Descargar datos desde las APIs configuradas.
     2. Procesar datos específicos (OpenSim, ACSM, NINDS, MuscleWiki, ExRx).
     3. Normalizar los datos descargados.
     4. Sincronizar los datos procesados con Firestore.
+    Las etapas independientes se ejecutan en paralelo y las que no han cambiado se omiten (ver pipeline_runner).
     """
     try:
-        # Descargar datos desde las APIs configuradas y Kaggle
-        logger.info("Iniciando descarga de datos desde las APIs y Kaggle...")
-        download_data()
-        
-        # Procesar datos de OpenSim
-        logger.info("Iniciando procesamiento de datos de OpenSim...")
-        process_opensim_data(
-            input_dir="./raw_data/opensim",
-            output_dir="./structured_data/opensim",
-            supported_formats=[".sto", ".mot", ".osim"]
-        )
-        
-        # Procesar datos de ACSM
-        logger.info("Iniciando procesamiento de datos de ACSM...")
-        process_acsm_data(
-            data_source="https://www.acsm.org/",
-            output_dir="./structured_data/acsm"
-        )
-        
-        # Procesar datos de NINDS
-        logger.info("Iniciando procesamiento de datos de NINDS...")
-        process_ninds_data(
-            data_source="https://www.ninds.nih.gov/",
-            output_dir="./structured_data/ninds"
-        )
-        
-        # Procesar datos de MuscleWiki
-        logger.info("Iniciando procesamiento de datos de MuscleWiki...")
-        process_musclewiki_data(
-            data_source="https://musclewiki.com/",
-            output_dir="./structured_data/musclewiki"
-        )
-
-        # Procesar datos de ExRx
-        logger.info("Iniciando procesamiento de datos de ExRx...")
-        process_exrx_data(
-            data_source="https://exrx.net/",
-            output_dir="./structured_data/exrx"
-        )
-        
-        # Normalizar datos descargados
-        logger.info("Iniciando normalización de datos descargados...")
-        normalize_data()
-        
-        # Sincronizar datos con Firestore
-        logger.info("Iniciando sincronización de datos con Firestore...")
-        sync_firestore()
-        
+        report = run_pipeline(default_stages())
+        failed = [name for name, entry in report.items() if entry["status"] in ("failed", "blocked")]
+        if failed:
+            raise RuntimeError(f"Etapas sin completar: {', '.join(failed)}")
         logger.info("¡Pipeline completado con éxito!")
     except Exception as e:
         logger.error(f"Error en el pipeline: {e}")
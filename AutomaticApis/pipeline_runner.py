@@ -0,0 +1,274 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from logging_utils import setup_logger
+
+PIPELINE_CACHE_FILE = ".pipeline_cache.json"
+PIPELINE_LOG_DIR = "pipeline_logs"
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 6))
+PIPELINE_RETRIES = int(os.getenv("PIPELINE_RETRIES", 2))
+# Los sitios cambian sin que cambie ninguna entrada local: el resultado del crawler se reutiliza durante este tiempo.
+# Cuando caduca, los sitios se recorren de nuevo desde cero (--fresh) para volver a extraer las páginas ya conocidas
+SCRAPE_MAX_AGE_HOURS = float(os.getenv("SCRAPE_MAX_AGE_HOURS", 24))
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = setup_logger("pipeline.log")
+
+class Stage:
+    """
+    Etapa del pipeline.
+
+    - `run`: función sin argumentos, o lista de argumentos de un subproceso si `in_subprocess` es True (el
+      crawler de Scrapy necesita su propio proceso: el reactor de Twisted no se puede reiniciar).
+    - `deps`: etapas que deben terminar antes.
+    - `inputs`: ficheros, directorios o patrones glob cuya huella decide si la etapa se puede omitir.
+    - `outputs`: patrones que deben existir para reutilizar el resultado anterior.
+    - `always_run`: la etapa no se cachea (por ejemplo, la descarga, que ya es incremental por sí misma).
+    - `max_age`: segundos durante los que el resultado cacheado sigue valiendo aunque la huella no cambie.
+    """
+    def __init__(self, name, run, deps=(), inputs=(), outputs=(), in_subprocess=False, always_run=False,
+                 max_age=None, retries=None):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.in_subprocess = in_subprocess
+        self.always_run = always_run
+        self.max_age = max_age
+        self.retries = PIPELINE_RETRIES if retries is None else retries
+
+def iter_input_files(pattern):
+    if os.path.isdir(pattern):
+        for root, dirs, files in os.walk(pattern):
+            dirs.sort()
+            for file_name in sorted(files):
+                yield os.path.join(root, file_name)
+        return
+    for path in sorted(glob.glob(pattern)):
+        if os.path.isfile(path):
+            yield path
+
+def fingerprint(stage):
+    """
+    Huella de las entradas de una etapa: ruta, tamaño y fecha de modificación de cada fichero, más la
+    definición de la propia etapa. Los ficheros de estado ocultos (.fetch_state.json, .sync_manifest.json...)
+    no cuentan.
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps([stage.name, stage.run if stage.in_subprocess else getattr(stage.run, "__name__", "")]).encode("utf-8"))
+    for pattern in stage.inputs:
+        for path in iter_input_files(pattern):
+            if os.path.basename(path).startswith("."):
+                continue
+            stat = os.stat(path)
+            digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def outputs_exist(stage):
+    return all(glob.glob(pattern) for pattern in stage.outputs)
+
+def load_cache():
+    if not os.path.exists(PIPELINE_CACHE_FILE):
+        return {}
+    with open(PIPELINE_CACHE_FILE, "r") as f:
+        return json.load(f)
+
+def save_cache(cache):
+    tmp_file = PIPELINE_CACHE_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f, indent=4)
+    os.replace(tmp_file, PIPELINE_CACHE_FILE)
+
+def is_cached(stage, cache):
+    entry = cache.get(stage.name)
+    if stage.always_run or not entry or entry.get("fingerprint") != fingerprint(stage) or not outputs_exist(stage):
+        return False
+    return stage.max_age is None or time.time() - entry.get("finished_at", 0) < stage.max_age
+
+def run_stage(stage):
+    """
+    Ejecuta una etapa con reintentos. Solo se repite la etapa que falla, no el pipeline entero.
+
+    :return: Número de intentos realizados.
+    """
+    for attempt in range(1, stage.retries + 2):
+        try:
+            if stage.in_subprocess:
+                os.makedirs(PIPELINE_LOG_DIR, exist_ok=True)
+                with open(os.path.join(PIPELINE_LOG_DIR, f"{stage.name}.log"), "a") as log:
+                    subprocess.run(stage.run, stdout=log, stderr=subprocess.STDOUT, check=True)
+            else:
+                stage.run()
+            return attempt
+        except Exception as e:
+            if attempt > stage.retries:
+                raise
+            delay = 2 ** attempt
+            logger.warning(f"[{stage.name}] Intento {attempt} fallido ({e}); reintentando en {delay} s...")
+            time.sleep(delay)
+
+def blocked_by_failure(stage, status):
+    return any(status.get(dep) in ("failed", "blocked") for dep in stage.deps)
+
+def run_pipeline(stages, workers=None, force=False, only=None):
+    """
+    Ejecuta las etapas respetando sus dependencias; las independientes se lanzan en paralelo. Si una etapa
+    falla tras sus reintentos, las que dependen de ella no se ejecutan, pero el resto continúa.
+
+    :param only: Nombres de las etapas a ejecutar (las dependencias fuera de la selección se dan por satisfechas).
+    :return: Informe por etapa: estado (ok, cached, failed, blocked), intentos y segundos.
+    """
+    stages = {stage.name: stage for stage in stages if not only or stage.name in only}
+    for stage in stages.values():
+        unknown = [dep for dep in stage.deps if dep not in stages and not only]
+        if unknown:
+            raise ValueError(f"La etapa {stage.name} depende de etapas inexistentes: {', '.join(unknown)}")
+
+    cache = {} if force else load_cache()
+    status = {}
+    report = {}
+    pending = dict(stages)
+    running = {}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers or PIPELINE_WORKERS) as executor:
+        while pending or running:
+            submitted = False
+            for name, stage in list(pending.items()):
+                if blocked_by_failure(stage, status):
+                    status[name] = "blocked"
+                    report[name] = {"status": "blocked", "attempts": 0, "seconds": 0.0}
+                    logger.error(f"[{name}] No se ejecuta: falló una dependencia.")
+                    del pending[name]
+                    submitted = True
+                    continue
+                if any(dep in stages and status.get(dep) not in ("ok", "cached") for dep in stage.deps):
+                    continue
+                del pending[name]
+                submitted = True
+                if is_cached(stage, cache):
+                    status[name] = "cached"
+                    report[name] = {"status": "cached", "attempts": 0, "seconds": 0.0}
+                    logger.info(f"[{name}] Sin cambios en sus entradas; se reutiliza el resultado anterior.")
+                    continue
+                logger.info(f"[{name}] Iniciando...")
+                running[executor.submit(run_stage, stage)] = (name, time.perf_counter())
+
+            if not running:
+                if pending and not submitted:
+                    raise ValueError(f"Dependencias circulares entre: {', '.join(pending)}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                elapsed = time.perf_counter() - started
+                try:
+                    attempts = future.result()
+                except Exception as e:
+                    status[name] = "failed"
+                    report[name] = {"status": "failed", "attempts": stages[name].retries + 1, "seconds": elapsed, "error": str(e)}
+                    logger.error(f"[{name}] Falló tras {stages[name].retries + 1} intentos: {e}")
+                    continue
+                status[name] = "ok"
+                report[name] = {"status": "ok", "attempts": attempts, "seconds": elapsed}
+                # La huella se toma después de ejecutar: las salidas de esta etapa no deben invalidarla
+                cache[name] = {"fingerprint": fingerprint(stages[name]), "finished_at": time.time(), "seconds": elapsed}
+                save_cache(cache)
+                logger.info(f"[{name}] Completada en {elapsed:.1f} s")
+
+    print_report(report, time.perf_counter() - start)
+    return report
+
+def print_report(report, total_seconds):
+    lines = [f"{'etapa':<14}{'estado':<10}{'intentos':>9}{'seg':>9}"]
+    for name, entry in report.items():
+        lines.append(f"{name:<14}{entry['status']:<10}{entry['attempts']:>9}{entry['seconds']:>9.1f}")
+    lines.append(f"Total: {total_seconds:.1f} s")
+    logger.info("Informe del pipeline:\n" + "\n".join(lines))
+
+def default_stages():
+    """
+    Etapas del pipeline de datos de Bwere y sus dependencias:
+        download ─> normalize ─> sync
+        crawl ─> exercises (corpus de modules/exercise_index.py)
+        opensim (independiente; crawl recorre todos los sitios de crawler_sites.json a la vez)
+    """
+    from download_data import download_data, CONFIG_FILE
+    from normalize_data import normalize_data, MAPPINGS_FILE, RAW_DATA_DIR, STRUCTURED_DATA_DIR
+    from sync_firestore import sync_firestore, FIRESTORE_RULES
+    from process_opensim import process_opensim_data
+    from crawler_engine import SITES_FILE, load_site_configs
+    from build_exercise_corpus import build_exercise_corpus, EXERCISE_CORPUS_FILE
+
+    crawl_outputs = [f"{name}_final_data.*" for name in load_site_configs()]
+    crawl = Stage(
+        "crawl",
+        [sys.executable, os.path.join(SCRIPT_DIR, "crawler_engine.py"), "--fresh"],
+        inputs=[os.path.join(SCRIPT_DIR, "crawler_engine.py"), os.path.join(SCRIPT_DIR, "browser_rendering.py"), SITES_FILE],
+        outputs=crawl_outputs,
+        in_subprocess=True,
+        max_age=SCRAPE_MAX_AGE_HOURS * 3600,
+    )
+    return [
+        Stage("download", download_data, inputs=[CONFIG_FILE], always_run=True),
+        Stage(
+            "opensim",
+            lambda: process_opensim_data(
+                input_dir=os.path.join(RAW_DATA_DIR, "opensim"),
+                output_dir=os.path.join(STRUCTURED_DATA_DIR, "opensim"),
+                supported_formats=[".sto", ".mot", ".osim"]
+            ),
+            inputs=[os.path.join(RAW_DATA_DIR, "opensim")],
+            outputs=[os.path.join(STRUCTURED_DATA_DIR, "opensim")],
+        ),
+        crawl,
+        Stage(
+            "exercises",
+            build_exercise_corpus,
+            deps=["crawl"],
+            inputs=[*crawl_outputs, SITES_FILE],
+            outputs=[EXERCISE_CORPUS_FILE],
+        ),
+        Stage(
+            "normalize",
+            normalize_data,
+            deps=["download"],
+            inputs=[os.path.join(RAW_DATA_DIR, "*"), MAPPINGS_FILE],
+            outputs=[os.path.join(STRUCTURED_DATA_DIR, "*_structured.*")],
+        ),
+        Stage(
+            "sync",
+            sync_firestore,
+            deps=["normalize"],
+            inputs=[os.path.join(STRUCTURED_DATA_DIR, "*_structured.*"), FIRESTORE_RULES],
+        ),
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ejecuta el pipeline de datos por etapas, en paralelo y con caché.")
+    parser.add_argument("--only", nargs="+", help="Etapas a ejecutar")
+    parser.add_argument("--force", action="store_true", help="Ignora la caché y ejecuta todas las etapas")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    parser.add_argument("--list", action="store_true", help="Muestra las etapas y sus dependencias")
+    args = parser.parse_args(argv)
+
+    stages = default_stages()
+    if args.list:
+        for stage in stages:
+            print(f"{stage.name:<12} <- {', '.join(stage.deps) or '-'}")
+        return
+
+    report = run_pipeline(stages, workers=args.workers, force=args.force, only=args.only)
+    failed = [name for name, entry in report.items() if entry["status"] in ("failed", "blocked")]
+    if failed:
+        raise RuntimeError(f"Etapas sin completar: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import os
 import pandas as pd
+from columnar_storage import STRUCTURED_FORMAT, COLUMNAR_FORMATS, write_dataframe
 
-def process_opensim_data(input_dir, output_dir, supported_formats=[".sto", ".mot"]):
+def process_opensim_data(input_dir, output_dir, supported_formats=[".sto", ".mot"], output_format=None):
     """
-    Procesa archivos de OpenSim y los convierte a formato CSV.
+    Procesa archivos de OpenSim y los convierte a CSV, o a Parquet / Arrow si `output_format`
+    (por defecto, STRUCTURED_FORMAT) es un formato columnar.
     """
+    output_format = output_format or STRUCTURED_FORMAT
+    if output_format not in COLUMNAR_FORMATS:
+        output_format = "csv"
     os.makedirs(output_dir, exist_ok=True)
 
     for file in os.listdir(input_dir):
@@ -13,8 +18,11 @@ def process_opensim_data(input_dir, output_dir, supported_formats=[".sto", ".mot
             try:
                 # Leer el archivo como tabla
                 data = pd.read_csv(file_path, delimiter="\t", comment=";", skip_blank_lines=True)
-                output_file = os.path.join(output_dir, f"{os.path.splitext(file)[0]}.csv")
-                data.to_csv(output_file, index=False)
+                output_file = os.path.join(output_dir, os.path.splitext(file)[0] + COLUMNAR_FORMATS.get(output_format, ".csv"))
+                if output_format == "csv":
+                    data.to_csv(output_file, index=False)
+                else:
+                    write_dataframe(data, output_file, output_format)
                 print(f"Procesado: {file} -> {output_file}")
             except Exception as e:
                 print(f"Error procesando {file}: {e}")
@@ -1,9 +1,24 @@
 import os
 import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import firestore
+from normalize_data import iter_structured_records
 
 FIRESTORE_RULES = "config/firestore_rules.json"
 STRUCTURED_DATA_DIR = "structured_data"
+# Huella de cada documento sincronizado: {colección: {id: hash}}
+SYNC_MANIFEST_FILE = os.path.join(STRUCTURED_DATA_DIR, ".sync_manifest.json")
+# Lotes confirmados desde la última compactación del manifiesto (una línea JSON por lote)
+SYNC_JOURNAL_FILE = os.path.join(STRUCTURED_DATA_DIR, ".sync_manifest.journal")
+
+# Firestore admite como máximo 500 operaciones por lote
+SYNC_BATCH_SIZE = min(int(os.getenv("SYNC_BATCH_SIZE", 500)), 500)
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", 8))
+SYNC_DELETE_MISSING = os.getenv("SYNC_DELETE_MISSING", "false").lower() == "true"
+STRUCTURED_SUFFIXES = ("_structured.ndjson", "_structured.json", "_structured.parquet", "_structured.arrow")
 
 def load_firestore_rules(file_path):
     with open(file_path, "r") as f:
@@ -12,21 +27,160 @@ def load_firestore_rules(file_path):
 def validate_record(record):
     return all(key in record and record[key] for key in ["name", "calories"])
 
-def sync_firestore():
-    db = firestore.Client()
-    rules = load_firestore_rules(FIRESTORE_RULES)
+def record_hash(record):
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+def load_manifest():
+    """
+    Manifiesto de la última sincronización, incluidos los lotes confirmados de una ejecución que no llegó a terminar.
+    """
+    manifest = {}
+    if os.path.exists(SYNC_MANIFEST_FILE):
+        with open(SYNC_MANIFEST_FILE, "r") as f:
+            manifest = json.load(f)
+    if os.path.exists(SYNC_JOURNAL_FILE):
+        with open(SYNC_JOURNAL_FILE, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Última línea a medio escribir
+                apply_journal_entry(manifest, entry)
+    return manifest
+
+def apply_journal_entry(manifest, entry):
+    docs = manifest.setdefault(entry["collection"], {})
+    docs.update(entry.get("set", {}))
+    for doc_id in entry.get("delete", []):
+        docs.pop(doc_id, None)
+
+def save_manifest(manifest):
+    tmp_file = SYNC_MANIFEST_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, SYNC_MANIFEST_FILE)
+    if os.path.exists(SYNC_JOURNAL_FILE):
+        os.remove(SYNC_JOURNAL_FILE)
 
-    for file_name in os.listdir(STRUCTURED_DATA_DIR):
-        api_name = file_name.split("_")[0].capitalize()
-        collection_path = rules.get(api_name, "")
-        
-        with open(os.path.join(STRUCTURED_DATA_DIR, file_name), "r") as f:
-            data = json.load(f)
-        
-        for record in data:
+def load_local_documents(rules_by_source):
+    """
+    Lee la salida de normalize_data y calcula la huella de cada documento válido.
+
+    :return: Diccionario {colección: {id: (hash, registro)}}.
+    """
+    collections = {}
+    for file_name in sorted(os.listdir(STRUCTURED_DATA_DIR)):
+        if not file_name.endswith(STRUCTURED_SUFFIXES):
+            continue
+        source = file_name.split("_")[0].lower()
+        collection_path = rules_by_source.get(source)
+        if not collection_path:
+            print(f"Omitiendo {file_name}: no hay colección configurada para {source}.")
+            continue
+
+        docs = collections.setdefault(collection_path, {})
+        # Los registros se leen de uno en uno (o por lotes en Parquet / Arrow) desde la salida de normalize_data
+        for record in iter_structured_records(os.path.join(STRUCTURED_DATA_DIR, file_name)):
             if validate_record(record):
-                doc_ref = db.collection(collection_path).document(record["name"])
-                existing_data = doc_ref.get().to_dict()
-                if existing_data != record:
-                    doc_ref.set(record)
-                    print(f"Sincronizado: {record['name']} en {collection_path}")
+                docs[str(record["name"])] = (record_hash(record), record)
+    return collections
+
+def plan_sync(local, manifest, delete_missing=False, force=False):
+    """
+    Compara los documentos locales con el manifiesto, sin consultar Firestore. Con `force` todos los
+    documentos locales se vuelven a enviar.
+
+    :return: Lista de operaciones (acción, colección, id, hash, registro) y recuento por tipo.
+    """
+    operations = []
+    counts = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+    for collection_path, docs in local.items():
+        synced = manifest.get(collection_path, {})
+        for doc_id, (digest, record) in docs.items():
+            previous = synced.get(doc_id)
+            if previous == digest and not force:
+                counts["unchanged"] += 1
+                continue
+            counts["new" if previous is None else "changed"] += 1
+            operations.append(("set", collection_path, doc_id, digest, record))
+        if delete_missing:
+            # Solo se borran documentos que subió esta sincronización y que ya no están en los datos locales
+            for doc_id in synced.keys() - docs.keys():
+                counts["deleted"] += 1
+                operations.append(("delete", collection_path, doc_id, None, None))
+    return operations, counts
+
+def chunk_batches(operations, batch_size=SYNC_BATCH_SIZE):
+    """
+    Agrupa las operaciones en lotes de una sola colección (así cada lote es una entrada del diario).
+    """
+    by_collection = {}
+    for operation in operations:
+        by_collection.setdefault(operation[1], []).append(operation)
+    for collection_path, collection_operations in by_collection.items():
+        for start in range(0, len(collection_operations), batch_size):
+            yield collection_path, collection_operations[start:start + batch_size]
+
+def commit_batch(db, collection_path, operations):
+    batch = db.batch()
+    collection = db.collection(collection_path)
+    for action, _, doc_id, _, record in operations:
+        if action == "set":
+            batch.set(collection.document(doc_id), record)
+        else:
+            batch.delete(collection.document(doc_id))
+    batch.commit()
+
+def sync_firestore(db=None, delete_missing=None, force=False):
+    """
+    Sincroniza structured_data con Firestore enviando solo lo que cambió desde la última sincronización.
+    Las diferencias se calculan contra el manifiesto local de huellas, y los cambios se envían en lotes de hasta
+    500 operaciones confirmados en paralelo. Cada lote confirmado se apunta en el diario, de modo que una ejecución
+    interrumpida continúa donde lo dejó. `force` ignora el manifiesto y vuelve a subirlo todo (por ejemplo, si
+    los documentos se han modificado directamente en Firestore).
+    """
+    start = time.perf_counter()
+    db = db or firestore.Client()
+    delete_missing = SYNC_DELETE_MISSING if delete_missing is None else delete_missing
+    rules = load_firestore_rules(FIRESTORE_RULES)
+    rules_by_source = {name.lower(): path for name, path in rules.items()}
+
+    manifest = load_manifest()
+    local = load_local_documents(rules_by_source)
+    operations, counts = plan_sync(local, manifest, delete_missing, force)
+    batches = list(chunk_batches(operations))
+    print(
+        f"Sincronización: {counts['new']} nuevos, {counts['changed']} modificados, {counts['unchanged']} sin cambios, "
+        f"{counts['deleted']} a borrar ({len(batches)} lotes)"
+    )
+
+    journal_lock = threading.Lock()
+    failures = []
+    with open(SYNC_JOURNAL_FILE, "a") as journal:
+        def run(collection_path, batch_operations):
+            commit_batch(db, collection_path, batch_operations)
+            entry = {
+                "collection": collection_path,
+                "set": {doc_id: digest for action, _, doc_id, digest, _ in batch_operations if action == "set"},
+                "delete": [doc_id for action, _, doc_id, _, _ in batch_operations if action == "delete"],
+            }
+            with journal_lock:
+                journal.write(json.dumps(entry) + "\n")
+                journal.flush()
+                apply_journal_entry(manifest, entry)
+            return len(batch_operations)
+
+        with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as executor:
+            futures = {executor.submit(run, collection_path, ops): collection_path for collection_path, ops in batches}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error al confirmar un lote de {futures[future]}: {e}")
+                    failures.append(futures[future])
+
+    save_manifest(manifest)
+    print(f"Sincronización completada en {time.perf_counter() - start:.1f} s ({len(batches) - len(failures)}/{len(batches)} lotes)")
+    if failures:
+        raise RuntimeError(f"Fallaron {len(failures)} lotes de: {', '.join(sorted(set(failures)))}")
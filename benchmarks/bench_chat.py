@@ -0,0 +1,210 @@
+"""
+Suite de rendimiento de la ruta `/chat` sin dependencias externas.
+Arranca la API ASGI en el propio proceso contra un Firestore en memoria (`fake_firestore`) y un backend
+de IA simulado (`fake_llm`) registrado con `register_backend`, lanza varios perfiles de concurrencia y
+compara throughput y latencias con una línea base guardada. Funciona sin red ni credenciales.
+
+Ejemplo:
+    python benchmarks/bench_chat.py                          # todos los perfiles, compara con la línea base
+    python benchmarks/bench_chat.py --profile hot_users --json
+    python benchmarks/bench_chat.py --update-baseline        # guarda los resultados como nueva línea base
+
+El proceso termina con código 1 si algún perfil empeora más allá de la tolerancia.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCH_DIR), BENCH_DIR]
+
+from fake_firestore import FakeFirestore
+from fake_llm import make_fake_backend
+from load_test_chat import run_load
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "chat_baseline.json")
+
+# Perfiles de carga: clientes concurrentes, peticiones totales y user_id distintos
+PROFILES = {
+    # Muchos usuarios con poca actividad cada uno
+    "steady": {"concurrency": 16, "requests": 320, "users": 320},
+    # Pico de tráfico con más clientes que huecos de ejecución (CHAT_MAX_IN_FLIGHT)
+    "burst": {"concurrency": 96, "requests": 480, "users": 480},
+    # Pocos usuarios muy activos: sus turnos se procesan en serie
+    "hot_users": {"concurrency": 16, "requests": 160, "users": 8},
+}
+
+# Las latencias pueden crecer esta fracción (más un margen absoluto) antes de considerarse una regresión
+DEFAULT_TOLERANCE = 0.2
+ABSOLUTE_SLACK_MS = 5.0
+
+
+def configure_environment(args):
+    """
+    Fija la configuración del servidor. Debe llamarse antes de importar `werbly_asgi`.
+    """
+    os.environ["AI_BACKEND"] = "bench"
+    os.environ["EXPOSE_SERVER_TIMING"] = "true"
+    os.environ["RATE_LIMITS"] = json.dumps({"*": {}})
+    os.environ["CHAT_MAX_IN_FLIGHT"] = str(args.max_in_flight)
+    os.environ["CHAT_MAX_QUEUE"] = "4096"
+    os.environ["LOG_FILE"] = os.path.join(tempfile.gettempdir(), "bwere_bench.log")
+    os.environ["LOGGING_LEVEL"] = "WARNING"
+
+
+def seed_firestore(db: FakeFirestore, users: int):
+    """
+    Carga el prompt base y perfiles de usuario representativos.
+    """
+    db.collection("prompts").document("prompt_usuario").set({
+        "contenido": "Eres Bwere, un asistente de bienestar personal. Responde de forma breve y personalizada."
+    })
+    for i in range(users):
+        db.collection("usuarios").document(f"loadtest_{i}").set({
+            "nombre": f"Usuario {i}",
+            "edad": 20 + i % 40,
+            "objetivo": ["perder peso", "ganar masa muscular", "mejorar resistencia"][i % 3],
+            "nivel_actividad": ["bajo", "moderado", "alto"][i % 3],
+        })
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db: FakeFirestore, args):
+    """
+    Arranca uvicorn en un hilo con Firestore y la IA sustituidos por los simulados.
+
+    :return: Tupla (servidor uvicorn, URL base).
+    """
+    import uvicorn
+    import modules.firebase_connection as firebase_connection
+    import werbly_asgi
+    from modules.ai_core import get_ai_core
+
+    firebase_connection._firestore_client = db
+    werbly_asgi.init_firebase = lambda: None
+    get_ai_core().register_backend("bench", make_fake_backend(args.llm_latency_ms, args.tokens_per_second, args.reply_tokens))
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(werbly_asgi.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("El servidor de pruebas no arrancó a tiempo.")
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara los resultados con la línea base.
+
+    :return: Lista de regresiones encontradas (vacía si no hay ninguna).
+    """
+    regressions = []
+    for profile, current in results.items():
+        reference = baseline.get("profiles", {}).get(profile)
+        if not reference:
+            continue
+        if current["rps"] < reference["rps"] * (1 - tolerance):
+            regressions.append(f"{profile}: req/s {current['rps']:.1f} < {reference['rps']:.1f}")
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            limit = reference[key] * (1 + tolerance) + ABSOLUTE_SLACK_MS
+            if current[key] > limit:
+                regressions.append(f"{profile}: {key} {current[key]:.1f} > {limit:.1f}")
+        if current["errors"] > reference["errors"]:
+            regressions.append(f"{profile}: errores {current['errors']} > {reference['errors']}")
+    return regressions
+
+
+def print_report(results: dict):
+    print(f"{'perfil':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>10}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>10}")
+    print("\nDesglose por etapa (p50 / p95 ms):")
+    for name, r in results.items():
+        stages = "  ".join(f"{stage} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}" for stage, s in r["stages"].items())
+        print(f"  {name:<10} {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de rendimiento de /chat con Firestore e IA simulados.")
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES), help="Perfil a ejecutar (repetible)")
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--firestore-read-ms", type=float, default=2.0)
+    parser.add_argument("--firestore-write-ms", type=float, default=4.0)
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON")
+    args = parser.parse_args()
+
+    settings = {
+        "llm_latency_ms": args.llm_latency_ms,
+        "tokens_per_second": args.tokens_per_second,
+        "reply_tokens": args.reply_tokens,
+        "firestore_read_ms": args.firestore_read_ms,
+        "firestore_write_ms": args.firestore_write_ms,
+        "max_in_flight": args.max_in_flight,
+    }
+    profiles = {name: PROFILES[name] for name in (args.profile or PROFILES)}
+
+    configure_environment(args)
+    db = FakeFirestore(args.firestore_read_ms, args.firestore_write_ms)
+    seed_firestore(db, max(p["users"] for p in profiles.values()))
+    server, base_url = start_server(db, args)
+
+    try:
+        results = {
+            name: run_load(base_url, p["concurrency"], p["requests"], p["users"], timeout=60.0)
+            for name, p in profiles.items()
+        }
+    finally:
+        server.should_exit = True
+
+    if args.json:
+        print(json.dumps({"settings": settings, "profiles": results}, indent=2))
+    else:
+        print_report(results)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "profiles": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nLínea base actualizada: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nNo hay línea base; ejecuta con --update-baseline para crearla.")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        print("\nLa línea base se generó con otra configuración; no se compara.")
+        return
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegresiones respecto a la línea base:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\nSin regresiones respecto a la línea base.")
+
+
+if __name__ == "__main__":
+    main()
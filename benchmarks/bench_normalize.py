@@ -0,0 +1,274 @@
+"""
+Benchmark del normalizador de `AutomaticApis/normalize_data.py` sobre una entrada sintética grande.
+Genera un volcado con el formato de la API de USDA (un array JSON de alimentos), lo normaliza en un
+subproceso por modo y muestra tiempo, registros por segundo y pico de memoria residente (RSS), de modo
+que se vea que la memoria no crece con el tamaño del fichero.
+
+Ejemplo:
+    python benchmarks/bench_normalize.py                       # 2 GB, normalizador en streaming
+    python benchmarks/bench_normalize.py --size-mb 200 --legacy --interpreted
+    python benchmarks/bench_normalize.py --size-mb 4096 --json
+    python benchmarks/bench_normalize.py --format ndjson --workers 4   # compara 1 proceso con 4
+    python benchmarks/bench_normalize.py --size-mb 500 --columnar      # tamaño y tiempo de carga NDJSON vs Parquet
+
+En cada modo se mide también la carga de la salida (`load_s`): el NDJSON se lee entero y se filtra en Python;
+el Parquet lee solo las columnas `name` y `calories` con el filtro aplicado por pyarrow.
+
+Modos:
+- `streaming`: `normalize_source` (lectura incremental, mapeo compilado y salida NDJSON).
+- `interpreted`: lectura incremental y NDJSON, pero interpretando las rutas del mapeo en cada registro
+  como hacía `normalize_record` antes de compilarse; aísla la ganancia del mapeo compilado.
+- `legacy`: el algoritmo original (`json.load` del fichero entero, rutas interpretadas, lista completa y
+  `json.dump` indentado).
+- `columnar`: como `streaming`, pero escribiendo Parquet (requiere pyarrow).
+- `parallel`: `normalize_sources` con `--workers` procesos; la entrada (NDJSON) se reparte en trozos por
+  rango de bytes. Incluye los registros por segundo de cada proceso.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(os.path.dirname(BENCH_DIR), "AutomaticApis"), BENCH_DIR]
+
+BENCH_MAPPING = {
+    "name": "description",
+    "brand": "brandOwner",
+    "calories": "foodNutrients[0].value",
+    "protein": "foodNutrients[1].amount",
+    "fat": "foodNutrients[2].amount",
+    "fiber": "foodNutrients[4].amount",
+}
+
+NUTRIENTS = ["Energy", "Protein", "Total lipid (fat)", "Carbohydrate, by difference", "Fiber, total dietary"]
+
+
+def synthetic_record(i: int, rng: random.Random) -> dict:
+    return {
+        "fdcId": 100000 + i,
+        "description": f"Synthetic food {i}",
+        "dataType": "Branded",
+        "publicationDate": "2024-04-01",
+        "brandOwner": f"Brand {i % 500}",
+        "foodNutrients": [
+            {"number": str(200 + n), "name": name, "amount": round(rng.uniform(0, 500), 2), "unitName": "G", "value": round(rng.uniform(0, 900), 1)}
+            for n, name in enumerate(NUTRIENTS)
+        ],
+    }
+
+
+def generate_input(path: str, size_mb: float, seed: int = 7, ndjson: bool = False) -> int:
+    """
+    Escribe un array JSON (o NDJSON) de registros sintéticos hasta alcanzar `size_mb`, sin mantenerlos en memoria.
+
+    :return: Número de registros generados.
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    count = 0
+    separator = "\n" if ndjson else ","
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("" if ndjson else "[")
+        while written < target:
+            chunk = separator.join(json.dumps(synthetic_record(count + i, rng)) for i in range(1000))
+            f.write((separator if count else "") + chunk)
+            written += len(chunk) + 1
+            count += 1000
+        f.write("\n" if ndjson else "]")
+    return count
+
+
+def interpreted_normalize_record(record: dict, mapping: dict) -> dict:
+    """
+    `normalize_record` tal como era antes de compilar los mapeos: vuelve a analizar cada ruta en cada registro.
+    """
+    normalized = {}
+    for key, path in mapping.items():
+        keys = path.split(".")
+        value = record
+        for k in keys:
+            if "[" in k:
+                k, index = k[:-1].split("[")
+                value = value.get(k, [])[int(index)]
+            else:
+                value = value.get(k)
+            if value is None:
+                break
+        normalized[key] = value
+    return normalized
+
+
+def legacy_normalize(input_path: str, output_path: str) -> int:
+    with open(input_path, "r") as f:
+        raw_data = json.load(f)
+    structured_data = [interpreted_normalize_record(record, BENCH_MAPPING) for record in raw_data]
+    with open(output_path, "w") as f:
+        json.dump(structured_data, f, indent=4)
+    return len(structured_data)
+
+
+def columnar_normalize(input_path: str, output_path: str) -> int:
+    from normalize_data import normalize_source
+
+    return normalize_source([input_path], BENCH_MAPPING, None, output_path)
+
+
+def load_output(mode: str, output_path: str) -> int:
+    """
+    Carga la salida como lo haría un análisis posterior: alimentos con más de 800 kcal, nombre y calorías.
+    """
+    if mode == "columnar":
+        from columnar_storage import read_columns
+
+        return read_columns(output_path, ["name", "calories"], [("calories", ">", 800)]).num_rows
+    if mode == "legacy":
+        with open(output_path, "r") as f:
+            records = json.load(f)
+    else:
+        with open(output_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+    return len([{"name": r["name"], "calories": r["calories"]} for r in records if (r["calories"] or 0) > 800])
+
+
+def interpreted_normalize(input_path: str, output_path: str) -> int:
+    from normalize_data import iter_raw_records
+
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        for record in iter_raw_records([input_path]):
+            out.write(json.dumps(interpreted_normalize_record(record, BENCH_MAPPING), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def streaming_normalize(input_path: str, output_path: str) -> int:
+    from normalize_data import normalize_source
+
+    return normalize_source([input_path], BENCH_MAPPING, None, output_path)
+
+
+def parallel_normalize(input_path: str, output_path: str) -> int:
+    from normalize_data import normalize_sources
+
+    output_dir = os.path.dirname(output_path)
+    summary = normalize_sources({"bench": [input_path]}, {"bench": BENCH_MAPPING}, {}, output_dir)
+    os.replace(os.path.join(output_dir, "bench_structured.ndjson"), output_path)
+    for pid, stats in summary["workers"].items():
+        print(f"  proceso {pid}: {stats['parts']} partes, {stats['records']} registros, {stats['records_per_sec']:.0f} reg/s", file=sys.stderr)
+    return summary["sources"]["bench"]["records"]
+
+
+MODES = {
+    "streaming": streaming_normalize,
+    "columnar": columnar_normalize,
+    "parallel": parallel_normalize,
+    "interpreted": interpreted_normalize,
+    "legacy": legacy_normalize,
+}
+
+
+def run_worker(mode: str, input_path: str, output_path: str):
+    """
+    Ejecuta un modo en este proceso e imprime el resultado en JSON (lo lee el proceso principal).
+    """
+    start = time.perf_counter()
+    records = MODES[mode](input_path, output_path)
+    seconds = time.perf_counter() - start
+    # Pico de la normalización (antes de cargar la salida). En Linux ru_maxrss está en KiB (en macOS, en bytes)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    load_start = time.perf_counter()
+    load_output(mode, output_path)
+    load_seconds = time.perf_counter() - load_start
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+    print(json.dumps({
+        "records": records,
+        "seconds": round(seconds, 2),
+        "records_per_sec": round(records / seconds) if seconds else 0,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "output_mb": round(os.path.getsize(output_path) / (1024 * 1024), 1),
+        "load_seconds": round(load_seconds, 3),
+    }))
+
+
+def run_mode(mode: str, input_path: str, workdir: str, workers: int = 1, chunk_mb: float = 64.0) -> dict:
+    output_path = os.path.join(workdir, f"{mode}_structured" + (".parquet" if mode == "columnar" else ".out"))
+    env = dict(os.environ, NORMALIZE_WORKERS=str(workers), NORMALIZE_CHUNK_MB=str(chunk_mb))
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", mode, "--input", input_path, "--output", output_path],
+        capture_output=True, text=True, env=env,
+    )
+    if mode == "parallel" and completed.returncode == 0:
+        print(completed.stderr, end="", file=sys.stderr)
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"código {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del normalizador de AutomaticApis sobre un volcado sintético.")
+    parser.add_argument("--size-mb", type=float, default=2048.0, help="Tamaño de la entrada sintética")
+    parser.add_argument("--legacy", action="store_true", help="Incluye el normalizador original (carga el fichero entero)")
+    parser.add_argument("--interpreted", action="store_true", help="Incluye el modo en streaming con rutas sin compilar")
+    parser.add_argument("--columnar", action="store_true", help="Incluye la salida en Parquet (requiere pyarrow)")
+    parser.add_argument("--format", choices=["array", "ndjson"], default="array", help="Formato de la entrada sintética")
+    parser.add_argument("--workers", type=int, default=0, help="Añade el modo parallel con este número de procesos (requiere --format ndjson)")
+    parser.add_argument("--chunk-mb", type=float, default=64.0, help="Tamaño de cada trozo en el modo parallel")
+    parser.add_argument("--workdir", help="Directorio de trabajo (por defecto, uno temporal)")
+    parser.add_argument("--keep", action="store_true", help="Conserva la entrada generada")
+    parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON")
+    parser.add_argument("--worker", choices=sorted(MODES), help=argparse.SUPPRESS)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.input, args.output)
+        return
+    if args.workers and args.format != "ndjson":
+        parser.error("--workers necesita --format ndjson (solo el NDJSON se puede repartir por rangos de bytes)")
+    if args.legacy and args.format != "array":
+        parser.error("--legacy necesita --format array")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bwere_normalize_")
+    os.makedirs(workdir, exist_ok=True)
+    input_path = os.path.join(workdir, "usda_synthetic." + ("ndjson" if args.format == "ndjson" else "json"))
+
+    start = time.perf_counter()
+    records = generate_input(input_path, args.size_mb, ndjson=args.format == "ndjson")
+    input_mb = os.path.getsize(input_path) / (1024 * 1024)
+    if not args.json:
+        print(f"Entrada: {input_path} ({input_mb:.0f} MB, {records} registros, generada en {time.perf_counter() - start:.1f} s)")
+
+    modes = ["streaming"] + (["interpreted"] if args.interpreted else []) + (["legacy"] if args.legacy else [])
+    modes += (["columnar"] if args.columnar else []) + (["parallel"] if args.workers else [])
+    try:
+        results = {mode: run_mode(mode, input_path, workdir, args.workers, args.chunk_mb) for mode in modes}
+    finally:
+        if not args.keep:
+            os.remove(input_path)
+            if not args.workdir:
+                os.rmdir(workdir)
+
+    if args.json:
+        print(json.dumps({"input_mb": round(input_mb, 1), "records": records, "modes": results}, indent=2))
+        return
+
+    print(f"\n{'modo':<12}{'seg':>10}{'reg/s':>12}{'RSS MB':>10}{'salida MB':>11}{'carga s':>10}")
+    for mode, r in results.items():
+        if "error" in r:
+            print(f"{mode:<12}  error: {r['error']}")
+            continue
+        print(f"{mode:<12}{r['seconds']:>10.1f}{r['records_per_sec']:>12}{r['peak_rss_mb']:>10.1f}{r['output_mb']:>11.1f}{r['load_seconds']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Sustituto local de Firestore para las pruebas de rendimiento.
+Implementa en memoria el subconjunto del cliente de Firestore que usan los módulos de Bwere
+(colecciones, documentos, consultas con order_by/where/limit/start_after y escrituras por lotes),
+con una latencia configurable por operación para simular la red.
+"""
+import copy
+import time
+import itertools
+import threading
+import datetime
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return FakeQuery(self._db, f"{self.path}/{name}")
+
+    def get(self):
+        self._db.pause(self._db.read_latency)
+        with self._db.lock:
+            data, update_time = self._db.docs.get(self.path, (None, None))
+            return FakeSnapshot(self, copy.deepcopy(data), update_time)
+
+    def set(self, data, merge=False):
+        self._db.pause(self._db.write_latency)
+        self._db.write(self.path, data, merge)
+
+    def update(self, data):
+        self.set(data, merge=True)
+
+    def delete(self):
+        self._db.pause(self._db.write_latency)
+        with self._db.lock:
+            self._db.docs.pop(self.path, None)
+
+
+class FakeQuery:
+    def __init__(self, db, path, orders=(), filters=(), limit=None, after=None):
+        self._db = db
+        self.path = path
+        self._orders = orders
+        self._filters = filters
+        self._limit = limit
+        self._after = after
+
+    def _copy(self, **changes):
+        state = {"orders": self._orders, "filters": self._filters, "limit": self._limit, "after": self._after}
+        state.update(changes)
+        return FakeQuery(self._db, self.path, **state)
+
+    def document(self, document_id=None):
+        document_id = document_id or f"doc{next(self._db.ids):012d}"
+        return FakeDocument(self._db, f"{self.path}/{document_id}")
+
+    def add(self, data):
+        document = self.document()
+        document.set(data)
+        return datetime.datetime.utcnow(), document
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field, direction == "DESCENDING"),))
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, values):
+        return self._copy(after=values)
+
+    def stream(self):
+        self._db.pause(self._db.read_latency)
+        prefix = self.path + "/"
+        with self._db.lock:
+            rows = [
+                (path, copy.deepcopy(data), update_time)
+                for path, (data, update_time) in self._db.docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            ]
+        rows = [row for row in rows if all(_OPERATORS[op](row[1].get(f), v) for f, op, v in self._filters)]
+        for field, descending in reversed(self._orders):
+            rows.sort(key=lambda row: (row[1].get(field) is not None, row[1].get(field)), reverse=descending)
+        if self._after and self._orders:
+            field, descending = self._orders[0]
+            cursor = self._after.get(field)
+            rows = [row for row in rows if (row[1].get(field) < cursor if descending else row[1].get(field) > cursor)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return iter([FakeSnapshot(FakeDocument(self._db, path), data, update_time) for path, data, update_time in rows])
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._operations = []
+
+    def set(self, reference, data, merge=False):
+        self._operations.append(("set", reference.path, data, merge))
+
+    def update(self, reference, data):
+        self._operations.append(("set", reference.path, data, True))
+
+    def delete(self, reference):
+        self._operations.append(("delete", reference.path, None, False))
+
+    def commit(self):
+        self._db.pause(self._db.write_latency)
+        for action, path, data, merge in self._operations:
+            if action == "set":
+                self._db.write(path, data, merge)
+            else:
+                with self._db.lock:
+                    self._db.docs.pop(path, None)
+        self._operations = []
+
+
+class FakeFirestore:
+    """
+    Cliente de Firestore en memoria.
+
+    :param read_latency_ms: Latencia simulada de cada lectura (get o consulta).
+    :param write_latency_ms: Latencia simulada de cada escritura (set, add o commit de un lote).
+    """
+
+    def __init__(self, read_latency_ms: float = 0.0, write_latency_ms: float = 0.0):
+        self.read_latency = read_latency_ms / 1000
+        self.write_latency = write_latency_ms / 1000
+        self.docs = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+
+    def pause(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def write(self, path, data, merge):
+        with self.lock:
+            current, _ = self.docs.get(path, (None, None))
+            if merge and current is not None:
+                current = {**current, **copy.deepcopy(data)}
+            else:
+                current = copy.deepcopy(data)
+            self.docs[path] = (current, datetime.datetime.now(datetime.timezone.utc))
+
+    def collection(self, name):
+        return FakeQuery(self, name)
+
+    def document(self, path):
+        return FakeDocument(self, path)
+
+    def batch(self):
+        return FakeBatch(self)
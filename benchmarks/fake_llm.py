@@ -0,0 +1,35 @@
+"""
+Backend de IA simulado para las pruebas de rendimiento.
+Se registra mediante `BackendManager.register_backend` y responde tras una latencia inicial
+más el tiempo de generar los tokens a la velocidad indicada, sin acceso a la red.
+"""
+import time
+
+
+def make_fake_backend(latency_ms: float = 300.0, tokens_per_second: float = 50.0, reply_tokens: int = 40, stream: bool = False):
+    """
+    Crea el manejador del backend simulado.
+
+    :param latency_ms: Tiempo hasta el primer token.
+    :param tokens_per_second: Velocidad de generación (0 para respuesta inmediata).
+    :param reply_tokens: Número de tokens de cada respuesta.
+    :param stream: Si es True, el manejador devuelve un generador de fragmentos (para `stream_model`).
+    :return: Función manejadora (prompt, options) -> respuesta.
+    """
+    token_delay = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    def tokens(prompt):
+        return [f"token{i} " for i in range(reply_tokens)]
+
+    def handler(prompt, options=None):
+        time.sleep(latency_ms / 1000 + token_delay * reply_tokens)
+        return "".join(tokens(prompt)).strip()
+
+    def streaming_handler(prompt, options=None):
+        time.sleep(latency_ms / 1000)
+        for token in tokens(prompt):
+            if token_delay:
+                time.sleep(token_delay)
+            yield token
+
+    return streaming_handler if stream else handler
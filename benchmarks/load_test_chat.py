@@ -0,0 +1,162 @@
+"""
+Prueba de carga comparativa de la ruta `/chat`.
+Lanza la misma carga contra una o varias instancias (por ejemplo, la API Flask y la API ASGI)
+y compara peticiones por segundo y latencias p50/p95/p99. Si el servidor devuelve la cabecera
+Server-Timing, también resume la duración de cada etapa.
+
+Ejemplo:
+    python benchmarks/load_test_chat.py \
+        --target flask=http://127.0.0.1:5000 \
+        --target asgi=http://127.0.0.1:8000 \
+        --concurrency 32 --requests 2000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.tracing import percentile
+
+
+class ChatClient:
+    """
+    Cliente HTTP con una conexión persistente por hilo.
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = (parts.path.rstrip("/") or "") + "/chat"
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+    def send(self, user_id: str, message: str):
+        """
+        Envía un mensaje a /chat.
+
+        :return: Tupla (código de estado, valor de la cabecera Server-Timing o "").
+        """
+        body = json.dumps({"user_id": user_id, "message": message})
+        connection = self._connection()
+        try:
+            connection.request("POST", self.path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            return response.status, response.getheader("Server-Timing", "")
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+def parse_server_timing(header: str) -> dict:
+    """
+    Convierte una cabecera Server-Timing ("context;dur=1.2, llm;dur=300") en {etapa: milisegundos}.
+    """
+    stages = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if name and key == "dur":
+                try:
+                    stages[name] = float(value)
+                except ValueError:
+                    pass
+    return stages
+
+
+def run_load(base_url: str, concurrency: int, total_requests: int, users: int, timeout: float) -> dict:
+    """
+    Ejecuta la carga contra una instancia y devuelve las métricas.
+
+    :param base_url: URL base de la API.
+    :param concurrency: Número de clientes concurrentes.
+    :param total_requests: Número total de peticiones.
+    :param users: Número de user_id distintos entre los que se reparten las peticiones.
+    :param timeout: Tiempo máximo por petición en segundos.
+    :return: Diccionario con throughput, latencias, errores y desglose por etapa (p50/p95 en ms).
+    """
+    client = ChatClient(base_url, timeout)
+    latencies = []
+    stage_samples = {}
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        timing = ""
+        try:
+            status, timing = client.send(f"loadtest_{i % users}", f"Mensaje de prueba {i}")
+            ok = 200 <= status < 300
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+                for stage, ms in parse_server_timing(timing).items():
+                    stage_samples.setdefault(stage, []).append(ms)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total_requests)))
+    duration = time.perf_counter() - start
+
+    return {
+        "requests": total_requests,
+        "errors": errors,
+        "duration_s": duration,
+        "rps": len(latencies) / duration if duration else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "stages": {
+            stage: {"p50_ms": percentile(values, 0.50), "p95_ms": percentile(values, 0.95)}
+            for stage, values in stage_samples.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga comparativa de /chat.")
+    parser.add_argument("--target", action="append", required=True, help="nombre=url_base (repetible)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.target:
+        name, _, url = target.partition("=")
+        results[name] = run_load(url, args.concurrency, args.requests, args.users, args.timeout)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'destino':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>10}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""
+Configuración de gunicorn para la API asíncrona de Bwere.
+Uso: gunicorn -c gunicorn.conf.py werbly_asgi:app
+"""
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Un solo worker: el orden de los turnos por usuario y el control de admisión (modules/request_control.py)
+# son propios de cada proceso. Con WEB_CONCURRENCY > 1 esas garantías solo se cumplen dentro de cada worker.
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+# Tiempo que se espera a que terminen las peticiones en curso al recibir SIGTERM
+graceful_timeout = int(os.getenv("SHUTDOWN_GRACE_SECONDS", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+keepalive = 5
+accesslog = "-"
+
+# Con varios workers, un archivo de log por proceso (PER_PROCESS_LOG_FILE de modules/logging_config.py): se fija
+# aquí, antes de que los workers importen la aplicación, porque la rotación no es segura entre procesos
+if workers > 1:
+    os.environ.setdefault("LOG_FILE", "Bwere_api-{pid}.log")
@@ -1,52 +1,211 @@
 """
 Archivo principal para arrancar Bwere.
+Cliente de terminal que no necesita servidor HTTP: conversación interactiva con la respuesta en streaming,
+o simulación de varios usuarios a la vez reproduciendo conversaciones guionizadas (JSONL) y midiendo
+la latencia de cada turno. Los turnos solo se guardan en Firestore con `--save`, de modo que las simulaciones
+no dejan historiales sintéticos (qa_user_*) en la base de datos.
+
+Ejemplos:
+    python main.py                                        # conversación interactiva como "loki"
+    python main.py --user ana --save                      # guarda la conversación en Firestore
+    python main.py --script requests.jsonl --users 20 --concurrency 10
 """
+import sys
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 from modules.firebase_connection import init_firebase
-from modules.openai_api import ask_Bwere
-from modules.conversation_manager import save_message
-from modules.user_data import get_user_data, update_user_data
-from modules.analysis_engine import analyze_user_data
-from modules.nutrition_planner import generate_nutrition_plan
-from modules.training_planner import generate_training_plan
-from modules.security_guard import validate_plans
-
-def start_conversation():
+from modules.logging_config import configure_logging
+from modules.chat_pipeline import ChatSession, stream_reply, persist_turn
+from modules.tracing import percentile
+
+EXIT_COMMANDS = ["salir", "exit", "quit"]
+
+
+def load_script(path: str) -> list:
+    """
+    Lee una conversación guionizada en JSONL. Cada línea es un objeto con el mensaje en `message`
+    (o `body`, como en `requests.jsonl`) y, opcionalmente, `user_id` y `delay` (segundos antes de enviarlo).
+
+    :param path: Ruta del archivo JSONL.
+    :return: Lista de turnos {"user_id", "message", "delay"}.
+    """
+    turns = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            message = entry.get("message") or entry.get("body") or entry.get("prompt")
+            if not message:
+                print(f"Línea {line_number} sin mensaje; se omite.")
+                continue
+            turns.append({"user_id": entry.get("user_id"), "message": message, "delay": float(entry.get("delay", 0))})
+    return turns
+
+
+async def stream_turn(session: ChatSession, user_message: str, on_token=None, save: bool = False) -> dict:
+    """
+    Ejecuta un turno con la respuesta en streaming. La llamada a la IA corre en un hilo y cada fragmento
+    se entrega al bucle de eventos en cuanto llega.
+
+    :param session: Sesión del usuario (contexto en memoria).
+    :param user_message: Mensaje del usuario.
+    :param on_token: Función opcional que recibe cada fragmento.
+    :param save: Si es True, guarda el turno en Firestore.
+    :return: Diccionario con la respuesta y las latencias (primer fragmento y total, en ms).
+    """
+    loop = asyncio.get_running_loop()
+    if session.is_stale():
+        await loop.run_in_executor(None, session.refresh)
+    prompt = session.compose(user_message)
+
+    queue = asyncio.Queue()
+    start = time.perf_counter()
+
+    def produce():
+        try:
+            for delta in stream_reply(prompt):
+                loop.call_soon_threadsafe(queue.put_nowait, delta)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    producer = loop.run_in_executor(None, produce)
+    chunks = []
+    first_token = None
+    while True:
+        delta = await queue.get()
+        if delta is None:
+            break
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        chunks.append(delta)
+        if on_token:
+            on_token(delta)
+    await producer
+    total = time.perf_counter() - start
+
+    reply = "".join(chunks)
+    if save:
+        await loop.run_in_executor(None, persist_turn, session.user_id, user_message, reply)
+    session.record(user_message, reply)
+    return {"reply": reply, "first_token_ms": (first_token or total) * 1000, "total_ms": total * 1000}
+
+
+async def start_conversation(user_id: str = "loki", save: bool = False):
     print("Firebase initialized. ¡Comencemos una conversación con Bwere!\n")
     print("Bwere: ¡Hola! Soy Bwere, tu asistente de bienestar personalizado. ¿En qué puedo ayudarte hoy?\n")
 
-    user_id = "loki"  # Puedes cambiar este ID según el usuario con el que deseas interactuar.
+    loop = asyncio.get_running_loop()
+    session = ChatSession(user_id)
     while True:
         try:
-            user_input = input("Tú: ")
-            if user_input.lower() in ["salir", "exit", "quit"]:
-                print("Bwere: ¡Hasta luego! Siempre estaré aquí para ayudarte.")
-                break
+            user_input = (await loop.run_in_executor(None, input, "Tú: ")).strip()
+        except EOFError:
+            break
+        if not user_input:
+            continue
+        if user_input.lower() in EXIT_COMMANDS:
+            print("Bwere: ¡Hasta luego! Siempre estaré aquí para ayudarte.")
+            break
 
-            # Obtener respuesta de Bwere usando GPT
-            response = ask_Bwere(user_id, user_input)  # Proporcionamos ambos argumentos
+        try:
+            print("Bwere: ", end="", flush=True)
+            result = await stream_turn(session, user_input, on_token=lambda delta: print(delta, end="", flush=True), save=save)
+            print(f"\n  ({result['first_token_ms']:.0f} ms hasta el primer fragmento, {result['total_ms']:.0f} ms en total)\n")
+        except Exception as e:
+            print("\nError durante la conversación:", e)
 
-            # Mostrar la respuesta al usuario
-            print(f"Bwere: {response}\n")
 
-            # Guardar la conversación en Firebase (opcional, si quieres activarlo)
-            # save_message(user_id, "user", user_input)
-            # save_message(user_id, "Bwere", response)
+async def simulate_user(user_id: str, turns: list, slots: asyncio.Semaphore, results: list, save: bool, quiet: bool):
+    """
+    Reproduce en orden los turnos de un usuario simulado. Cada turno ocupa un hueco de `slots`.
+    """
+    session = ChatSession(user_id)
+    for turn in turns:
+        if turn["delay"]:
+            await asyncio.sleep(turn["delay"])
+        async with slots:
+            try:
+                result = await stream_turn(session, turn["message"], save=save)
+            except Exception as e:
+                results.append({"user_id": user_id, "error": str(e)})
+                print(f"[{user_id}] Error: {e}")
+                continue
+        results.append({"user_id": user_id, **result})
+        if not quiet:
+            preview = result["reply"].replace("\n", " ")[:80]
+            print(f"[{user_id}] {result['total_ms']:.0f} ms (primer fragmento {result['first_token_ms']:.0f} ms): {preview}")
 
-        except Exception as e:
-            print("Error durante la conversación:", e)
 
+async def run_simulation(script: str, users: int, concurrency: int, save: bool, quiet: bool):
+    """
+    Simula varios usuarios a la vez. Los turnos del guion con `user_id` se asignan a ese usuario;
+    los demás los reproduce cada uno de los `users` usuarios simulados (qa_user_0, qa_user_1, ...).
+    """
+    turns = load_script(script)
+    conversations = {}
+    shared = [turn for turn in turns if not turn["user_id"]]
+    for i in range(users if shared else 0):
+        conversations[f"qa_user_{i}"] = list(shared)
+    for turn in turns:
+        if turn["user_id"]:
+            conversations.setdefault(turn["user_id"], []).append(turn)
+
+    total_turns = sum(len(t) for t in conversations.values())
+    print(f"Simulando {len(conversations)} usuarios ({total_turns} turnos, {concurrency} a la vez)...\n")
+
+    results = []
+    slots = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        simulate_user(user_id, user_turns, slots, results, save, quiet)
+        for user_id, user_turns in conversations.items()
+    ))
+    duration = time.perf_counter() - start
 
-def run_app():
+    completed = [r for r in results if "error" not in r]
+    totals = [r["total_ms"] for r in completed]
+    first_tokens = [r["first_token_ms"] for r in completed]
+    print(f"\nTurnos: {len(completed)} correctos, {len(results) - len(completed)} con error en {duration:.1f} s "
+          f"({len(completed) / duration if duration else 0:.1f} turnos/s)")
+    print(f"{'latencia':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, values in (("total", totals), ("primer fragmento", first_tokens)):
+        print(f"{label:<18}{percentile(values, 0.50):>10.0f}{percentile(values, 0.95):>10.0f}{percentile(values, 0.99):>10.0f}")
+
+
+def run_app(argv=None):
     """
     Flujo principal de la aplicación.
     """
-    # 1. Inicializar Firebase
+    parser = argparse.ArgumentParser(description="Cliente de terminal de Bwere.")
+    parser.add_argument("--user", default="loki", help="user_id de la conversación interactiva")
+    parser.add_argument("--script", help="Archivo JSONL con conversaciones a reproducir")
+    parser.add_argument("--users", type=int, default=1, help="Usuarios simulados que reproducen el guion")
+    parser.add_argument("--concurrency", type=int, default=8, help="Turnos simultáneos como máximo")
+    parser.add_argument("--save", action="store_true", help="Guarda los turnos en Firestore")
+    parser.add_argument("--quiet", action="store_true", help="Solo muestra el resumen de la simulación")
+    args = parser.parse_args(argv)
+
+    # 1. Configurar logs e inicializar Firebase
+    configure_logging()
     init_firebase()
     print("Firebase initialized.")
 
-    # 2. Iniciar conversación interactiva
-    start_conversation()
+    async def main():
+        # Las llamadas bloqueantes (Firestore, IA) se ejecutan en este pool de hilos
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(4, args.concurrency * 2)))
+        if args.script:
+            await run_simulation(args.script, args.users, args.concurrency, args.save, args.quiet)
+        else:
+            # 2. Iniciar conversación interactiva
+            await start_conversation(args.user, args.save)
+
+    asyncio.run(main())
 
 if __name__ == "__main__":
-    run_app()
\ No newline at end of file
+    run_app(sys.argv[1:])
@@ -17,15 +17,12 @@ import os
 import logging
 import time
 import uuid
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential
 import openai
 import requests
-from backend_manager import BackendManager
-
-# Configuración del sistema de logs
-logging_level = os.getenv("LOGGING_LEVEL", "INFO").upper()
-logging.basicConfig(level=logging_level, format="%(asctime)s - %(levelname)s - %(message)s")
+from modules.backend_manager import BackendManager
+from modules.tracing import span
 
 # Configuración global para el módulo
 DEFAULT_BACKEND = os.getenv("AI_BACKEND", "openai")  # "openai", "llama", "custom"
@@ -35,6 +32,14 @@ LLAMA_TIMEOUT = int(os.getenv("LLAMA_TIMEOUT", 10))
 RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", 3))
 WAIT_MULTIPLIER = float(os.getenv("WAIT_MULTIPLIER", 1.0))
 
+
+class ModelStreamError(RuntimeError):
+    """
+    Error lanzado por `AICore.stream_model` cuando el backend falla durante el streaming.
+    Los fragmentos ya entregados no forman una respuesta válida y no deben guardarse.
+    """
+
+
 class AICore:
     """
     Clase principal para gestionar todas las interacciones con IA.
@@ -66,22 +71,54 @@ class AICore:
         query_id = uuid.uuid4()
         self._validate_prompt(prompt)
         start_time = time.time()
+        with span("ai.query_model", backend=self.backend, prompt_chars=len(prompt), prompt_tokens_est=len(prompt) // 4) as current:
+            try:
+                logging.info(f"[{query_id}] Enviando prompt al backend {self.backend}: {prompt}", extra={"sample_key": "ai.prompt"})
+                if self.backend == "openai":
+                    response = self._query_openai(prompt, self._validate_options(options, "openai"))
+                elif self.backend == "llama":
+                    response = self._query_llama(prompt, self._validate_options(options, "llama"))
+                elif self.backend in self.backend_manager.list_backends():
+                    response = self.backend_manager.query_backend(self.backend, prompt, options)
+                else:
+                    raise ValueError(f"[{query_id}] Backend de IA desconocido: {self.backend}")
+                elapsed_time = time.time() - start_time
+                self.log_performance(self.backend, elapsed_time)
+                current.set_attributes({"response_chars": len(response), "response_tokens_est": len(response) // 4})
+                return response
+            except Exception as e:
+                self.log_error(self.backend, e)
+                current.set_attribute("error", str(e))
+                return f"Error al consultar el modelo {self.backend}: {str(e)}"
+
+    def stream_model(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Envía un prompt al modelo configurado y devuelve la respuesta por fragmentos a medida que se genera.
+        Los backends sin soporte de streaming devuelven la respuesta completa en un único fragmento.
+
+        :param prompt: Texto que se enviará al modelo de IA.
+        :param options: Opciones adicionales específicas del backend.
+        :return: Iterador de fragmentos de texto.
+        :raises ModelStreamError: Si el backend falla antes o durante la generación.
+        """
+        query_id = uuid.uuid4()
+        self._validate_prompt(prompt)
+        start_time = time.time()
         try:
-            logging.info(f"[{query_id}] Enviando prompt al backend {self.backend}: {prompt}")
+            logging.info(f"[{query_id}] Enviando prompt al backend {self.backend} (streaming): {prompt}", extra={"sample_key": "ai.prompt"})
             if self.backend == "openai":
-                response = self._query_openai(prompt, self._validate_options(options, "openai"))
+                yield from self._stream_openai(prompt, self._validate_options(options, "openai"))
             elif self.backend == "llama":
-                response = self._query_llama(prompt, self._validate_options(options, "llama"))
+                yield self._request_llama(prompt, self._validate_options(options, "llama"))
             elif self.backend in self.backend_manager.list_backends():
-                response = self.backend_manager.query_backend(self.backend, prompt, options)
+                yield from self.backend_manager.stream_backend(self.backend, prompt, options)
             else:
                 raise ValueError(f"[{query_id}] Backend de IA desconocido: {self.backend}")
-            elapsed_time = time.time() - start_time
-            self.log_performance(self.backend, elapsed_time)
-            return response
+            self.log_performance(self.backend, time.time() - start_time)
         except Exception as e:
             self.log_error(self.backend, e)
-            return f"Error al consultar el modelo {self.backend}: {str(e)}"
+            raise ModelStreamError(f"Error al consultar el modelo {self.backend}: {str(e)}") from e
+
     def _validate_prompt(self, prompt: str):
         """
         Valida que el prompt sea válido.
@@ -143,6 +180,27 @@ class AICore:
             logging.error(f"Respuesta de OpenAI en formato inesperado: {str(e)}")
             return "Error: La respuesta de OpenAI no tiene el formato esperado."
 
+    def _stream_openai(self, prompt: str, options: Dict[str, Any]) -> Iterator[str]:
+        """
+        Envía un prompt a OpenAI en modo streaming y devuelve los fragmentos de la respuesta.
+
+        :param prompt: Texto que se enviará a OpenAI.
+        :param options: Opciones adicionales como temperatura, tokens, etc.
+        :return: Iterador de fragmentos de texto.
+        """
+        openai.api_key = OPENAI_API_KEY
+        response = openai.ChatCompletion.create(
+            model=options["model"],
+            messages=[{"role": "user", "content": prompt}],
+            temperature=options["temperature"],
+            max_tokens=options["max_tokens"],
+            stream=True
+        )
+        for chunk in response:
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
     @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_exponential(multiplier=WAIT_MULTIPLIER, min=4, max=10))
     def _query_llama(self, prompt: str, options: Dict[str, Any]) -> str:
         """
@@ -153,17 +211,28 @@ class AICore:
         :return: Respuesta generada por el modelo.
         """
         try:
-            payload = {
-                "prompt": prompt,
-                "temperature": options["temperature"],
-                "max_tokens": options["max_tokens"]
-            }
-            response = requests.post(LLAMA_API_ENDPOINT, json=payload, timeout=LLAMA_TIMEOUT)
-            response.raise_for_status()
-            return self._validate_response(response.json(), "llama")
+            return self._request_llama(prompt, options)
         except requests.exceptions.RequestException as e:
             logging.error(f"Error al consultar el modelo LLaMA: {str(e)}")
             return f"Error en LLaMA: {str(e)}"
+
+    def _request_llama(self, prompt: str, options: Dict[str, Any]) -> str:
+        """
+        Realiza la petición al modelo LLaMA sin capturar los errores de red (los usa `stream_model`).
+
+        :param prompt: Texto que se enviará al modelo LLaMA.
+        :param options: Opciones adicionales específicas del modelo.
+        :return: Respuesta generada por el modelo.
+        """
+        payload = {
+            "prompt": prompt,
+            "temperature": options["temperature"],
+            "max_tokens": options["max_tokens"]
+        }
+        response = requests.post(LLAMA_API_ENDPOINT, json=payload, timeout=LLAMA_TIMEOUT)
+        response.raise_for_status()
+        return self._validate_response(response.json(), "llama")
+
     def register_backend(self, name: str, handler: callable):
         """
         Registra un nuevo backend personalizado.
@@ -236,7 +305,7 @@ class AICore:
         :param backend: Nombre del backend utilizado.
         :param elapsed_time: Tiempo transcurrido en segundos.
         """
-        logging.info(f"Tiempo de ejecución para el backend '{backend}': {elapsed_time:.2f} segundos.")
+        logging.info(f"Tiempo de ejecución para el backend '{backend}': {elapsed_time:.2f} segundos.", extra={"sample_key": "ai.elapsed"})
 
     def log_error(self, backend: str, error: Exception):
         """
@@ -265,3 +334,20 @@ class AICore:
                 results[backend] = f"Error: {str(e)}"
                 self.log_error(backend, e)
         return results
+
+
+# Instancia compartida del núcleo de IA
+_ai_core = None
+
+
+def get_ai_core() -> AICore:
+    """
+    Retorna la instancia compartida de `AICore`, creándola si fuera necesario. La usan la API
+    (`chat_pipeline`) y los módulos de dominio (planificadores, `security_guard`, `analysis_engine`...).
+
+    :return: Instancia de `AICore`.
+    """
+    global _ai_core
+    if _ai_core is None:
+        _ai_core = AICore()
+    return _ai_core
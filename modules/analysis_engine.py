@@ -13,10 +13,12 @@ No impone reglas predefinidas ni conclusiones finales, delegando la toma de deci
 """
 
 from typing import Dict, Any, Optional
-from modules.ai_core import query_model
+from modules.ai_core import get_ai_core
 from modules.user_data import get_user_data
+from modules.tracing import traced
 import math
 
+@traced("analysis.prepare_context")
 def prepare_analysis_context(user_id: str) -> Dict[str, Any]:
     """
     Prepara un contexto estructurado basado en los datos del usuario y cálculos iniciales.
@@ -51,6 +53,29 @@ def prepare_analysis_context(user_id: str) -> Dict[str, Any]:
         raise RuntimeError(f"Error al preparar el contexto de análisis para el usuario {user_id}: {str(e)}")
 
 
+def analyze_user_data(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calcula, sin consultar a la IA, los indicadores que usan los planificadores a partir de los datos del usuario.
+    Solo se incluyen los indicadores que los datos disponibles permiten calcular.
+
+    :param user_data: Datos del usuario (peso en kg, altura en metros, edad, nivel de actividad...).
+    :return: Diccionario con `bmi`, `recommended_calories` y `needs_more_protein` cuando se pueden calcular.
+    """
+    weight = user_data.get("weight")
+    height = user_data.get("height")
+    age = user_data.get("age")
+    analysis = {}
+    if weight and height:
+        analysis["bmi"] = calculate_bmi(weight, height)
+        if age:
+            analysis["recommended_calories"] = calculate_calories(weight, height, age, user_data.get("activity_level", "moderate"))
+    protein_intake = user_data.get("protein_intake")  # Gramos al día
+    if weight and protein_intake is not None:
+        # Referencia mínima de 1,2 g de proteína por kg de peso corporal
+        analysis["needs_more_protein"] = protein_intake < 1.2 * weight
+    return analysis
+
+
 def analyze_with_ai(user_id: str, options: Optional[Dict[str, Any]] = None) -> str:
     """
     Envia el contexto de análisis a la IA para obtener insights avanzados.
@@ -72,7 +97,7 @@ def analyze_with_ai(user_id: str, options: Optional[Dict[str, Any]] = None) -> s
         )
 
         # Enviar el prompt al núcleo de IA
-        response = query_model(prompt, options)
+        response = get_ai_core().query_model(prompt, options)
         return response
     except Exception as e:
         return f"Error al analizar los datos con la IA: {str(e)}"
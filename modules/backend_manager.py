@@ -15,9 +15,6 @@ de forma dinámica.
 import logging
 import requests
 
-# Configuración del sistema de logs
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-
 class BackendManager:
     """
     Clase para gestionar backends personalizados.
@@ -56,7 +53,7 @@ class BackendManager:
 
         :return: Diccionario con los backends registrados.
         """
-        logging.info(f"Backends registrados: {list(self.custom_backends.keys())}")
+        logging.info(f"Backends registrados: {list(self.custom_backends.keys())}", extra={"sample_key": "ai.backends_registered"})
         return self.custom_backends
 
     def test_backend(self, name: str, test_function: callable = None) -> bool:
@@ -116,14 +113,44 @@ class BackendManager:
         try:
             handler = self.custom_backends[name]
             response = handler(prompt, options)
-            logging.info(f"Respuesta del backend '{name}': {response}")
+            logging.info(f"Respuesta del backend '{name}': {response}", extra={"sample_key": "ai.backend_response"})
             return response
         except Exception as e:
             logging.error(f"Error al consultar el backend '{name}': {str(e)}")
             return f"Error al consultar el backend: {str(e)}"
 
+    def stream_backend(self, name: str, prompt: str, options: dict = None):
+        """
+        Envía una consulta a un backend personalizado y devuelve la respuesta por fragmentos.
+        Si el manejador devuelve un texto completo en lugar de un iterador, se entrega como un único fragmento.
+
+        :param name: Nombre del backend.
+        :param prompt: Prompt que se enviará al backend.
+        :param options: Opciones adicionales para la consulta.
+        :return: Iterador de fragmentos de texto.
+        :raises ValueError: Si el backend no está registrado.
+        """
+        # A diferencia de `query_backend`, los errores se propagan: los fragmentos ya entregados
+        # no pueden sustituirse por un mensaje de error
+        if name not in self.custom_backends:
+            logging.error(f"El backend '{name}' no está registrado.")
+            raise ValueError(f"El backend '{name}' no está registrado.")
+
+        try:
+            response = self.custom_backends[name](prompt, options)
+            if isinstance(response, str):
+                yield response
+            else:
+                yield from response
+        except Exception as e:
+            logging.error(f"Error al consultar el backend '{name}': {str(e)}")
+            raise
+
 # Ejemplo de uso del BackendManager
 if __name__ == "__main__":
+    from modules.logging_config import configure_logging
+    configure_logging(console=True)
+
     manager = BackendManager()
 
     # Registrar un backend de ejemplo
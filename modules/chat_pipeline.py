@@ -0,0 +1,202 @@
+"""
+Módulo de Flujo de Conversación de Bwere (chat_pipeline).
+Descompone un turno de conversación en pasos independientes: carga de contexto, construcción del prompt,
+consulta a la IA y guardado del turno.
+
+**Propósito**:
+- Permite que los servidores asíncronos esperen por separado las lecturas de Firestore y la llamada a la IA,
+  sin bloquear el bucle de eventos.
+- Reutiliza el contexto cargado (prompt base, perfil e historial) entre varios mensajes cuando el llamador
+  lo mantiene en memoria (`ChatSession`).
+
+**Conexión con otros módulos**:
+- **Entrada de datos:** Usa `prompt_manager`, `user_data` y `conversation_manager` para cargar el contexto.
+- **Consulta a la IA:** Envía el prompt a la instancia compartida de `ai_core.AICore` (`get_ai_core`).
+- **Salida de datos:** Guarda el mensaje del usuario y la respuesta en Firestore mediante `conversation_manager`.
+"""
+import os
+import json
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from modules.ai_core import get_ai_core
+from modules.prompt_manager import get_base_prompt
+from modules.user_data import get_user_data
+from modules.conversation_manager import get_conversation_history, save_message, save_messages
+from modules.tracing import traced
+
+# Longitud máxima aceptada por `AICore._validate_prompt`
+MAX_PROMPT_CHARS = 5000
+MAX_PROFILE_CHARS = 1000
+HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", 20))
+# Tiempo tras el cual una sesión vuelve a leer el perfil y el historial de Firestore
+SESSION_CONTEXT_TTL = int(os.getenv("CHAT_SESSION_CONTEXT_TTL", 300))
+
+
+@traced("chat.load_chat_context")
+def load_chat_context(user_id: str) -> Dict[str, Any]:
+    """
+    Carga desde Firestore todo lo necesario para responder al usuario.
+
+    :param user_id: Identificador único del usuario.
+    :return: Diccionario con el prompt base, el perfil y el historial reciente.
+    """
+    return {
+        "base_prompt": get_base_prompt(),
+        "profile": get_user_data(user_id),
+        "history": get_conversation_history(user_id, limit=HISTORY_LIMIT),
+    }
+
+
+@traced("chat.compose_chat_prompt")
+def compose_chat_prompt(context: Dict[str, Any], user_message: str) -> str:
+    """
+    Construye el prompt final con el prompt base, el perfil, el historial más reciente que quepa
+    en el límite de longitud y el mensaje del usuario.
+
+    :param context: Contexto devuelto por `load_chat_context`.
+    :param user_message: Mensaje del usuario.
+    :return: Prompt final.
+    """
+    base = context.get("base_prompt", "")
+    tail = f"\n\nUsuario: {user_message}"
+
+    profile = context.get("profile") or {}
+    profile_text = ""
+    if profile:
+        profile_text = json.dumps(profile, ensure_ascii=False, default=str, separators=(",", ":"))[:MAX_PROFILE_CHARS]
+        profile_text = f"\n\nPerfil del usuario: {profile_text}"
+
+    budget = MAX_PROMPT_CHARS - len(base) - len(profile_text) - len(tail) - len("\n\nConversación reciente:")
+    lines = []
+    for message in reversed(context.get("history") or []):
+        line = f"\n{message.get('role')}: {message.get('content')}"
+        if len(line) > budget:
+            break
+        budget -= len(line)
+        lines.append(line)
+
+    history_text = "\n\nConversación reciente:" + "".join(reversed(lines)) if lines else ""
+    return f"{base}{profile_text}{history_text}{tail}".strip()[:MAX_PROMPT_CHARS]
+
+
+def generate_reply(prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Envía el prompt al backend de IA configurado.
+
+    :param prompt: Prompt final.
+    :param options: Opciones adicionales para el backend.
+    :return: Respuesta generada por la IA.
+    """
+    return get_ai_core().query_model(prompt, options)
+
+
+def stream_reply(prompt: str, options: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    Envía el prompt al backend de IA configurado y devuelve la respuesta por fragmentos.
+
+    :param prompt: Prompt final.
+    :param options: Opciones adicionales para el backend.
+    :return: Iterador de fragmentos de la respuesta.
+    :raises ModelStreamError: Si el backend falla; la respuesta parcial no debe guardarse.
+    """
+    return get_ai_core().stream_model(prompt, options)
+
+
+@traced("chat.persist_turn")
+def persist_turn(user_id: str, user_message: str, reply: str):
+    """
+    Guarda el mensaje del usuario y la respuesta de Bwere en el historial.
+
+    :param user_id: Identificador único del usuario.
+    :param user_message: Mensaje del usuario.
+    :param reply: Respuesta generada.
+    """
+    save_message(user_id, "user", user_message)
+    save_message(user_id, "assistant", reply)
+
+
+def append_turn(context: Dict[str, Any], user_message: str, reply: str):
+    """
+    Añade un turno al historial del contexto en memoria para que los mensajes siguientes lo tengan en cuenta
+    sin volver a leer Firestore.
+
+    :param context: Contexto devuelto por `load_chat_context`.
+    :param user_message: Mensaje del usuario.
+    :param reply: Respuesta generada.
+    """
+    context["history"] = list(context.get("history") or []) + [
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": reply},
+    ]
+
+
+@traced("chat.persist_turns")
+def persist_turns(user_id: str, turns: List[Tuple[str, str]]):
+    """
+    Guarda varios turnos (mensaje del usuario y respuesta) con una sola escritura por lotes.
+
+    :param user_id: Identificador único del usuario.
+    :param turns: Lista de tuplas (mensaje del usuario, respuesta) en orden.
+    """
+    messages = []
+    for user_message, reply in turns:
+        messages.append(("user", user_message))
+        messages.append(("assistant", reply))
+    save_messages(user_id, messages)
+
+
+class ChatSession:
+    """
+    Contexto de conversación de un usuario mantenido en memoria mientras dure una sesión (por ejemplo,
+    una conexión WebSocket). Cada mensaje solo añade el turno al historial en memoria; el contexto completo
+    se vuelve a leer de Firestore cuando supera `SESSION_CONTEXT_TTL`.
+    """
+
+    def __init__(self, user_id: str, context_ttl: int = SESSION_CONTEXT_TTL):
+        self.user_id = user_id
+        self.context_ttl = context_ttl
+        self.context: Optional[Dict[str, Any]] = None
+        self.loaded_at = 0.0
+
+    def is_stale(self) -> bool:
+        return self.context is None or time.monotonic() - self.loaded_at > self.context_ttl
+
+    def refresh(self):
+        """
+        Carga (o recarga) el prompt base, el perfil y el historial desde Firestore.
+        """
+        self.context = load_chat_context(self.user_id)
+        self.loaded_at = time.monotonic()
+
+    def compose(self, user_message: str) -> str:
+        """
+        Construye el prompt del mensaje con el contexto en memoria.
+
+        :param user_message: Mensaje del usuario.
+        :return: Prompt final.
+        """
+        return compose_chat_prompt(self.context, user_message)
+
+    def record(self, user_message: str, reply: str):
+        """
+        Añade el turno al historial en memoria, conservando solo los mensajes más recientes.
+
+        :param user_message: Mensaje del usuario.
+        :param reply: Respuesta generada.
+        """
+        append_turn(self.context, user_message, reply)
+        self.context["history"] = self.context["history"][-HISTORY_LIMIT:]
+
+
+def run_chat_turn(user_id: str, user_message: str) -> str:
+    """
+    Ejecuta un turno completo de conversación de forma síncrona.
+
+    :param user_id: Identificador único del usuario.
+    :param user_message: Mensaje del usuario.
+    :return: Respuesta generada por la IA.
+    """
+    context = load_chat_context(user_id)
+    reply = generate_reply(compose_chat_prompt(context, user_message))
+    persist_turn(user_id, user_message, reply)
+    return reply
@@ -0,0 +1,131 @@
+"""
+Módulo de Compresión HTTP de Bwere (compression).
+Comprime las respuestas de la API según la cabecera `Accept-Encoding` del cliente.
+
+**Propósito**:
+- Negocia la codificación: brotli (`br`) si el módulo `brotli` está instalado y el cliente lo acepta; si no, gzip.
+- Solo comprime respuestas completas de tipo texto o JSON que superan un tamaño mínimo; las respuestas
+  en streaming y las ya codificadas se envían sin cambios.
+- Todas las respuestas de tipo comprimible (y las 304) llevan `Vary: Accept-Encoding`, también las que se
+  envían sin comprimir, para que las cachés intermedias no sirvan una versión a un cliente que no la admite.
+
+**Conexión con otros módulos**:
+- Es utilizado por `werbly_asgi` como middleware ASGI.
+"""
+import os
+import gzip
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se usa gzip
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 500))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Elige la codificación preferida a partir de la cabecera Accept-Encoding.
+
+    :param accept_encoding: Valor de la cabecera (por ejemplo, "gzip, deflate, br;q=0.9").
+    :return: "br", "gzip" o None si el cliente no acepta ninguna de las dos.
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Comprime el cuerpo con la codificación indicada.
+
+    :param body: Cuerpo de la respuesta.
+    :param encoding: "br" o "gzip".
+    :return: Cuerpo comprimido.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime las respuestas completas cuando el cliente lo admite.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    @staticmethod
+    def _add_vary(message):
+        message["headers"] = list(message.get("headers", []))
+        headers = MutableHeaders(raw=message["headers"])
+        if message["status"] == 304 or headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            headers.add_vary_header("Accept-Encoding")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        passthrough = encoding is None
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                self._add_vary(message)
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or len(body) < self.minimum_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                # Respuesta en streaming, ya codificada, pequeña o binaria: se envía tal cual
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
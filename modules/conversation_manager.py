@@ -13,6 +13,7 @@ Este módulo actúa como el núcleo para gestionar los diálogos entre el usuari
 """
 
 import datetime
+from firebase_admin import firestore
 from modules.firebase_connection import get_firestore_client
 
 
@@ -37,6 +38,32 @@ def save_message(user_id: str, role: str, content: str):
       })
 
 
+def save_messages(user_id: str, messages: list):
+    """
+    Guarda varios turnos de conversación con una única escritura por lotes.
+    Cada mensaje recibe una marca de tiempo creciente para conservar el orden.
+
+    :param user_id: Identificador único del usuario.
+    :param messages: Lista de tuplas (role, content) en orden cronológico.
+    """
+    if not user_id or not messages or any(not role or not content for role, content in messages):
+        raise ValueError("Todos los campos (user_id, role, content) son obligatorios.")
+
+    db = get_firestore_client()
+    conversations_ref = db.collection("usuarios").document(user_id).collection("conversaciones")
+    batch = db.batch()
+    now = datetime.datetime.utcnow()
+
+    for offset, (role, content) in enumerate(messages):
+        batch.set(conversations_ref.document(), {
+            "role": role,
+            "content": content,
+            "timestamp": now + datetime.timedelta(microseconds=offset)
+        })
+
+    batch.commit()
+
+
 def get_conversation_history(user_id: str, limit: int = 50) -> list:
     """
     Recupera el historial completo o limitado de la conversación desde Firestore.
@@ -63,6 +90,40 @@ def get_conversation_history(user_id: str, limit: int = 50) -> list:
     return history
 
 
+def get_conversation_page(user_id: str, limit: int = 50, before: str = None) -> dict:
+    """
+    Recupera una página del historial, de los mensajes más recientes a los más antiguos.
+
+    :param user_id: Identificador único del usuario.
+    :param limit: Número máximo de mensajes de la página.
+    :param before: Cursor devuelto por la página anterior (marca de tiempo ISO del último mensaje recibido).
+    :return: Diccionario {"messages": [...], "next_cursor": str o None}. Cada mensaje incluye su
+             marca de tiempo y la fecha de actualización del documento.
+    """
+    if not user_id:
+        raise ValueError("El user_id es obligatorio para recuperar el historial.")
+
+    db = get_firestore_client()
+    query = db.collection("usuarios").document(user_id)\
+              .collection("conversaciones").order_by("timestamp", direction=firestore.Query.DESCENDING)
+    if before:
+        query = query.start_after({"timestamp": datetime.datetime.fromisoformat(before)})
+
+    messages = []
+    for doc in query.limit(limit).stream():
+        timestamp = doc.get("timestamp")
+        messages.append({
+            "id": doc.id,
+            "role": doc.get("role"),
+            "content": doc.get("content"),
+            "timestamp": timestamp.isoformat() if timestamp else None,
+            "updated_at": str(getattr(doc, "update_time", None) or timestamp),
+        })
+
+    next_cursor = messages[-1]["timestamp"] if len(messages) == limit else None
+    return {"messages": messages, "next_cursor": next_cursor}
+
+
 def delete_conversation_history(user_id: str):
     """
     Elimina todo el historial de conversación de un usuario desde Firestore.
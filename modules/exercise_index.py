@@ -0,0 +1,193 @@
+"""
+Módulo de Índice de Ejercicios de Bwere.
+Carga el corpus estructurado de ejercicios en memoria y lo indexa para consultas inmediatas.
+
+**Propósito**:
+- Mantiene en memoria un índice de ejercicios por grupo muscular, equipamiento, dificultad y contraindicación.
+- Permite a `training_planner` seleccionar ejercicios en milisegundos y sin consultar a la IA.
+
+**Conexión con otros módulos**:
+- **Entrada de datos:** Lee el corpus de ejercicios que genera la etapa `exercises` del pipeline de `AutomaticApis`
+  (`build_exercise_corpus.py`, a partir de las páginas de ExRx y MuscleWiki; ACSM no publica fichas de ejercicios)
+  desde la ruta definida en `EXERCISE_CORPUS_PATH` (por defecto, `AutomaticApis/structured_data/exercises.json`,
+  resuelta a partir de la ubicación de este módulo).
+  Si el archivo no existe (el pipeline no se ha ejecutado o no encontró ejercicios), utiliza un catálogo básico integrado.
+- **Salida de datos:** Proporciona listas de ejercicios candidatos a `training_planner`.
+"""
+import os
+import json
+import logging
+from typing import Dict, Any, List, Iterable, Optional, Set
+
+EXERCISE_CORPUS_PATH = os.getenv(
+    "EXERCISE_CORPUS_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "AutomaticApis", "structured_data", "exercises.json"),
+)
+
+DIFFICULTY_LEVELS = {"beginner": 1, "intermediate": 2, "advanced": 3}
+
+# Catálogo básico utilizado cuando el corpus del pipeline no está disponible
+DEFAULT_EXERCISES = [
+    {"name": "Squats", "muscle_groups": ["legs", "glutes"], "equipment": "bodyweight", "difficulty": "beginner", "contraindications": ["knee"]},
+    {"name": "Goblet Squat", "muscle_groups": ["legs", "glutes"], "equipment": "dumbbell", "difficulty": "beginner", "contraindications": ["knee"]},
+    {"name": "Barbell Back Squat", "muscle_groups": ["legs", "glutes", "core"], "equipment": "barbell", "difficulty": "advanced", "contraindications": ["knee", "lower_back"]},
+    {"name": "Glute Bridge", "muscle_groups": ["glutes", "legs"], "equipment": "bodyweight", "difficulty": "beginner", "contraindications": []},
+    {"name": "Romanian Deadlift", "muscle_groups": ["legs", "glutes", "back"], "equipment": "dumbbell", "difficulty": "intermediate", "contraindications": ["lower_back"]},
+    {"name": "Walking Lunges", "muscle_groups": ["legs", "glutes"], "equipment": "bodyweight", "difficulty": "intermediate", "contraindications": ["knee"]},
+    {"name": "Push-ups", "muscle_groups": ["chest", "arms", "shoulders"], "equipment": "bodyweight", "difficulty": "beginner", "contraindications": ["wrist", "shoulder"]},
+    {"name": "Dumbbell Bench Press", "muscle_groups": ["chest", "arms"], "equipment": "dumbbell", "difficulty": "intermediate", "contraindications": ["shoulder"]},
+    {"name": "Barbell Bench Press", "muscle_groups": ["chest", "arms", "shoulders"], "equipment": "barbell", "difficulty": "advanced", "contraindications": ["shoulder"]},
+    {"name": "Inverted Row", "muscle_groups": ["back", "arms"], "equipment": "bodyweight", "difficulty": "beginner", "contraindications": []},
+    {"name": "One-Arm Dumbbell Row", "muscle_groups": ["back", "arms"], "equipment": "dumbbell", "difficulty": "beginner", "contraindications": ["lower_back"]},
+    {"name": "Pull-ups", "muscle_groups": ["back", "arms"], "equipment": "pull_up_bar", "difficulty": "advanced", "contraindications": ["shoulder", "elbow"]},
+    {"name": "Band Pull-Apart", "muscle_groups": ["back", "shoulders"], "equipment": "band", "difficulty": "beginner", "contraindications": []},
+    {"name": "Pike Push-ups", "muscle_groups": ["shoulders", "arms"], "equipment": "bodyweight", "difficulty": "intermediate", "contraindications": ["shoulder", "wrist"]},
+    {"name": "Dumbbell Shoulder Press", "muscle_groups": ["shoulders", "arms"], "equipment": "dumbbell", "difficulty": "intermediate", "contraindications": ["shoulder"]},
+    {"name": "Lateral Raise", "muscle_groups": ["shoulders"], "equipment": "dumbbell", "difficulty": "beginner", "contraindications": ["shoulder"]},
+    {"name": "Plank", "muscle_groups": ["core"], "equipment": "bodyweight", "difficulty": "beginner", "contraindications": ["lower_back"]},
+    {"name": "Dead Bug", "muscle_groups": ["core"], "equipment": "bodyweight", "difficulty": "beginner", "contraindications": []},
+    {"name": "Hanging Knee Raise", "muscle_groups": ["core"], "equipment": "pull_up_bar", "difficulty": "intermediate", "contraindications": ["shoulder"]},
+    {"name": "Bicep Curl", "muscle_groups": ["arms"], "equipment": "dumbbell", "difficulty": "beginner", "contraindications": ["elbow"]},
+    {"name": "Bench Dips", "muscle_groups": ["arms", "chest"], "equipment": "bodyweight", "difficulty": "intermediate", "contraindications": ["shoulder", "wrist"]},
+    {"name": "Calf Raises", "muscle_groups": ["calves"], "equipment": "bodyweight", "difficulty": "beginner", "contraindications": []},
+]
+
+
+def _as_set(value: Any) -> Set[str]:
+    """
+    Normaliza un valor (texto o lista) a un conjunto de etiquetas en minúsculas.
+
+    :param value: Texto, lista o None.
+    :return: Conjunto de etiquetas.
+    """
+    if not value:
+        return set()
+    if isinstance(value, str):
+        value = [value]
+    return {str(item).strip().lower().replace(" ", "_") for item in value if str(item).strip()}
+
+
+def normalize_exercise(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Convierte un registro del corpus al formato interno del índice.
+
+    :param record: Registro de ejercicio (acepta `muscle_group` o `muscle_groups`).
+    :return: Ejercicio normalizado o None si el registro no tiene nombre.
+    """
+    name = record.get("name") or record.get("exercise")
+    if not name:
+        return None
+    difficulty = str(record.get("difficulty", "beginner")).lower()
+    return {
+        "name": name,
+        "muscle_groups": sorted(_as_set(record.get("muscle_groups") or record.get("muscle_group"))),
+        "equipment": (sorted(_as_set(record.get("equipment"))) or ["bodyweight"])[0],
+        "difficulty": difficulty if difficulty in DIFFICULTY_LEVELS else "beginner",
+        "contraindications": sorted(_as_set(record.get("contraindications"))),
+        "source": record.get("source"),
+    }
+
+
+class ExerciseIndex:
+    """
+    Índice en memoria de ejercicios. Cada índice secundario asocia una etiqueta con el conjunto
+    de posiciones de los ejercicios que la tienen, de modo que las consultas son intersecciones de conjuntos.
+    """
+
+    def __init__(self, exercises: Iterable[Dict[str, Any]]):
+        self.exercises: List[Dict[str, Any]] = []
+        self.by_muscle_group: Dict[str, Set[int]] = {}
+        self.by_equipment: Dict[str, Set[int]] = {}
+        self.by_difficulty: Dict[str, Set[int]] = {}
+        self.by_contraindication: Dict[str, Set[int]] = {}
+
+        for record in exercises:
+            exercise = normalize_exercise(record)
+            if exercise:
+                self._add(exercise)
+
+    def _add(self, exercise: Dict[str, Any]):
+        position = len(self.exercises)
+        self.exercises.append(exercise)
+        for group in exercise["muscle_groups"]:
+            self.by_muscle_group.setdefault(group, set()).add(position)
+        self.by_equipment.setdefault(exercise["equipment"], set()).add(position)
+        self.by_difficulty.setdefault(exercise["difficulty"], set()).add(position)
+        for contraindication in exercise["contraindications"]:
+            self.by_contraindication.setdefault(contraindication, set()).add(position)
+
+    def __len__(self) -> int:
+        return len(self.exercises)
+
+    def query(
+        self,
+        muscle_group: Optional[str] = None,
+        equipment: Optional[Iterable[str]] = None,
+        max_difficulty: Optional[str] = None,
+        exclude_contraindications: Optional[Iterable[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca ejercicios que cumplan todos los criterios indicados.
+
+        :param muscle_group: Grupo muscular objetivo.
+        :param equipment: Equipamiento disponible (si es None, no se filtra).
+        :param max_difficulty: Dificultad máxima permitida ("beginner", "intermediate", "advanced").
+        :param exclude_contraindications: Contraindicaciones del usuario que descartan ejercicios.
+        :return: Lista de ejercicios que cumplen los criterios.
+        """
+        candidates = set(range(len(self.exercises)))
+        if muscle_group:
+            candidates &= self.by_muscle_group.get(muscle_group.lower(), set())
+        if equipment is not None:
+            allowed = set()
+            for item in _as_set(list(equipment)) | {"bodyweight"}:
+                allowed |= self.by_equipment.get(item, set())
+            candidates &= allowed
+        if max_difficulty:
+            limit = DIFFICULTY_LEVELS.get(max_difficulty, DIFFICULTY_LEVELS["beginner"])
+            allowed = set()
+            for level, rank in DIFFICULTY_LEVELS.items():
+                if rank <= limit:
+                    allowed |= self.by_difficulty.get(level, set())
+            candidates &= allowed
+        for contraindication in _as_set(list(exclude_contraindications or [])):
+            candidates -= self.by_contraindication.get(contraindication, set())
+        return [self.exercises[position] for position in sorted(candidates)]
+
+
+def load_exercise_corpus(path: str = EXERCISE_CORPUS_PATH) -> List[Dict[str, Any]]:
+    """
+    Lee el corpus de ejercicios (lista JSON o un registro JSON por línea).
+
+    :param path: Ruta del corpus.
+    :return: Lista de registros de ejercicios, o el catálogo básico si el archivo no existe.
+    """
+    if not os.path.exists(path):
+        logging.warning(f"Corpus de ejercicios '{path}' no encontrado. Usando el catálogo básico.")
+        return DEFAULT_EXERCISES
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith((".ndjson", ".jsonl")):
+                return [json.loads(line) for line in f if line.strip()]
+            data = json.load(f)
+        return data.get("exercises", []) if isinstance(data, dict) else data
+    except Exception as e:
+        raise RuntimeError(f"Error al cargar el corpus de ejercicios desde {path}: {str(e)}")
+
+
+# Índice compartido (se construye una sola vez por proceso)
+_exercise_index = None
+
+
+def get_exercise_index(force_reload: bool = False) -> ExerciseIndex:
+    """
+    Retorna el índice de ejercicios, construyéndolo a partir del corpus si fuera necesario.
+
+    :param force_reload: Si es True, vuelve a leer el corpus.
+    :return: Instancia de `ExerciseIndex`.
+    """
+    global _exercise_index
+    if _exercise_index is None or force_reload:
+        _exercise_index = ExerciseIndex(load_exercise_corpus())
+        logging.info(f"Índice de ejercicios cargado con {len(_exercise_index)} ejercicios.")
+    return _exercise_index
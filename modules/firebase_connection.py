@@ -15,9 +15,7 @@ import os
 import logging
 import firebase_admin
 from firebase_admin import credentials, firestore
-
-# Configuración de logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from modules.tracing import trace_firestore_client
 
 # Variable global para el cliente de Firestore
 _firestore_client = None
@@ -51,13 +49,14 @@ def get_firestore_client():
     """
     Retorna un cliente de Firestore, iniciando Firebase si fuera necesario.
     Implementa un patrón singleton para evitar inicializaciones múltiples.
+    Si las trazas están activas (TRACING_EXPORTER), cada lectura y escritura se registra como un span.
 
     :return: Instancia del cliente de Firestore.
     """
     global _firestore_client
     if _firestore_client is None:
         init_firebase()
-        _firestore_client = firestore.client()
+        _firestore_client = trace_firestore_client(firestore.client())
         logging.info("Cliente de Firestore inicializado y listo para su uso.")
     return _firestore_client
 
@@ -0,0 +1,66 @@
+"""
+Módulo de Caché HTTP de Bwere (http_cache).
+Genera ETags y respuestas condicionales para los endpoints de solo lectura.
+
+**Propósito**:
+- Calcula ETags débiles a partir de las fechas de actualización de los documentos que forman la respuesta.
+- Responde 304 (sin cuerpo) cuando la cabecera `If-None-Match` del cliente coincide, de modo que la PWA
+  pueda revalidar el historial y los planes sin volver a descargarlos.
+
+**Conexión con otros módulos**:
+- Es utilizado por `werbly_asgi` en `/users/{user_id}/history` y `/users/{user_id}/plans`.
+"""
+import json
+import hashlib
+from typing import Any
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(*parts: Any) -> str:
+    """
+    Calcula un ETag débil estable a partir de los valores indicados (identificadores y fechas de actualización).
+
+    :param parts: Valores que identifican la versión de la respuesta.
+    :return: ETag en formato W/"...".
+    """
+    serialized = json.dumps(parts, separators=(",", ":"), default=str, ensure_ascii=False)
+    return f'W/"{hashlib.sha1(serialized.encode("utf-8")).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Compara la cabecera If-None-Match con el ETag actual (comparación débil).
+
+    :param if_none_match: Valor de la cabecera enviada por el cliente.
+    :param etag: ETag actual de la respuesta.
+    :return: True si el cliente ya tiene la versión actual.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == current:
+            return True
+    return False
+
+
+def conditional_json_response(request: Request, payload: Any, etag: str) -> Response:
+    """
+    Devuelve 304 si el cliente ya tiene la versión actual o, si no, la respuesta JSON con su ETag.
+
+    :param request: Petición entrante.
+    :param payload: Cuerpo de la respuesta.
+    :param etag: ETag de la versión actual.
+    :return: Respuesta 304 o 200.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
@@ -0,0 +1,194 @@
+"""
+Módulo de Configuración de Logs de Bwere (logging_config).
+Configura una única vez el sistema de logs para la API y los módulos de IA y Firebase.
+
+**Propósito**:
+- Saca la escritura a disco del hilo de la petición: los módulos solo encolan registros (`QueueHandler`)
+  y un hilo en segundo plano (`QueueListener`) los formatea y los escribe.
+- Escribe registros estructurados en JSON con rotación por tamaño. Con varios procesos de trabajo, cada uno
+  necesita su propio archivo (`{pid}` en LOG_FILE) o la salida estándar (LOG_FILE="-"): la rotación de un
+  mismo archivo desde varios procesos pierde o mezcla registros.
+- Reduce el volumen de los mensajes más frecuentes mediante muestreo y recorta los mensajes demasiado largos
+  (por ejemplo, respuestas completas de la IA). Cada mensaje frecuente se identifica con `extra={"sample_key": ...}`.
+
+**Conexión con otros módulos**:
+- Es invocado por los puntos de entrada (`werbly_api`, `werbly_asgi`, `main`) en lugar de que cada módulo
+  (`ai_core`, `backend_manager`, `firebase_connection`) llame a `logging.basicConfig`.
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+# "{pid}" se sustituye por el identificador del proceso; "-" escribe en la salida estándar
+LOG_FILE = os.getenv("LOG_FILE", "Bwere_api.log")
+# Valor de LOG_FILE para los servidores con varios procesos de trabajo (ver gunicorn.conf.py y werbly_asgi.py)
+PER_PROCESS_LOG_FILE = "Bwere_api-{pid}.log"
+LOG_LEVEL = os.getenv("LOGGING_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", 2000))
+
+# Fracción de registros que se conserva para los mensajes frecuentes, por `sample_key`
+# (o, para los registros sin esa clave, por prefijo del mensaje)
+DEFAULT_SAMPLE_RATES = {
+    "chat.reply": 0.1,
+    "ai.prompt": 0.1,
+    "ai.backend_response": 0.1,
+    "ai.backends_registered": 0.01,
+    "ai.elapsed": 0.1,
+}
+
+# Atributos estándar de LogRecord que no se copian como campos adicionales
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatea cada registro como un objeto JSON en una sola línea.
+    Los campos pasados con `extra=` se incluyen como claves adicionales.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Descarta aleatoriamente una parte de los mensajes frecuentes de nivel inferior a WARNING.
+    Los registros se reconocen por su `sample_key` (pasada con `extra=`), que no depende del texto
+    del mensaje; los que no la tienen se comparan por prefijo del mensaje.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        sample_key = getattr(record, "sample_key", None)
+        if sample_key is not None and sample_key in self.rates:
+            return random.random() < self.rates[sample_key]
+        message = str(record.msg)
+        for prefix, rate in self.rates.items():
+            if message.startswith(prefix):
+                return random.random() < rate
+        return True
+
+
+class TruncatingFilter(logging.Filter):
+    """
+    Recorta los mensajes que superan la longitud máxima antes de encolarlos.
+    """
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            record.msg = f"{message[:self.max_chars]}… [recortado]"
+            record.args = None
+            record.original_length = len(message)
+        return True
+
+
+def _load_sample_rates() -> Dict[str, float]:
+    """
+    Obtiene las tasas de muestreo desde la variable de entorno LOG_SAMPLE_RATES (JSON) o usa las predeterminadas.
+
+    :return: Diccionario `sample_key` (o prefijo) -> fracción conservada.
+    """
+    raw = os.getenv("LOG_SAMPLE_RATES")
+    if not raw:
+        return DEFAULT_SAMPLE_RATES
+    try:
+        return {str(k): float(v) for k, v in json.loads(raw).items()}
+    except (ValueError, AttributeError):
+        return DEFAULT_SAMPLE_RATES
+
+
+def configure_logging(
+    log_file: str = LOG_FILE,
+    level: str = LOG_LEVEL,
+    console: bool = False,
+    sample_rates: Optional[Dict[str, float]] = None,
+) -> logging.Logger:
+    """
+    Configura el logger raíz con una cola en memoria y un hilo escritor. Solo tiene efecto la primera vez.
+
+    :param log_file: Archivo de log (con rotación por tamaño); admite `{pid}`, y "-" escribe en la salida estándar.
+    :param level: Nivel mínimo de log.
+    :param console: Si es True, también se escriben los registros en la salida estándar de errores.
+    :param sample_rates: Tasas de muestreo por `sample_key` o prefijo del mensaje (por defecto, LOG_SAMPLE_RATES o las predeterminadas).
+    :return: Logger raíz.
+    """
+    global _listener
+    root = logging.getLogger()
+    if _listener is not None:
+        return root
+
+    formatter = JsonFormatter()
+    handlers = []
+    if log_file == "-":
+        file_handler = logging.StreamHandler(sys.stdout)
+    else:
+        file_handler = RotatingFileHandler(
+            log_file.format(pid=os.getpid()), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    file_handler.setFormatter(formatter)
+    handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(_load_sample_rates() if sample_rates is None else sample_rates))
+    queue_handler.addFilter(TruncatingFilter(LOG_MAX_MESSAGE_CHARS))
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """
+    Detiene el hilo escritor vaciando antes los registros pendientes.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -12,9 +12,23 @@ Este módulo recopila y organiza datos dinámicamente para que la IA genere mens
 from typing import Dict, Any
 from modules.firebase_connection import get_firestore_client
 from modules.analysis_engine import prepare_analysis_context
-from modules.ai_core import query_model
+from modules.ai_core import get_ai_core
+from modules.plan_store import get_plan_store, compact_context
+from modules.tracing import traced
 
+# Campos del contexto que determinan el mensaje motivacional (huella para reutilizarlo)
+MOTIVATION_FINGERPRINT_FIELDS = (
+    "recent_achievements",
+    "long_term_goals",
+    "weight",
+    "activity_level",
+    "fatigue_level",
+)
+# Los mensajes motivacionales se renuevan como mínimo una vez al día
+MOTIVATION_TTL_SECONDS = 24 * 3600
 
+
+@traced("motivation.prepare_context")
 def prepare_motivation_context(user_id: str) -> Dict[str, Any]:
     """
     Genera un contexto dinámico basado en todos los datos disponibles del usuario.
@@ -46,11 +60,26 @@ def prepare_motivation_context(user_id: str) -> Dict[str, Any]:
         raise RuntimeError(f"Error al preparar el contexto de motivación para el usuario {user_id}: {str(e)}")
 
 
-def generate_motivational_message(user_id: str) -> str:
+def _query_motivational_message(prompt: str) -> str:
+    """
+    Consulta a la IA y descarta las respuestas de error para que no se almacenen como mensaje vigente.
+
+    :param prompt: Prompt de motivación.
+    :return: Mensaje generado por la IA.
+    """
+    message = get_ai_core().query_model(prompt)
+    if not message or message.startswith("Error"):
+        raise RuntimeError(message or "La IA devolvió una respuesta vacía.")
+    return message
+
+
+def generate_motivational_message(user_id: str, force_refresh: bool = False) -> str:
     """
     Envía el contexto dinámico de motivación a la IA y obtiene un mensaje motivacional único.
+    Si el progreso del usuario no ha cambiado, reutiliza el último mensaje generado (máximo un día).
 
     :param user_id: Identificador único del usuario.
+    :param force_refresh: Si es True, genera un mensaje nuevo aunque exista uno vigente.
     :return: Mensaje motivacional generado por la IA.
     """
     try:
@@ -64,8 +93,15 @@ def generate_motivational_message(user_id: str) -> str:
             "Por favor, genera un mensaje motivador que sea único, personalizado y adaptado a su progreso, logros y metas."
         )
 
-        # Generar mensaje usando la IA
-        message = query_model(prompt)
+        # Generar mensaje usando la IA solo si no hay uno vigente
+        message = get_plan_store().get_or_generate(
+            user_id,
+            "motivation",
+            compact_context(context, MOTIVATION_FINGERPRINT_FIELDS),
+            lambda: _query_motivational_message(prompt),
+            ttl_seconds=MOTIVATION_TTL_SECONDS,
+            force_refresh=force_refresh,
+        )
         return message
     except Exception as e:
         return f"Error al generar mensaje motivacional: {str(e)}"
@@ -8,12 +8,32 @@ Este módulo recopila y organiza toda la información relevante del usuario para
 **Conexión con otros módulos**:
 - **Entrada de datos:** Recibe información desde `user_data`, análisis desde `analysis_engine` y datos dinámicos desde Firestore.
 - **Salida de contexto:** Proporciona un resumen estructurado al módulo `ai_core` para que la IA diseñe planes únicos.
+- **Salida de planes:** Devuelve planes validados con el esquema `NutritionPlan` de `plan_schemas`.
 """
 from typing import Dict, Any
 from modules.analysis_engine import analyze_user_data
 from modules.firebase_connection import get_firestore_client
+from modules.plan_schemas import NutritionPlan
+from modules.plan_store import get_plan_store, compact_context
+from modules.security_guard import load_safety_rules
+from modules.structured_output import request_structured_output
+from modules.tracing import traced
 
+# Campos del contexto que determinan el plan nutricional (huella para reutilizar planes)
+NUTRITION_FINGERPRINT_FIELDS = (
+    "recommended_calories",
+    "needs_more_protein",
+    "dietary_preferences",
+    "dietary_restrictions",
+    "long_term_goals",
+    "current_weight",
+    "height",
+    "activity_level",
+    "local_availability",
+)
 
+
+@traced("nutrition.prepare_context")
 def prepare_nutrition_context(user_id: str) -> Dict[str, Any]:
     """
     Genera un contexto estructurado basado en los datos del usuario y su análisis nutricional.
@@ -59,13 +79,16 @@ def prepare_nutrition_context(user_id: str) -> Dict[str, Any]:
         raise RuntimeError(f"Error al preparar el contexto nutricional para el usuario {user_id}: {str(e)}")
 
 
-def generate_nutrition_plan_with_ai(user_id: str, ai_core) -> str:
+def generate_nutrition_plan_with_ai(user_id: str, ai_core, force_refresh: bool = False) -> Dict[str, Any]:
     """
-    Envía el contexto nutricional a la IA y obtiene un plan de alimentación dinámico.
+    Envía el contexto nutricional a la IA y obtiene un plan de alimentación dinámico en formato estructurado
+    (comidas con sus ingredientes y cantidades), validado con el esquema `NutritionPlan`.
+    Si los datos relevantes del usuario y los límites de seguridad no han cambiado, reutiliza el plan almacenado.
 
     :param user_id: Identificador único del usuario.
     :param ai_core: Referencia al módulo `ai_core` para generar planes con la IA.
-    :return: Plan de alimentación generado por la IA.
+    :param force_refresh: Si es True, genera un plan nuevo aunque exista uno vigente.
+    :return: Plan de alimentación generado por la IA como diccionario.
     """
     try:
         # Preparar contexto
@@ -76,11 +99,21 @@ def generate_nutrition_plan_with_ai(user_id: str, ai_core) -> str:
             "Eres un asistente nutricional avanzado. Tu objetivo es generar un plan de alimentación completamente "
             "personalizado basado en el siguiente contexto:\n"
             f"{context}\n"
-            "Si necesitas más información para generar el plan, indica qué datos faltan."
+            "Incluye en cada comida sus ingredientes con cantidad y unidad. "
+            "Si necesitas más información para generar el plan, indícalo en el campo 'notes'."
         )
 
-        # Generar plan usando la IA
-        response = ai_core.query_model(prompt)
-        return response
+        # Huella de los datos que determinan el plan
+        fingerprint_context = compact_context(context, NUTRITION_FINGERPRINT_FIELDS)
+        fingerprint_context["safety_limits"] = load_safety_rules().limits
+
+        # Generar y validar el plan usando la IA solo si no hay uno vigente
+        return get_plan_store().get_or_generate(
+            user_id,
+            "nutrition",
+            fingerprint_context,
+            lambda: request_structured_output(ai_core.query_model, prompt, NutritionPlan, stream_fn=ai_core.stream_model).model_dump(),
+            force_refresh=force_refresh,
+        )
     except Exception as e:
-        return f"Error al generar el plan nutricional con IA: {str(e)}"
+        raise RuntimeError(f"Error al generar el plan nutricional con IA: {str(e)}")
@@ -0,0 +1,81 @@
+"""
+Módulo de Esquemas de Planes de Bwere.
+Define la estructura de los planes nutricionales, de suplementación y de entrenamiento que genera la IA.
+
+**Propósito**:
+- Establece un formato legible por máquina para los planes, de modo que puedan validarse, almacenarse,
+  compararse y reutilizarse sin nuevas consultas a la IA.
+- Proporciona los esquemas que `structured_output` incluye en los prompts y utiliza para validar las respuestas.
+
+**Conexión con otros módulos**:
+- **Uso en planificadores:** `nutrition_planner`, `supplement_manager` y `training_planner` validan sus planes con estos esquemas.
+- **Uso aguas abajo:** `supermarket_integration` y `security_guard` consumen los planes estructurados directamente.
+"""
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class Ingredient(BaseModel):
+    """
+    Ingrediente de una comida con su cantidad y unidad.
+    """
+    name: str = Field(min_length=1)
+    quantity: float = Field(ge=0)
+    unit: str = Field(default="g", description="Unidad de medida: g, kg, ml, l o unidades.")
+
+
+class Meal(BaseModel):
+    """
+    Comida de un plan nutricional.
+    """
+    name: str = Field(min_length=1)
+    time: Optional[str] = Field(default=None, description="Momento del día, por ejemplo 'desayuno' o '08:00'.")
+    calories: Optional[float] = Field(default=None, ge=0)
+    ingredients: List[Ingredient] = Field(default_factory=list)
+
+
+class NutritionPlan(BaseModel):
+    """
+    Plan nutricional diario.
+    """
+    daily_calories: float = Field(ge=0)
+    meals: List[Meal] = Field(min_length=1)
+    notes: Optional[str] = None
+
+
+class Supplement(BaseModel):
+    """
+    Suplemento recomendado con su dosis y horario.
+    """
+    name: str = Field(min_length=1)
+    dose: str = Field(min_length=1)
+    timing: Optional[str] = None
+    warnings: List[str] = Field(default_factory=list)
+
+
+class SupplementPlan(BaseModel):
+    """
+    Conjunto de suplementos recomendados para el usuario.
+    """
+    supplements: List[Supplement]
+    notes: Optional[str] = None
+
+
+class TrainingExercise(BaseModel):
+    """
+    Ejercicio de un plan de entrenamiento con series, repeticiones y descanso.
+    """
+    exercise: str = Field(min_length=1)
+    sets: int = Field(ge=1)
+    reps: int = Field(ge=1)
+    rest_seconds: int = Field(ge=0)
+    muscle_group: Optional[str] = None
+    equipment: Optional[str] = None
+
+
+class TrainingPlan(BaseModel):
+    """
+    Plan de entrenamiento de una sesión.
+    """
+    exercises: List[TrainingExercise] = Field(min_length=1)
+    notes: Optional[str] = None
@@ -0,0 +1,198 @@
+"""
+Módulo de Almacenamiento de Planes de Bwere.
+Memoriza los planes generados por la IA y los reutiliza mientras los datos relevantes del usuario no cambien.
+
+**Propósito**:
+- Calcula una huella estable (hash) del contexto compacto de cada planificador.
+- Devuelve el plan persistido cuando la huella coincide, evitando nuevas consultas a la IA.
+- Permite forzar la regeneración por antigüedad (TTL) o invalidar explícitamente los planes de un usuario.
+
+**Conexión con otros módulos**:
+- **Entrada de datos:** Recibe el contexto preparado por `nutrition_planner`, `supplement_manager` y `motivation_tracker`.
+- **Integración con Firestore:** Persiste los planes en `usuarios/{user_id}/planes/{tipo}` mediante `firebase_connection`.
+"""
+import os
+import json
+import time
+import hashlib
+import datetime
+import logging
+from typing import Dict, Any, Callable, Iterable, Optional
+from modules.firebase_connection import get_firestore_client
+
+PLANS_COLLECTION = "planes"
+DEFAULT_PLAN_TTL = int(os.getenv("PLAN_TTL_SECONDS", 7 * 24 * 3600))
+
+
+def compact_context(context: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Reduce un contexto a los campos que determinan el resultado de un planificador.
+
+    :param context: Contexto completo preparado por el planificador.
+    :param fields: Campos relevantes para la huella.
+    :return: Diccionario con solo los campos relevantes.
+    """
+    return {field: context.get(field) for field in fields}
+
+
+def compute_fingerprint(context: Dict[str, Any]) -> str:
+    """
+    Calcula una huella estable del contexto, independiente del orden de las claves.
+
+    :param context: Contexto (compacto) del planificador.
+    :return: Hash SHA-256 en hexadecimal.
+    """
+    serialized = json.dumps(context, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class PlanStore:
+    """
+    Almacén de planes con caché en memoria y persistencia en Firestore.
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_PLAN_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._memory: Dict[tuple, Dict[str, Any]] = {}
+
+    def _document(self, user_id: str, plan_type: str):
+        db = get_firestore_client()
+        return db.collection("usuarios").document(user_id).collection(PLANS_COLLECTION).document(plan_type)
+
+    def _is_fresh(self, entry: Dict[str, Any], fingerprint: str, ttl_seconds: int) -> bool:
+        return (
+            entry.get("fingerprint") == fingerprint
+            and time.time() - entry.get("created_at", 0) < ttl_seconds
+        )
+
+    def get(self, user_id: str, plan_type: str, fingerprint: str, ttl_seconds: Optional[int] = None) -> Optional[Any]:
+        """
+        Devuelve el plan almacenado si su huella coincide y no ha caducado.
+
+        :param user_id: Identificador único del usuario.
+        :param plan_type: Tipo de plan ("nutrition", "supplements", "motivation", ...).
+        :param fingerprint: Huella del contexto actual.
+        :param ttl_seconds: Antigüedad máxima del plan (por defecto, la del almacén).
+        :return: Plan almacenado o None si debe regenerarse.
+        """
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        key = (user_id, plan_type)
+
+        entry = self._memory.get(key)
+        if entry and self._is_fresh(entry, fingerprint, ttl_seconds):
+            return entry.get("plan")
+
+        # Otro proceso puede haber regenerado el plan: se consulta la copia persistida
+        snapshot = self._document(user_id, plan_type).get()
+        entry = snapshot.to_dict() if snapshot.exists else None
+        if not entry:
+            return None
+        self._memory[key] = entry
+        return entry.get("plan") if self._is_fresh(entry, fingerprint, ttl_seconds) else None
+
+    def put(self, user_id: str, plan_type: str, fingerprint: str, plan: Any):
+        """
+        Persiste un plan junto con la huella del contexto que lo generó.
+
+        :param user_id: Identificador único del usuario.
+        :param plan_type: Tipo de plan.
+        :param fingerprint: Huella del contexto.
+        :param plan: Plan generado.
+        """
+        entry = {
+            "fingerprint": fingerprint,
+            "plan": plan,
+            "created_at": time.time(),
+            "updated_at": datetime.datetime.utcnow(),
+        }
+        self._document(user_id, plan_type).set(entry)
+        self._memory[(user_id, plan_type)] = entry
+
+    def list_plans(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Devuelve todos los planes persistidos de un usuario.
+
+        :param user_id: Identificador único del usuario.
+        :return: Diccionario {tipo de plan: entrada con plan, huella y fechas}.
+        """
+        db = get_firestore_client()
+        plans_ref = db.collection("usuarios").document(user_id).collection(PLANS_COLLECTION)
+        return {doc.id: doc.to_dict() for doc in plans_ref.stream()}
+
+    def invalidate(self, user_id: str, plan_type: Optional[str] = None):
+        """
+        Elimina los planes almacenados de un usuario para forzar su regeneración.
+
+        :param user_id: Identificador único del usuario.
+        :param plan_type: Tipo de plan a invalidar. Si es None, se invalidan todos.
+        """
+        if plan_type:
+            self._memory.pop((user_id, plan_type), None)
+            self._document(user_id, plan_type).delete()
+            return
+
+        for key in [k for k in self._memory if k[0] == user_id]:
+            del self._memory[key]
+        db = get_firestore_client()
+        plans_ref = db.collection("usuarios").document(user_id).collection(PLANS_COLLECTION)
+        batch = db.batch()
+        for doc in plans_ref.stream():
+            batch.delete(doc.reference)
+        batch.commit()
+
+    def get_or_generate(
+        self,
+        user_id: str,
+        plan_type: str,
+        context: Dict[str, Any],
+        generator: Callable[[], Any],
+        ttl_seconds: Optional[int] = None,
+        force_refresh: bool = False,
+    ) -> Any:
+        """
+        Devuelve el plan almacenado para el contexto dado o lo genera y persiste si no existe o ha caducado.
+
+        :param user_id: Identificador único del usuario.
+        :param plan_type: Tipo de plan.
+        :param context: Contexto compacto que determina el plan.
+        :param generator: Función sin argumentos que genera el plan (normalmente consultando a la IA).
+        :param ttl_seconds: Antigüedad máxima del plan (por defecto, la del almacén).
+        :param force_refresh: Si es True, se ignora el plan almacenado.
+        :return: Plan almacenado o recién generado.
+        """
+        fingerprint = compute_fingerprint(context)
+        if not force_refresh:
+            cached = self.get(user_id, plan_type, fingerprint, ttl_seconds)
+            if cached is not None:
+                logging.info(f"Plan '{plan_type}' reutilizado para el usuario {user_id} (huella sin cambios).")
+                return cached
+
+        plan = generator()
+        self.put(user_id, plan_type, fingerprint, plan)
+        return plan
+
+
+# Instancia compartida del almacén de planes
+_plan_store = None
+
+
+def get_plan_store() -> PlanStore:
+    """
+    Retorna el almacén de planes compartido, creándolo si fuera necesario.
+
+    :return: Instancia de `PlanStore`.
+    """
+    global _plan_store
+    if _plan_store is None:
+        _plan_store = PlanStore()
+    return _plan_store
+
+
+def invalidate_plans(user_id: str, plan_type: Optional[str] = None):
+    """
+    Invalida explícitamente los planes almacenados de un usuario (por ejemplo, tras actualizar su perfil).
+
+    :param user_id: Identificador único del usuario.
+    :param plan_type: Tipo de plan a invalidar. Si es None, se invalidan todos.
+    """
+    get_plan_store().invalidate(user_id, plan_type)
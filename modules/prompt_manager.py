@@ -12,6 +12,7 @@ Confía en que la IA tiene acceso directo a Firestore y al historial de datos di
 - **Salida de datos:** Devuelve un prompt base listo para enviar a la IA junto con la entrada del usuario.
 """
 from modules.firebase_connection import get_firestore_client
+from modules.tracing import traced
 
 
 def get_base_prompt() -> str:
@@ -40,6 +41,7 @@ def get_base_prompt() -> str:
         return f"Error al obtener el prompt base: {str(e)}"
 
 
+@traced("prompt.build_prompt")
 def build_prompt(user_input: str) -> str:
     """
     Construye el prompt final combinando el prompt base con la entrada del usuario.
@@ -0,0 +1,366 @@
+"""
+Módulo de Limitación de Peticiones de Bwere (rate_limiter).
+Limita la frecuencia de peticiones por usuario (user_id) y por dirección IP para proteger la capacidad de la IA.
+
+**Propósito**:
+- Implementa el algoritmo GCRA (Generic Cell Rate Algorithm): cada clave guarda un único instante teórico
+  de llegada, por lo que cada comprobación es una lectura y una escritura de tiempo constante.
+- Ofrece un almacén en memoria (un proceso) y un almacén SQLite compartido entre los procesos de trabajo
+  de una misma máquina.
+- Permite configurar límites distintos por ruta. En `/chat/batch` cada elemento cuenta como una petición del
+  usuario (un lote con más mensajes de un usuario que su ráfaga permitida se rechaza con un 400), y en
+  `/ws/chat` se limitan las conexiones y, con la regla de `/chat`, cada mensaje.
+- En las peticiones con cuerpo JSON el usuario se toma del cuerpo, el mismo que usa el manejador; el `user_id`
+  de la query solo se usa en las rutas sin cuerpo (GET) y en `/ws/chat`.
+
+**Conexión con otros módulos**:
+- Es utilizado por `werbly_asgi` como middleware ASGI y por `werbly_api` en un `before_request` de Flask,
+  antes de que la petición llegue a los manejadores.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import math
+import threading
+from collections import Counter
+from typing import Dict, Any, Iterable, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+# Límites por ruta: {ruta: {"user": [peticiones, segundos], "ip": [peticiones, segundos]}}. "*" aplica al resto.
+DEFAULT_RATE_LIMITS = {
+    "/chat": {"user": [20, 60], "ip": [60, 60]},
+    "/chat/batch": {"user": [20, 60], "ip": [10, 60]},
+    # Conexiones WebSocket; cada mensaje de la sesión consume además la regla de /chat
+    "/ws/chat": {"user": [10, 60], "ip": [30, 60]},
+    "*": {"ip": [300, 60]},
+}
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")  # "memory" o "sqlite:/ruta/al/archivo.db"
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+MAX_INSPECTED_BODY_BYTES = 1024 * 1024
+
+
+def _gcra(tat: Optional[float], now: float, interval: float, tolerance: float, cost: int = 1) -> Tuple[bool, float, float]:
+    """
+    Aplica un paso del algoritmo GCRA.
+
+    :param tat: Instante teórico de llegada almacenado para la clave (None si no existe).
+    :param now: Instante actual.
+    :param interval: Intervalo de emisión (periodo / límite).
+    :param tolerance: Ráfaga tolerada en segundos (periodo - intervalo).
+    :param cost: Número de peticiones que se consumen de una vez (elementos de un lote).
+    :return: Tupla (permitida, nuevo instante teórico, segundos hasta poder reintentar).
+    """
+    tat = max(tat or now, now)
+    new_tat = tat + interval * cost
+    if new_tat - now > tolerance + interval:
+        return False, tat, new_tat - now - tolerance - interval
+    return True, new_tat, 0.0
+
+
+class MemoryRateLimitStore:
+    """
+    Almacén en memoria del proceso. Adecuado para un único proceso de trabajo.
+    """
+    # Las comprobaciones no bloquean: se ejecutan directamente en el bucle de eventos
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._tats: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def check(self, key: str, now: float, interval: float, tolerance: float, cost: int = 1) -> Tuple[bool, float]:
+        with self._lock:
+            allowed, tat, retry_after = _gcra(self._tats.get(key), now, interval, tolerance, cost)
+            self._tats[key] = tat
+            if len(self._tats) > self.max_keys:
+                # Las claves cuyo instante teórico ya pasó equivalen a claves sin historial
+                self._tats = {k: v for k, v in self._tats.items() if v > now}
+        return allowed, retry_after
+
+
+class SQLiteRateLimitStore:
+    """
+    Almacén compartido en SQLite (modo WAL) para varios procesos de trabajo en la misma máquina.
+    Cada comprobación se ejecuta en una transacción inmediata para que sea atómica entre procesos; como puede
+    esperar el bloqueo de otro proceso, el middleware la ejecuta en el pool de hilos.
+    """
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def check(self, key: str, now: float, interval: float, tolerance: float, cost: int = 1) -> Tuple[bool, float]:
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                row = cursor.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                allowed, tat, retry_after = _gcra(row[0] if row else None, now, interval, tolerance, cost)
+                cursor.execute(
+                    "INSERT INTO rate_limits (key, tat) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                    (key, tat),
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        return allowed, retry_after
+
+
+def create_store(spec: str = RATE_LIMIT_STORE):
+    """
+    Crea el almacén indicado en la configuración.
+
+    :param spec: "memory" o "sqlite:/ruta/al/archivo.db".
+    :return: Instancia del almacén.
+    """
+    if spec.startswith("sqlite:"):
+        return SQLiteRateLimitStore(spec[len("sqlite:"):])
+    return MemoryRateLimitStore()
+
+
+def load_rate_limits() -> Dict[str, Dict[str, Any]]:
+    """
+    Obtiene los límites por ruta desde la variable de entorno RATE_LIMITS (JSON) o usa los predeterminados.
+
+    :return: Diccionario de límites por ruta.
+    """
+    raw = os.getenv("RATE_LIMITS")
+    if not raw:
+        return DEFAULT_RATE_LIMITS
+    try:
+        return json.loads(raw)
+    except ValueError:
+        logging.error("RATE_LIMITS no es un JSON válido. Usando los límites predeterminados.")
+        return DEFAULT_RATE_LIMITS
+
+
+class RateLimiter:
+    """
+    Aplica los límites configurados por ruta sobre un almacén GCRA.
+    """
+
+    def __init__(self, store=None, limits: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.store = store or create_store()
+        self.limits = limits or load_rate_limits()
+
+    def rule_for(self, path: str) -> Dict[str, Any]:
+        return self.limits.get(path) or self.limits.get("*") or {}
+
+    def check(self, path: str, scope: str, identity: str, cost: int = 1) -> Tuple[bool, float]:
+        """
+        Comprueba (y consume) una petición para una identidad.
+
+        :param path: Ruta de la petición.
+        :param scope: Tipo de identidad ("user" o "ip").
+        :param identity: Valor de la identidad (user_id o IP).
+        :param cost: Peticiones que se consumen (una por elemento en los lotes).
+        :return: Tupla (permitida, segundos hasta poder reintentar).
+        """
+        limit = self.rule_for(path).get(scope)
+        if not limit or not identity:
+            return True, 0.0
+        requests, period = limit
+        interval = period / requests
+        rule_key = path if path in self.limits else "*"
+        return self.store.check(f"{scope}:{rule_key}:{identity}", time.time(), interval, period - interval, cost)
+
+    def check_request(self, path: str, client_ip: str, user_ids: Iterable[str] = ()) -> Tuple[bool, float]:
+        """
+        Comprueba una petición completa: primero por IP y después por cada user_id. Un user_id que aparece
+        varias veces (un elemento por mensaje en `/chat/batch`) consume una petición por aparición.
+
+        :param path: Ruta de la petición.
+        :param client_ip: Dirección IP del cliente.
+        :param user_ids: Usuarios incluidos en la petición, uno por mensaje.
+        :return: Tupla (permitida, segundos hasta poder reintentar).
+        """
+        allowed, retry_after = self.check(path, "ip", client_ip)
+        if not allowed:
+            return allowed, retry_after
+        for user_id, count in Counter(user_ids).items():
+            allowed, retry_after = self.check(path, "user", user_id, count)
+            if not allowed:
+                return allowed, retry_after
+        return True, 0.0
+
+    async def check_request_async(self, path: str, client_ip: str, user_ids: Iterable[str] = ()) -> Tuple[bool, float]:
+        """
+        Igual que `check_request`, pero sin bloquear el bucle de eventos: con un almacén que puede bloquear
+        (SQLite compartido entre procesos) la comprobación se ejecuta en el pool de hilos.
+        """
+        if getattr(self.store, "blocking", False):
+            return await run_in_threadpool(self.check_request, path, client_ip, list(user_ids))
+        return self.check_request(path, client_ip, user_ids)
+
+    def limits_users(self, path: str) -> bool:
+        return "user" in self.rule_for(path)
+
+    def max_cost(self, path: str, scope: str = "user") -> Optional[int]:
+        """
+        Máximo de peticiones que una identidad puede consumir de una vez (la ráfaga del GCRA,
+        `tolerance / interval + 1`, que equivale al límite de peticiones del periodo). Un lote que la supera
+        nunca podría aceptarse, por mucho que se espere.
+
+        :param path: Ruta de la petición.
+        :param scope: Tipo de identidad ("user" o "ip").
+        :return: Peticiones de la ráfaga, o None si la ruta no tiene límite para ese tipo de identidad.
+        """
+        limit = self.rule_for(path).get(scope)
+        return int(limit[0]) if limit else None
+
+
+def retry_after_header(retry_after: float) -> str:
+    """
+    Convierte los segundos de espera al valor entero de la cabecera Retry-After (mínimo 1).
+    """
+    return str(max(1, math.ceil(retry_after)))
+
+
+def user_ids_from_payload(data: Any) -> list:
+    """
+    Obtiene los user_id de un cuerpo JSON: admite un objeto con `user_id`, o una lista de objetos con `user_id`
+    (directamente o bajo la clave `items`).
+
+    :param data: Cuerpo JSON ya decodificado.
+    :return: Lista con el user_id de cada elemento, en orden de aparición (con repeticiones).
+    """
+    user_ids = []
+    if isinstance(data, dict):
+        data = data.get("items") if isinstance(data.get("items"), list) else [data]
+    if isinstance(data, list):
+        for item in data:
+            user_id = item.get("user_id") if isinstance(item, dict) else None
+            if isinstance(user_id, str):
+                user_ids.append(user_id)
+    return user_ids
+
+
+def client_ip_from_scope(scope) -> str:
+    """
+    Dirección IP del cliente de una conexión ASGI (HTTP o WebSocket). Con TRUST_FORWARDED_FOR se usa la
+    primera dirección de X-Forwarded-For.
+    """
+    if TRUST_FORWARDED_FOR:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else ""
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI que limita las peticiones por IP y, si la ruta lo define, por el `user_id`
+    incluido en el cuerpo JSON (o en la query, en las peticiones GET). El cuerpo leído se reenvía intacto
+    a la aplicación.
+    Las conexiones WebSocket se comprueban al conectar (los mensajes los limita `werbly_asgi.ChatSocket`).
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def _reject(self, send, retry_after: float):
+        await self._error(send, 429, "Demasiadas peticiones. Inténtalo de nuevo más tarde.", retry_after)
+
+    async def _error(self, send, status: int, message: str, retry_after: Optional[float] = None):
+        body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if retry_after is not None:
+            headers.append((b"retry-after", retry_after_header(retry_after).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        user_ids = []
+        if self.limiter.limits_users(path):
+            user_ids, receive = await self._extract_user_ids(scope, receive)
+            max_cost = self.limiter.max_cost(path)
+            if user_ids and max(Counter(user_ids).values()) > max_cost:
+                # Más mensajes de un usuario que su ráfaga: la petición no se aceptaría nunca
+                await self._error(send, 400, f"El lote admite como máximo {max_cost} mensajes por usuario.")
+                return
+
+        allowed, retry_after = await self.limiter.check_request_async(path, client_ip_from_scope(scope), user_ids)
+        if not allowed:
+            logging.warning(f"Límite de peticiones superado en {path}")
+            await self._reject(send, retry_after)
+            return
+
+        await self.app(scope, receive, send)
+
+    async def _websocket(self, scope, receive, send):
+        """
+        Comprueba la conexión antes de aceptarla. Si se supera el límite, se cierra sin aceptar (el cliente
+        recibe un 403 en el handshake).
+        """
+        path = scope["path"]
+        user_ids = []
+        if self.limiter.limits_users(path):
+            user_ids = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("user_id", [])[:1]
+        allowed, _ = await self.limiter.check_request_async(path, client_ip_from_scope(scope), user_ids)
+        if not allowed:
+            logging.warning(f"Límite de conexiones superado en {path}")
+            await receive()  # websocket.connect
+            # 1013: inténtalo de nuevo más tarde
+            await send({"type": "websocket.close", "code": 1013})
+            return
+        await self.app(scope, receive, send)
+
+    async def _extract_user_ids(self, scope, receive):
+        """
+        Obtiene los user_id del cuerpo JSON (o de la query, en las peticiones GET y HEAD, que no tienen cuerpo)
+        y devuelve una función `receive` que reproduce el cuerpo ya leído. En las peticiones con cuerpo la query
+        se ignora: el manejador atiende al `user_id` del cuerpo, y el límite debe aplicarse a ese mismo usuario.
+
+        :return: Tupla (lista de user_id, uno por elemento, y receive).
+        """
+        if scope.get("method") in ("GET", "HEAD"):
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            return query.get("user_id", [])[:1], receive
+
+        chunks, size, more_body = [], 0, True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        data = None
+        if body and size <= MAX_INSPECTED_BODY_BYTES:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+        return user_ids_from_payload(data), replay
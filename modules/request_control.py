@@ -0,0 +1,154 @@
+"""
+Módulo de Control de Peticiones de Bwere (request_control).
+Controla la concurrencia de la API asíncrona: serializa los turnos de cada usuario y limita
+el número de conversaciones que se procesan a la vez.
+
+**Propósito**:
+- Garantiza que los turnos de un mismo usuario se procesen en orden (un turno a la vez por usuario).
+- Limita las peticiones simultáneas con una cola acotada y rechaza rápidamente (429 con Retry-After)
+  cuando la cola está llena, en lugar de acumular trabajo que no se podrá atender.
+- Expone métricas de profundidad de cola y tiempo de espera.
+
+**Un único proceso de trabajo**:
+Los candados por usuario y el presupuesto de admisión viven en la memoria del proceso. Con varios workers,
+dos turnos del mismo usuario pueden ejecutarse a la vez en procesos distintos y el máximo de peticiones en curso
+se multiplica por el número de workers. Por eso `werbly_asgi` y `gunicorn.conf.py` arrancan un solo worker
+(WEB_CONCURRENCY=1); para escalar se añaden instancias detrás de un balanceador que enrute por `user_id`.
+
+**Conexión con otros módulos**:
+- Es utilizado por `werbly_asgi` alrededor del procesamiento de `/chat`.
+"""
+import time
+import math
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+from modules.tracing import percentile
+
+
+class AdmissionRejected(Exception):
+    """
+    Error lanzado cuando una petición no puede admitirse porque la cola está llena.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class KeyedSerializer:
+    """
+    Candados por clave (user_id): las peticiones con la misma clave se ejecutan de una en una y en orden
+    de llegada. Los candados se eliminan cuando no quedan peticiones pendientes para la clave.
+    """
+
+    def __init__(self, max_pending_per_key: int):
+        self.max_pending_per_key = max_pending_per_key
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._pending: Dict[str, int] = {}
+
+    def pending(self, key: str) -> int:
+        return self._pending.get(key, 0)
+
+    def waiting(self) -> int:
+        """
+        Número de peticiones esperando su turno detrás de otra del mismo usuario.
+        """
+        return sum(max(0, count - 1) for count in self._pending.values())
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        """
+        Espera el turno de la clave y lo mantiene durante el bloque.
+
+        :param key: Clave de serialización (user_id).
+        """
+        if self._pending.get(key, 0) >= self.max_pending_per_key:
+            raise AdmissionRejected(f"Demasiados mensajes pendientes para {key}.", retry_after=1)
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._pending[key] = self._pending.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._pending[key] -= 1
+            if self._pending[key] == 0:
+                del self._pending[key]
+                del self._locks[key]
+
+
+class AdmissionController:
+    """
+    Control de admisión global con un máximo de peticiones en curso y una cola de espera acotada.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, window: int = 1000):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._wait_times = deque(maxlen=window)
+        self._service_times = deque(maxlen=window)
+
+    def retry_after(self) -> int:
+        """
+        Estima en segundos cuándo habrá hueco en la cola, a partir del tiempo medio de servicio.
+
+        :return: Segundos recomendados para reintentar (mínimo 1).
+        """
+        if not self._service_times:
+            return 1
+        average_service = sum(self._service_times) / len(self._service_times)
+        return max(1, math.ceil(average_service * (self.waiting + 1) / self.max_in_flight))
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Espera un hueco de ejecución o rechaza la petición si la cola está llena.
+        """
+        if self.in_flight >= self.max_in_flight and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("El servidor está saturado.", retry_after=self.retry_after())
+
+        self.waiting += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self._wait_times.append(started_at - queued_at)
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._service_times.append(time.perf_counter() - started_at)
+            self._semaphore.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Devuelve las métricas actuales de la cola.
+
+        :return: Diccionario con peticiones en curso, profundidad de cola, contadores y tiempos de espera.
+        """
+        waits = sorted(self._wait_times)
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted_total": self.admitted,
+            "rejected_total": self.rejected,
+            "wait_ms_avg": round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+            "wait_ms_p95": round(1000 * percentile(waits, 0.95), 2),
+            "wait_ms_max": round(1000 * waits[-1], 2) if waits else 0.0,
+        }
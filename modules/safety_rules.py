@@ -0,0 +1,261 @@
+"""
+Módulo de Reglas de Seguridad Compiladas de Bwere.
+Evalúa planes nutricionales y de entrenamiento contra los límites numéricos de `config/safety_limits`
+directamente en proceso, sin consultar a la IA.
+
+**Propósito**:
+- Compila una sola vez los límites de seguridad en un conjunto de reglas ejecutables.
+- Resuelve de forma determinista los casos claros (planes seguros o infracciones evidentes) y marca como
+  dudosos los casos límite o incompletos para que solo esos se escalen a la IA.
+
+**Conexión con otros módulos**:
+- **Entrada de datos:** Recibe los límites cargados por `security_guard` y los planes generados por
+  `nutrition_planner` y `training_planner`.
+- **Salida de resultados:** Devuelve un veredicto estructurado que `security_guard` utiliza para decidir
+  si es necesario consultar a `ai_core`.
+"""
+import re
+from typing import Dict, Any, List, Optional, Callable
+
+VERDICT_SAFE = "safe"
+VERDICT_UNSAFE = "unsafe"
+VERDICT_REVIEW = "review"
+
+STATUS_OK = "ok"
+STATUS_VIOLATION = "violation"
+STATUS_BORDERLINE = "borderline"
+STATUS_UNKNOWN = "unknown"
+
+# Valores utilizados cuando el documento `config/safety_limits` no define un límite concreto
+DEFAULT_SAFETY_LIMITS = {
+    "min_daily_calories": 1200,
+    "max_daily_calories": 4500,
+    "max_sets_per_exercise": 6,
+    "max_reps_per_set": 30,
+    "min_rest_seconds": 30,
+    "borderline_margin": 0.1,  # Fracción del límite considerada zona dudosa
+}
+
+_CALORIE_KEYS = ("daily_calories", "total_calories", "calories", "recommended_calories")
+_DURATION_PATTERN = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*(s|seg|sec|segundos|m|min|minutos)?\s*$", re.IGNORECASE)
+
+
+def _to_number(value: Any) -> Optional[float]:
+    """
+    Convierte un valor numérico o un rango tipo "8-12" en un número, usando el extremo superior del rango.
+
+    :param value: Valor a convertir.
+    :return: Número convertido o None si no es interpretable.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        parts = re.findall(r"\d+(?:[.,]\d+)?", value)
+        if parts:
+            return max(float(p.replace(",", ".")) for p in parts)
+    return None
+
+
+def _parse_seconds(value: Any) -> Optional[float]:
+    """
+    Interpreta un tiempo de descanso expresado como número de segundos o texto ("60s", "1.5 min").
+
+    :param value: Valor del descanso.
+    :return: Descanso en segundos o None si no es interpretable.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        match = _DURATION_PATTERN.match(value)
+        if match:
+            amount = float(match.group(1).replace(",", "."))
+            unit = (match.group(2) or "s").lower()
+            return amount * 60 if unit.startswith("m") else amount
+    return None
+
+
+def extract_daily_calories(nutrition_plan: Any) -> Optional[float]:
+    """
+    Obtiene las calorías diarias de un plan nutricional, ya sea de un campo directo o sumando las comidas.
+
+    :param nutrition_plan: Plan nutricional (diccionario).
+    :return: Calorías diarias o None si el plan no permite calcularlas.
+    """
+    if not isinstance(nutrition_plan, dict):
+        return None
+    for key in _CALORIE_KEYS:
+        calories = _to_number(nutrition_plan.get(key))
+        if calories is not None:
+            return calories
+    meals = nutrition_plan.get("meals")
+    if isinstance(meals, list) and meals:
+        values = [_to_number(meal.get("calories")) if isinstance(meal, dict) else None for meal in meals]
+        if all(v is not None for v in values):
+            return sum(values)
+    return None
+
+
+def extract_exercises(training_plan: Any) -> List[Dict[str, Any]]:
+    """
+    Obtiene la lista de ejercicios de un plan de entrenamiento, aceptando tanto una lista directa
+    (formato de `training_planner.generate_training_plan`) como un diccionario con la clave `exercises`.
+
+    :param training_plan: Plan de entrenamiento.
+    :return: Lista de ejercicios (diccionarios).
+    """
+    if isinstance(training_plan, dict):
+        training_plan = training_plan.get("exercises", [])
+    if not isinstance(training_plan, list):
+        return []
+    return [exercise for exercise in training_plan if isinstance(exercise, dict)]
+
+
+class CompiledSafetyRules:
+    """
+    Conjunto de reglas de seguridad precompiladas a partir de los límites configurados.
+    Cada regla es una función que recibe los planes y devuelve una lista de hallazgos.
+    """
+
+    def __init__(self, limits: Dict[str, Any]):
+        self.limits = {**DEFAULT_SAFETY_LIMITS, **(limits or {})}
+        self.margin = float(self.limits.get("borderline_margin") or 0)
+        self._rules: List[Callable[[Any, Any], List[Dict[str, Any]]]] = []
+        self._compile()
+
+    def _compile(self):
+        """
+        Construye las reglas aplicables según los límites presentes.
+        Los límites con valor nulo se consideran deshabilitados.
+        """
+        min_calories = _to_number(self.limits.get("min_daily_calories"))
+        max_calories = _to_number(self.limits.get("max_daily_calories"))
+        if min_calories is not None or max_calories is not None:
+            self._rules.append(self._calorie_rule(min_calories, max_calories))
+
+        max_sets = _to_number(self.limits.get("max_sets_per_exercise"))
+        if max_sets is not None:
+            self._rules.append(self._exercise_max_rule("sets", max_sets, _to_number))
+
+        max_reps = _to_number(self.limits.get("max_reps_per_set"))
+        if max_reps is not None:
+            self._rules.append(self._exercise_max_rule("reps", max_reps, _to_number))
+
+        min_rest = _to_number(self.limits.get("min_rest_seconds"))
+        if min_rest is not None:
+            self._rules.append(self._rest_rule(min_rest))
+
+        self._has_exercise_rules = any(limit is not None for limit in (max_sets, max_reps, min_rest))
+
+    def _finding(self, rule: str, status: str, detail: str) -> Dict[str, Any]:
+        return {"rule": rule, "status": status, "detail": detail}
+
+    def _check_floor(self, rule: str, value: float, floor: float, label: str) -> Dict[str, Any]:
+        if value < floor:
+            return self._finding(rule, STATUS_VIOLATION, f"{label} ({value:g}) por debajo del mínimo permitido ({floor:g}).")
+        if value < floor * (1 + self.margin):
+            return self._finding(rule, STATUS_BORDERLINE, f"{label} ({value:g}) cerca del mínimo permitido ({floor:g}).")
+        return self._finding(rule, STATUS_OK, f"{label} ({value:g}) dentro del límite.")
+
+    def _check_ceiling(self, rule: str, value: float, ceiling: float, label: str) -> Dict[str, Any]:
+        if value > ceiling:
+            return self._finding(rule, STATUS_VIOLATION, f"{label} ({value:g}) supera el máximo permitido ({ceiling:g}).")
+        if value > ceiling * (1 - self.margin):
+            return self._finding(rule, STATUS_BORDERLINE, f"{label} ({value:g}) cerca del máximo permitido ({ceiling:g}).")
+        return self._finding(rule, STATUS_OK, f"{label} ({value:g}) dentro del límite.")
+
+    def _calorie_rule(self, min_calories: Optional[float], max_calories: Optional[float]):
+        def rule(nutrition_plan, training_plan):
+            calories = extract_daily_calories(nutrition_plan)
+            if calories is None:
+                return [self._finding("daily_calories", STATUS_UNKNOWN, "El plan nutricional no indica las calorías diarias.")]
+            findings = []
+            if min_calories is not None:
+                findings.append(self._check_floor("min_daily_calories", calories, min_calories, "Calorías diarias"))
+            if max_calories is not None:
+                findings.append(self._check_ceiling("max_daily_calories", calories, max_calories, "Calorías diarias"))
+            return findings
+        return rule
+
+    def _exercise_max_rule(self, field: str, ceiling: float, parser: Callable[[Any], Optional[float]]):
+        rule_name = f"max_{field}"
+
+        def rule(nutrition_plan, training_plan):
+            findings = []
+            for exercise in extract_exercises(training_plan):
+                name = exercise.get("exercise") or exercise.get("name") or "ejercicio"
+                value = parser(exercise.get(field))
+                if value is None:
+                    findings.append(self._finding(rule_name, STATUS_UNKNOWN, f"'{name}' no indica {field}."))
+                else:
+                    findings.append(self._check_ceiling(rule_name, value, ceiling, f"{field} de '{name}'"))
+            return findings
+        return rule
+
+    def _rest_rule(self, floor: float):
+        def rule(nutrition_plan, training_plan):
+            findings = []
+            for exercise in extract_exercises(training_plan):
+                name = exercise.get("exercise") or exercise.get("name") or "ejercicio"
+                rest = exercise.get("rest_seconds", exercise.get("rest"))
+                seconds = _parse_seconds(rest)
+                if seconds is None:
+                    findings.append(self._finding("min_rest_seconds", STATUS_UNKNOWN, f"'{name}' no indica un descanso interpretable."))
+                else:
+                    findings.append(self._check_floor("min_rest_seconds", seconds, floor, f"Descanso de '{name}' en segundos"))
+            return findings
+        return rule
+
+    def evaluate(self, nutrition_plan: Any, training_plan: Any) -> Dict[str, Any]:
+        """
+        Evalúa los planes contra todas las reglas compiladas.
+
+        :param nutrition_plan: Plan nutricional generado.
+        :param training_plan: Plan de entrenamiento generado.
+        :return: Diccionario con el veredicto (`safe`, `unsafe` o `review`) y los hallazgos de cada regla.
+        """
+        findings = []
+        for rule in self._rules:
+            findings.extend(rule(nutrition_plan, training_plan))
+        if self._has_exercise_rules and not extract_exercises(training_plan):
+            # Un plan vacío o que no se pudo interpretar no se aprueba sin revisión
+            findings.append(self._finding("training_plan", STATUS_UNKNOWN, "El plan de entrenamiento no contiene ejercicios interpretables."))
+
+        statuses = {finding["status"] for finding in findings}
+        if STATUS_VIOLATION in statuses:
+            verdict = VERDICT_UNSAFE
+        elif statuses & {STATUS_BORDERLINE, STATUS_UNKNOWN}:
+            verdict = VERDICT_REVIEW
+        else:
+            verdict = VERDICT_SAFE
+        return {"verdict": verdict, "findings": findings}
+
+
+def compile_safety_rules(limits: Dict[str, Any]) -> CompiledSafetyRules:
+    """
+    Compila los límites de seguridad en un conjunto de reglas reutilizable.
+
+    :param limits: Diccionario con los límites de `config/safety_limits`.
+    :return: Instancia de `CompiledSafetyRules`.
+    """
+    return CompiledSafetyRules(limits)
+
+
+def format_rules_verdict(result: Dict[str, Any]) -> str:
+    """
+    Convierte un veredicto determinista en un texto equivalente al que devolvería la validación con IA.
+
+    :param result: Resultado de `CompiledSafetyRules.evaluate`.
+    :return: Texto con el análisis de seguridad.
+    """
+    if result["verdict"] == VERDICT_SAFE:
+        return "Los planes son seguros: todos los valores están dentro de los límites de seguridad configurados."
+
+    issues = [f"- {f['detail']}" for f in result["findings"] if f["status"] != STATUS_OK]
+    header = (
+        "Los planes no son seguros y requieren ajustes:"
+        if result["verdict"] == VERDICT_UNSAFE
+        else "Los planes requieren revisión:"
+    )
+    return "\n".join([header, *issues])
@@ -11,12 +11,44 @@ son seguros y adecuados para el usuario.
 - **Entrada de datos:** Recibe planes generados desde `nutrition_planner` y `training_planner`.
 - **Salida de contexto:** Proporciona un resumen estructurado al módulo `ai_core` para que la IA valide o ajuste los planes.
 - **Integración con Firestore:** Recupera configuraciones y datos adicionales según el perfil del usuario.
+- **Reglas deterministas:** Evalúa primero los planes con `safety_rules` y solo consulta a la IA en casos dudosos.
 """
 from typing import Dict, Any
 from modules.firebase_connection import get_firestore_client
-from modules.ai_core import query_model
+from modules.ai_core import get_ai_core
+from modules.tracing import traced
+from modules.safety_rules import (
+    CompiledSafetyRules,
+    compile_safety_rules,
+    format_rules_verdict,
+    STATUS_OK,
+    VERDICT_REVIEW,
+)
 
+# Reglas compiladas a partir de `config/safety_limits` (se cargan una sola vez)
+_compiled_rules = None
 
+
+def load_safety_rules(force_reload: bool = False) -> CompiledSafetyRules:
+    """
+    Carga los límites de `config/safety_limits` desde Firestore y los compila en reglas.
+    Implementa un patrón singleton para no releer la configuración en cada validación.
+
+    :param force_reload: Si es True, vuelve a leer los límites aunque ya estén compilados.
+    :return: Reglas de seguridad compiladas.
+    """
+    global _compiled_rules
+    if _compiled_rules is None or force_reload:
+        try:
+            db = get_firestore_client()
+            limits = db.collection("config").document("safety_limits").get().to_dict() or {}
+            _compiled_rules = compile_safety_rules(limits)
+        except Exception as e:
+            raise RuntimeError(f"Error al cargar los límites de seguridad: {str(e)}")
+    return _compiled_rules
+
+
+@traced("security.prepare_validation_context")
 def prepare_validation_context(
     nutrition_plan: Dict[str, Any],
     training_plan: Dict[str, Any],
@@ -37,8 +69,8 @@ def prepare_validation_context(
         user_ref = db.collection("usuarios").document(user_id)
         user_data = user_ref.get().to_dict() or {}
 
-        # Recuperar configuraciones de seguridad desde Firestore
-        safety_config = db.collection("config").document("safety_limits").get().to_dict() or {}
+        # Recuperar configuraciones de seguridad (cargadas una sola vez desde Firestore)
+        safety_config = load_safety_rules().limits
 
         # Agregar análisis dinámico si está disponible
         context = {
@@ -60,7 +92,8 @@ def prepare_validation_context(
 
 def validate_plans_with_ai(nutrition_plan: Dict[str, Any], training_plan: Dict[str, Any], user_id: str) -> str:
     """
-    Envía el contexto dinámico a la IA para que evalúe si los planes son seguros y adecuados.
+    Evalúa los planes con las reglas de seguridad compiladas y, solo si el resultado es dudoso
+    (valores cerca de un límite o datos incompletos), envía el contexto dinámico a la IA.
 
     :param nutrition_plan: Diccionario con el plan nutricional generado.
     :param training_plan: Diccionario con el plan de entrenamiento generado.
@@ -68,8 +101,16 @@ def validate_plans_with_ai(nutrition_plan: Dict[str, Any], training_plan: Dict[s
     :return: Respuesta de la IA indicando si los planes son seguros o necesitan ajustes.
     """
     try:
+        # Evaluación determinista: resuelve los casos claros sin consultar a la IA
+        rules_result = load_safety_rules().evaluate(nutrition_plan, training_plan)
+        if rules_result["verdict"] != VERDICT_REVIEW:
+            return format_rules_verdict(rules_result)
+
         # Preparar contexto dinámico
         validation_context = prepare_validation_context(nutrition_plan, training_plan, user_id)
+        validation_context["rule_findings"] = [
+            finding for finding in rules_result["findings"] if finding["status"] != STATUS_OK
+        ]
 
         # Crear prompt dinámico para la IA
         prompt = (
@@ -77,11 +118,13 @@ def validate_plans_with_ai(nutrition_plan: Dict[str, Any], training_plan: Dict[s
             "y de entrenamiento son seguros, adecuados y alineados con el perfil del usuario. Proporciona recomendaciones "
             "detalladas si se requiere algún ajuste.\n\n"
             f"Contexto de validación:\n{validation_context}\n\n"
+            "Presta especial atención a los puntos listados en 'rule_findings', que las reglas automáticas "
+            "no pudieron resolver.\n\n"
             "Responde con un análisis claro, incluyendo aspectos positivos, riesgos potenciales y ajustes recomendados."
         )
 
         # Enviar contexto a la IA para validación
-        response = query_model(prompt)
+        response = get_ai_core().query_model(prompt)
         return response
     except Exception as e:
         return f"Error al validar los planes con IA: {str(e)}"
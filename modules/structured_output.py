@@ -0,0 +1,294 @@
+"""
+Módulo de Salidas Estructuradas de la IA.
+Solicita a la IA respuestas en JSON, las analiza de forma incremental y las valida contra esquemas de pydantic.
+
+**Propósito**:
+- Añade a los prompts las instrucciones y el esquema JSON esperado.
+- Analiza las respuestas a medida que llegan (también por fragmentos) sin esperar a tener el texto completo.
+- Repara localmente errores de formato habituales y, solo si la validación sigue fallando,
+  reintenta una única vez la consulta indicando a la IA el error encontrado.
+
+**Conexión con otros módulos**:
+- **Entrada de datos:** Recibe una función de consulta (`AICore.query_model` o, en streaming, `AICore.stream_model`)
+  y un esquema de `plan_schemas`.
+- **Salida de datos:** Devuelve instancias validadas de los esquemas a `nutrition_planner`, `supplement_manager`
+  y `training_planner`.
+"""
+import json
+import logging
+import re
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_INVALID = object()
+
+# Longitud máxima aceptada por `AICore._validate_prompt`
+MAX_PROMPT_CHARS = 5000
+# Longitud máxima del error de validación que se incluye en el prompt del reintento
+MAX_RETRY_ERROR_CHARS = 300
+RETRY_TEMPLATE = (
+    "\n\nTu respuesta anterior no era válida ({error}). "
+    "Devuelve de nuevo el JSON completo corrigiendo el error."
+)
+
+
+class StructuredOutputError(ValueError):
+    """
+    Error lanzado cuando la respuesta de la IA no puede convertirse en una salida estructurada válida.
+    """
+
+
+class StreamingJSONParser:
+    """
+    Analizador incremental de JSON.
+    Recibe el texto por fragmentos y devuelve cada objeto o lista de primer nivel en cuanto se completa,
+    ignorando el texto libre o los delimitadores de Markdown que la IA añada alrededor.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        Procesa un fragmento de texto.
+
+        :param chunk: Fragmento recibido de la IA.
+        :return: Lista de valores JSON completados en este fragmento (puede estar vacía).
+        """
+        completed = []
+        for char in chunk:
+            if self._depth == 0:
+                if char in "{[":
+                    self._buffer = [char]
+                    self._depth = 1
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    value = self._decode("".join(self._buffer))
+                    if value is not _INVALID:
+                        completed.append(value)
+                    self._buffer = []
+        return completed
+
+    def pending(self) -> str:
+        """
+        Devuelve el texto de un valor JSON todavía incompleto.
+
+        :return: Texto pendiente de cerrar.
+        """
+        return "".join(self._buffer) if self._depth else ""
+
+    def _decode(self, text: str) -> Any:
+        # Los fragmentos entre llaves o corchetes que no son JSON (texto libre de la IA) se descartan
+        for candidate in (text, repair_json(text)):
+            try:
+                return json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+        return _INVALID
+
+
+def parse_stream(chunks: Iterable[str]) -> Iterator[Any]:
+    """
+    Analiza un flujo de fragmentos de texto y produce cada valor JSON completo en cuanto está disponible.
+
+    :param chunks: Iterable de fragmentos (por ejemplo, tokens de una respuesta en streaming).
+    :return: Iterador de valores JSON.
+    """
+    parser = StreamingJSONParser()
+    for chunk in chunks:
+        for value in parser.feed(chunk):
+            yield value
+
+
+def repair_json(text: str) -> str:
+    """
+    Aplica reparaciones locales a un texto JSON mal formado: elimina delimitadores de Markdown
+    y comas finales, y cierra llaves o corchetes pendientes.
+
+    :param text: Texto a reparar.
+    :return: Texto reparado (no se garantiza que sea JSON válido).
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[-1]
+    text = text.rstrip("`").strip()
+
+    closers = []
+    in_string = escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+    if in_string:
+        text += '"'
+    # Las comas finales se eliminan tras cerrar el texto para cubrir también las que preceden a los cierres añadidos
+    return _TRAILING_COMMA.sub(r"\1", text + "".join(reversed(closers)))
+
+
+def schema_instructions(schema: Type[BaseModel]) -> str:
+    """
+    Genera las instrucciones que se añaden al prompt para solicitar una respuesta JSON válida.
+
+    :param schema: Esquema de pydantic esperado.
+    :return: Texto con las instrucciones y el esquema JSON compacto.
+    """
+    json_schema = json.dumps(_compact_schema(schema.model_json_schema()), separators=(",", ":"), ensure_ascii=False)
+    return (
+        "Responde únicamente con un objeto JSON válido, sin texto adicional, que cumpla este esquema:\n"
+        f"{json_schema}"
+    )
+
+
+def _compact_schema(value: Any, in_properties: bool = False) -> Any:
+    # Elimina del esquema JSON lo que no aporta a la IA (títulos, descripciones de los modelos
+    # y valores por defecto nulos) para que las instrucciones ocupen menos espacio en el prompt
+    if isinstance(value, list):
+        return [_compact_schema(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    compact = {}
+    for key, item in value.items():
+        if not in_properties and (
+            key == "title" or (key == "description" and "properties" in value) or (key == "default" and item is None)
+        ):
+            continue
+        compact[key] = _compact_schema(item, in_properties=key in ("properties", "$defs") and not in_properties)
+    return compact
+
+
+def fit_prompt(prompt: str, reserved: int) -> str:
+    """
+    Recorta el contexto de un prompt para que, junto con el texto que se le añadirá, no supere
+    `MAX_PROMPT_CHARS`. Se conserva la última línea, que contiene las indicaciones finales.
+
+    :param prompt: Prompt base con el contexto de la petición.
+    :param reserved: Caracteres que se añadirán después del prompt.
+    :return: Prompt recortado si era necesario.
+    """
+    budget = MAX_PROMPT_CHARS - reserved
+    if len(prompt) <= budget:
+        return prompt
+    logging.warning(f"Prompt de {len(prompt)} caracteres recortado a {budget} para la salida estructurada.")
+    head, separator, last_line = prompt.rpartition("\n")
+    if not separator or len(last_line) >= budget:
+        return prompt[:budget]
+    return f"{head[:budget - len(last_line) - 1]}\n{last_line}"
+
+
+def parse_structured_output(text: str, schema: Type[T]) -> T:
+    """
+    Extrae y valida el primer objeto JSON de una respuesta de texto.
+
+    :param text: Respuesta completa de la IA.
+    :param schema: Esquema de pydantic esperado.
+    :return: Instancia validada del esquema.
+    """
+    parser = StreamingJSONParser()
+    values = parser.feed(text or "")
+    if not values and parser.pending():
+        # Respuesta truncada: se intenta cerrar el JSON pendiente
+        values = [json.loads(repair_json(parser.pending()))]
+    for value in values:
+        if isinstance(value, dict):
+            return schema.model_validate(value)
+    raise StructuredOutputError("La respuesta no contiene un objeto JSON.")
+
+
+def stream_structured_output(chunks: Iterable[str], schema: Type[T]) -> T:
+    """
+    Valida el primer objeto JSON de una respuesta en streaming en cuanto se completa, sin esperar al resto
+    del texto; la lectura del flujo se interrumpe en ese momento.
+
+    :param chunks: Fragmentos de la respuesta de la IA (por ejemplo, de `AICore.stream_model`).
+    :param schema: Esquema de pydantic esperado.
+    :return: Instancia validada del esquema.
+    """
+    source = iter(chunks)
+    received: List[str] = []
+
+    def recorded() -> Iterator[str]:
+        for chunk in source:
+            received.append(chunk)
+            yield chunk
+
+    try:
+        for value in parse_stream(recorded()):
+            if isinstance(value, dict):
+                try:
+                    return schema.model_validate(value)
+                except ValidationError:
+                    break
+    finally:
+        close = getattr(source, "close", None)
+        if close:
+            close()
+    # Sin objeto válido: se analiza lo recibido (reparando un JSON truncado) para obtener el error concreto
+    return parse_structured_output("".join(received), schema)
+
+
+def request_structured_output(
+    query_fn: Callable[[str], str],
+    prompt: str,
+    schema: Type[T],
+    stream_fn: Optional[Callable[[str], Iterable[str]]] = None,
+) -> T:
+    """
+    Solicita a la IA una salida estructurada y la valida, reintentando una sola vez si la validación falla.
+
+    :param query_fn: Función que envía un prompt a la IA y devuelve su respuesta en texto.
+    :param prompt: Prompt base con el contexto de la petición.
+    :param schema: Esquema de pydantic esperado.
+    :param stream_fn: Función de streaming opcional; si se indica, la respuesta se analiza por fragmentos.
+    :return: Instancia validada del esquema.
+    """
+    def attempt(text: str) -> T:
+        if stream_fn is not None:
+            return stream_structured_output(stream_fn(text), schema)
+        return parse_structured_output(query_fn(text), schema)
+
+    instructions = f"\n\n{schema_instructions(schema)}"
+    # Se reserva el espacio de las instrucciones y del aviso del reintento para no superar el límite del prompt
+    reserved = len(instructions) + len(RETRY_TEMPLATE.format(error="")) + MAX_RETRY_ERROR_CHARS
+    full_prompt = fit_prompt(prompt, reserved) + instructions
+    try:
+        return attempt(full_prompt)
+    except (ValueError, ValidationError) as first_error:
+        logging.warning(f"Salida estructurada inválida para {schema.__name__}, reintentando: {first_error}")
+        retry_prompt = full_prompt + RETRY_TEMPLATE.format(error=str(first_error)[:MAX_RETRY_ERROR_CHARS])
+        try:
+            return attempt(retry_prompt)
+        except (ValueError, ValidationError) as e:
+            raise StructuredOutputError(f"No se obtuvo una salida válida para {schema.__name__}: {str(e)}")
@@ -1,10 +1,199 @@
 """
 Módulo de Integración con Supermercados.
 Automatiza la generación de listas de la compra y pedidos.
+
+**Propósito**:
+- Agrega los ingredientes de uno o varios planes nutricionales estructurados (varios usuarios y días)
+  en una única lista de la compra, normalizando unidades (g, kg, ml, l, unidades) y fusionando duplicados.
+- Asocia cada ingrediente a una referencia (SKU) del catálogo mediante una tabla de búsqueda precalculada
+  a partir de los datos de alimentos normalizados.
+
+**Conexión con otros módulos**:
+- **Entrada de datos:** Recibe planes con el formato `NutritionPlan` de `plan_schemas` (generados por `nutrition_planner`).
+- **Datos de catálogo:** Lee los archivos de `structured_data/` generados por el pipeline de `AutomaticApis`.
 """
+import os
+import re
+import json
+import logging
+import unicodedata
+from typing import Dict, Any, List, Optional, Union
+
+CATALOG_DATA_DIR = os.getenv("CATALOG_DATA_DIR", "structured_data")
+
+# Conversión de cada unidad a su unidad base (g, ml o unit) y factor multiplicador
+UNIT_CONVERSIONS = {
+    "g": ("g", 1.0), "gr": ("g", 1.0), "gramos": ("g", 1.0), "grams": ("g", 1.0),
+    "kg": ("g", 1000.0), "kilo": ("g", 1000.0), "kilos": ("g", 1000.0),
+    "mg": ("g", 0.001),
+    "ml": ("ml", 1.0), "cl": ("ml", 10.0), "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0), "litro": ("ml", 1000.0), "litros": ("ml", 1000.0),
+    "unit": ("unit", 1.0), "units": ("unit", 1.0), "u": ("unit", 1.0), "ud": ("unit", 1.0),
+    "uds": ("unit", 1.0), "unidad": ("unit", 1.0), "unidades": ("unit", 1.0),
+    "pieza": ("unit", 1.0), "piezas": ("unit", 1.0),
+}
+SKU_FIELDS = ("sku", "code", "barcode", "fdcId", "id")
+
+_SPACES = re.compile(r"\s+")
+
 
-def create_shopping_list(nutrition_plan):
+def normalize_ingredient_name(name: str) -> str:
     """
-    Recibe un plan nutricional y retorna una lista de compras (placeholder).
+    Genera la clave de búsqueda de un ingrediente: minúsculas, sin tildes y con espacios simples.
+
+    :param name: Nombre del ingrediente.
+    :return: Clave normalizada.
+    """
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return _SPACES.sub(" ", name.strip().lower())
+
+
+def normalize_unit(quantity: float, unit: Optional[str]) -> tuple:
+    """
+    Convierte una cantidad a la unidad base correspondiente.
+
+    :param quantity: Cantidad en la unidad original.
+    :param unit: Unidad original (si no se reconoce, se conserva tal cual).
+    :return: Tupla (cantidad, unidad base).
     """
-    return ["Avena", "Pechuga de pollo", "Espinacas"]
+    unit_key = (unit or "unit").strip().lower().rstrip(".")
+    base_unit, factor = UNIT_CONVERSIONS.get(unit_key, (unit_key, 1.0))
+    return float(quantity or 0) * factor, base_unit
+
+
+def build_catalog_index(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Construye la tabla de búsqueda nombre normalizado -> referencia del catálogo.
+
+    :param records: Registros de alimentos normalizados (deben incluir `name`).
+    :return: Diccionario con la referencia (`sku`) y el nombre de catálogo de cada alimento.
+    """
+    index = {}
+    for record in records:
+        name = record.get("name")
+        if not name:
+            continue
+        key = normalize_ingredient_name(name)
+        if key in index:
+            continue
+        sku = next((record[field] for field in SKU_FIELDS if record.get(field)), None)
+        index[key] = {"sku": str(sku) if sku is not None else None, "catalog_name": name}
+    return index
+
+
+def _read_columnar_catalog(path: str) -> List[Dict[str, Any]]:
+    """
+    Lee de un fichero Parquet / Arrow solo las columnas que usa la tabla de búsqueda.
+
+    :param path: Ruta del fichero.
+    :return: Registros con `name` y los campos de referencia presentes.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet" if path.endswith(".parquet") else "ipc")
+    columns = [column for column in ("name", *SKU_FIELDS) if column in dataset.schema.names]
+    return dataset.to_table(columns=columns, filter=ds.field("name").is_valid()).to_pylist()
+
+
+# Tabla de búsqueda compartida (se construye una sola vez por proceso)
+_catalog_index = None
+
+
+def load_catalog_index(data_dir: str = CATALOG_DATA_DIR, force_reload: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Carga los datos de alimentos normalizados y construye la tabla de búsqueda del catálogo.
+
+    :param data_dir: Directorio con los archivos `*_structured.ndjson` (o `.json`, `.parquet`, `.arrow`).
+    :param force_reload: Si es True, vuelve a construir la tabla.
+    :return: Tabla de búsqueda del catálogo.
+    """
+    global _catalog_index
+    if _catalog_index is not None and not force_reload:
+        return _catalog_index
+
+    records = []
+    if os.path.isdir(data_dir):
+        for file_name in sorted(os.listdir(data_dir)):
+            if not file_name.endswith(("_structured.ndjson", "_structured.json", "_structured.parquet", "_structured.arrow")):
+                continue
+            try:
+                if file_name.endswith((".parquet", ".arrow")):
+                    records.extend(_read_columnar_catalog(os.path.join(data_dir, file_name)))
+                    continue
+                with open(os.path.join(data_dir, file_name), "r", encoding="utf-8") as f:
+                    if file_name.endswith(".ndjson"):
+                        records.extend(json.loads(line) for line in f if line.strip())
+                    else:
+                        records.extend(json.load(f))
+            except Exception as e:
+                logging.error(f"Error al leer el catálogo {file_name}: {str(e)}")
+    else:
+        logging.warning(f"Directorio de catálogo '{data_dir}' no encontrado. Las referencias quedarán vacías.")
+
+    _catalog_index = build_catalog_index(records)
+    return _catalog_index
+
+
+def _iter_plans(nutrition_plans: Any, portions: Union[float, Dict[str, float], None]):
+    """
+    Recorre los planes recibidos junto con el factor de ración que corresponde a cada uno.
+    Acepta un plan, una lista de planes (por ejemplo, uno por día) o un diccionario usuario -> plan(es).
+
+    :param nutrition_plans: Planes nutricionales.
+    :param portions: Factor de ración global o por usuario.
+    :return: Iterador de tuplas (plan, factor).
+    """
+    if isinstance(nutrition_plans, dict) and "meals" not in nutrition_plans:
+        for user_id, plans in nutrition_plans.items():
+            scale = portions.get(user_id, 1.0) if isinstance(portions, dict) else (portions or 1.0)
+            for plan in (plans if isinstance(plans, list) else [plans]):
+                yield plan, scale
+        return
+
+    scale = portions if isinstance(portions, (int, float)) else 1.0
+    for plan in (nutrition_plans if isinstance(nutrition_plans, list) else [nutrition_plans]):
+        yield plan, scale
+
+
+def create_shopping_list(
+    nutrition_plan: Any,
+    portions: Union[float, Dict[str, float], None] = None,
+    catalog: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Recibe uno o varios planes nutricionales estructurados y retorna la lista de compras agregada.
+    Todos los ingredientes de todos los usuarios y días se acumulan en una sola pasada sobre un diccionario
+    indexado por (ingrediente, unidad base); la referencia de catálogo se resuelve después una vez por ingrediente.
+
+    :param nutrition_plan: Plan (`NutritionPlan` o diccionario), lista de planes o diccionario usuario -> plan(es).
+    :param portions: Factor de ración global o por usuario (por ejemplo, {"ana": 1.0, "leo": 0.5}).
+    :param catalog: Tabla de búsqueda del catálogo (por defecto, la construida desde `structured_data`).
+    :return: Lista de artículos con nombre, cantidad, unidad base y referencia (`sku`).
+    """
+    catalog = load_catalog_index() if catalog is None else catalog
+    totals: Dict[tuple, float] = {}
+    names: Dict[str, str] = {}
+
+    for plan, scale in _iter_plans(nutrition_plan, portions):
+        if hasattr(plan, "model_dump"):
+            plan = plan.model_dump()
+        for meal in (plan or {}).get("meals", []):
+            for ingredient in meal.get("ingredients", []):
+                key = normalize_ingredient_name(ingredient.get("name", ""))
+                if not key:
+                    continue
+                quantity, unit = normalize_unit(ingredient.get("quantity"), ingredient.get("unit"))
+                totals[(key, unit)] = totals.get((key, unit), 0.0) + quantity * scale
+                names.setdefault(key, ingredient["name"])
+
+    shopping_list = []
+    for (key, unit), quantity in totals.items():
+        entry = catalog.get(key, {})
+        shopping_list.append({
+            "name": names[key],
+            "quantity": round(quantity, 2),
+            "unit": unit,
+            "sku": entry.get("sku"),
+        })
+    shopping_list.sort(key=lambda item: (normalize_ingredient_name(item["name"]), item["unit"]))
+    return shopping_list
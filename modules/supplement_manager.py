@@ -8,13 +8,35 @@ Identifica deficiencias y proporciona recomendaciones personalizadas de suplemen
 **Conexión con otros módulos**:
 - **Entrada de datos:** Recibe datos del usuario desde `user_data`, análisis desde `analysis_engine` y configuraciones desde Firestore.
 - **Salida de contexto:** Proporciona un resumen estructurado al módulo `ai_core` para que la IA genere recomendaciones precisas.
+- **Salida de recomendaciones:** Devuelve recomendaciones validadas con el esquema `SupplementPlan` de `plan_schemas`.
 """
 from typing import Dict, Any
 from modules.firebase_connection import get_firestore_client
 from modules.analysis_engine import prepare_analysis_context
-from modules.ai_core import query_model
-
-
+from modules.ai_core import get_ai_core
+from modules.plan_schemas import SupplementPlan
+from modules.plan_store import get_plan_store, compact_context
+from modules.structured_output import request_structured_output
+from modules.tracing import traced
+
+# Campos del contexto que determinan las recomendaciones (huella para reutilizarlas)
+SUPPLEMENT_FINGERPRINT_FIELDS = (
+    "weight",
+    "height",
+    "age",
+    "activity_level",
+    "long_term_goals",
+    "dietary_restrictions",
+    "health_conditions",
+    "medications",
+    "bmi",
+    "calories_estimate",
+    "fatigue_level",
+    "supplement_config",
+)
+
+
+@traced("supplements.prepare_context")
 def prepare_supplement_context(user_id: str) -> Dict[str, Any]:
     """
     Genera un contexto dinámico basado en los datos del usuario y su análisis.
@@ -47,12 +69,15 @@ def prepare_supplement_context(user_id: str) -> Dict[str, Any]:
         raise RuntimeError(f"Error al preparar el contexto de suplementación para el usuario {user_id}: {str(e)}")
 
 
-def recommend_supplements_with_ai(user_id: str) -> str:
+def recommend_supplements_with_ai(user_id: str, force_refresh: bool = False) -> Dict[str, Any]:
     """
-    Envía el contexto dinámico a la IA para generar recomendaciones personalizadas de suplementos.
+    Envía el contexto dinámico a la IA para generar recomendaciones personalizadas de suplementos
+    en formato estructurado, validado con el esquema `SupplementPlan`.
+    Si los datos relevantes del usuario no han cambiado, reutiliza las recomendaciones almacenadas.
 
     :param user_id: Identificador único del usuario.
-    :return: Respuesta de la IA con las recomendaciones de suplementos.
+    :param force_refresh: Si es True, genera recomendaciones nuevas aunque existan unas vigentes.
+    :return: Recomendaciones de suplementos como diccionario.
     """
     try:
         # Preparar contexto dinámico
@@ -66,8 +91,13 @@ def recommend_supplements_with_ai(user_id: str) -> str:
             "Asegúrate de que las recomendaciones sean seguras, basadas en las condiciones de salud y objetivos del usuario."
         )
 
-        # Generar recomendaciones usando la IA
-        recommendations = query_model(prompt)
-        return recommendations
+        # Generar y validar las recomendaciones usando la IA solo si no hay unas vigentes
+        return get_plan_store().get_or_generate(
+            user_id,
+            "supplements",
+            compact_context(supplement_context, SUPPLEMENT_FINGERPRINT_FIELDS),
+            lambda: request_structured_output(get_ai_core().query_model, prompt, SupplementPlan, stream_fn=get_ai_core().stream_model).model_dump(),
+            force_refresh=force_refresh,
+        )
     except Exception as e:
-        return f"Error al generar recomendaciones de suplementos: {str(e)}"
+        raise RuntimeError(f"Error al generar recomendaciones de suplementos: {str(e)}")
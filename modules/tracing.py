@@ -0,0 +1,393 @@
+"""
+Módulo de Trazas de Bwere (tracing).
+Registra spans por petición para saber en qué etapa se va el tiempo de `/chat`: lecturas y escrituras
+de Firestore, preparación de contexto, construcción del prompt o la llamada a la IA.
+
+**Propósito**:
+- Ofrece una API mínima (`span`, `traced`, `current_span`) que no hace nada por defecto (coste casi nulo).
+- Con `TRACING_EXPORTER=jsonl`, escribe cada span como una línea JSON en `TRACE_FILE`.
+- Con `TRACING_EXPORTER=otel` y `opentelemetry` instalado, delega en el tracer de OpenTelemetry.
+- Envuelve el cliente de Firestore para medir cada operación con atributos (documentos, bytes).
+- `percentile` es el cálculo de percentiles común a las métricas y a las pruebas de carga.
+- Incluye una utilidad de línea de comandos que resume las trazas en forma de árbol (estilo flame graph):
+      python -m modules.tracing traces.jsonl [--top 20] [--folded]
+
+**Conexión con otros módulos**:
+- Es utilizado por `werbly_api`, `werbly_asgi`, `chat_pipeline`, `ai_core`, `prompt_manager`,
+  `firebase_connection` y las funciones `prepare_*_context` de los planificadores.
+"""
+import os
+import sys
+import math
+import json
+import time
+import uuid
+import atexit
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Optional
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry es opcional
+    otel_trace = None
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()  # "none", "jsonl" u "otel"
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("bwere_current_span", default=None)
+
+
+class NoopSpan:
+    """
+    Span vacío usado cuando las trazas están desactivadas.
+    """
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Span:
+    """
+    Span local con identificadores compatibles con OpenTelemetry (trace_id de 32 y span_id de 16 hexadecimales).
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration_ms = 0.0
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self._start_perf) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlExporter:
+    """
+    Escribe los spans terminados en un archivo JSONL (una línea por span).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        atexit.register(self.close)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+_exporter: Optional[JsonlExporter] = None
+_otel_tracer = None
+
+
+def configure_tracing(exporter: str = TRACING_EXPORTER, trace_file: str = TRACE_FILE):
+    """
+    Activa el exportador indicado. Se llama al importar el módulo con la configuración del entorno.
+
+    :param exporter: "none", "jsonl" u "otel".
+    :param trace_file: Archivo de salida para el exportador JSONL.
+    """
+    global _exporter, _otel_tracer
+    _exporter, _otel_tracer = None, None
+    if exporter == "jsonl":
+        _exporter = JsonlExporter(trace_file)
+    elif exporter == "otel" and otel_trace is not None:
+        _otel_tracer = otel_trace.get_tracer("bwere")
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None or _otel_tracer is not None
+
+
+def current_span():
+    """
+    Devuelve el span activo en el contexto actual (o un span vacío si no hay ninguno).
+    """
+    if _otel_tracer is not None:
+        return otel_trace.get_current_span()
+    return _current_span.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Abre un span hijo del span activo durante el bloque.
+
+    :param name: Nombre del span (por ejemplo, "firestore.get" o "ai.query_model").
+    :param attributes: Atributos iniciales del span.
+    """
+    if _otel_tracer is not None:
+        with _otel_tracer.start_as_current_span(name, attributes=attributes) as otel_span:
+            yield otel_span
+        return
+    if _exporter is None:
+        yield NOOP_SPAN
+        return
+
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+        _exporter.export(current)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorador que envuelve la función en un span.
+
+    :param name: Nombre del span (por defecto, módulo.función).
+    """
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracing_enabled():
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _payload_bytes(data: Any) -> int:
+    try:
+        return len(json.dumps(data, default=str, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+_FIRESTORE_CHAIN_METHODS = {
+    "collection", "document", "order_by", "where", "limit", "limit_to_last", "offset",
+    "start_at", "start_after", "end_at", "end_before", "select", "batch",
+}
+_FIRESTORE_WRITE_METHODS = {"set", "update", "add", "delete", "create"}
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, TracedFirestore) else value
+
+
+class TracedFirestore:
+    """
+    Envoltorio del cliente de Firestore (y de sus colecciones, consultas, documentos y lotes) que abre un span
+    por cada lectura (`get`, `stream`) o escritura (`set`, `update`, `add`, `delete`, `commit`).
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def _path(self) -> str:
+        path = getattr(self._target, "path", None)
+        if isinstance(path, str):
+            return path
+        # Las consultas conservan la colección de origen en `_parent`
+        target = getattr(self._target, "_parent", None) or self._target
+        return "/".join(getattr(target, "_path", ()) or ()) or type(self._target).__name__
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+        if name in _FIRESTORE_CHAIN_METHODS:
+            return lambda *args, **kwargs: TracedFirestore(attribute(*args, **kwargs))
+        if name == "get":
+            return lambda *args, **kwargs: self._traced_get(attribute, *args, **kwargs)
+        if name == "stream":
+            return lambda *args, **kwargs: self._traced_stream(attribute, *args, **kwargs)
+        # En un lote, set/update/delete solo acumulan operaciones: se mide el commit
+        is_batch = hasattr(self._target, "commit")
+        if name == "commit" or (name in _FIRESTORE_WRITE_METHODS and not is_batch):
+            return lambda *args, **kwargs: self._traced_write(name, attribute, *args, **kwargs)
+        return lambda *args, **kwargs: attribute(*[_unwrap(a) for a in args], **kwargs)
+
+    def _traced_get(self, method, *args, **kwargs):
+        with span("firestore.get", path=self._path()) as current:
+            result = method(*args, **kwargs)
+            snapshots = result if isinstance(result, list) else [result]
+            found = [s for s in snapshots if getattr(s, "exists", True)]
+            current.set_attributes({"docs": len(found), "bytes": sum(_payload_bytes(s.to_dict()) for s in found)})
+            return result
+
+    def _traced_stream(self, method, *args, **kwargs):
+        # Se materializa el resultado para que el span abarque la consulta completa
+        with span("firestore.stream", path=self._path()) as current:
+            snapshots = list(method(*args, **kwargs))
+            current.set_attributes({"docs": len(snapshots), "bytes": sum(_payload_bytes(s.to_dict()) for s in snapshots)})
+        return iter(snapshots)
+
+    def _traced_write(self, name, method, *args, **kwargs):
+        args = [_unwrap(a) for a in args]
+        attributes = {"path": self._path()}
+        payload = next((a for a in args if isinstance(a, dict)), None)
+        if payload is not None:
+            attributes["bytes"] = _payload_bytes(payload)
+        if name == "commit":
+            attributes["writes"] = len(getattr(self._target, "_write_pbs", ()) or ())
+        with span(f"firestore.{name}", **attributes):
+            result = method(*args, **kwargs)
+        return TracedFirestore(result[1]) if name == "add" and isinstance(result, tuple) else result
+
+
+def trace_firestore_client(client):
+    """
+    Envuelve el cliente de Firestore si las trazas están activas.
+
+    :param client: Cliente de Firestore.
+    :return: El cliente envuelto o el original si las trazas están desactivadas.
+    """
+    return TracedFirestore(client) if tracing_enabled() else client
+
+
+def load_spans(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def percentile(values, fraction: float) -> float:
+    """
+    Calcula un percentil por el método del rango más cercano: el menor valor que deja por debajo
+    (o igual) al menos esa fracción de las muestras.
+
+    :param values: Valores medidos (no hace falta que estén ordenados).
+    :param fraction: Percentil como fracción (0.99 para p99).
+    :return: Valor del percentil o 0 si no hay datos.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+def summarize(spans, trace_id: Optional[str] = None) -> Dict[tuple, Dict[str, float]]:
+    """
+    Agrega los spans por pila de llamadas (raíz;...;span) con tiempo total, propio y número de llamadas.
+
+    :param spans: Spans leídos del archivo JSONL.
+    :param trace_id: Si se indica, solo se resume esa traza.
+    :return: Diccionario {pila: {"count", "total_ms", "self_ms"}}.
+    """
+    by_id = {}
+    children_time = {}
+    for s in spans:
+        if trace_id and s["trace_id"] != trace_id:
+            continue
+        by_id[s["span_id"]] = s
+        if s.get("parent_id"):
+            children_time[s["parent_id"]] = children_time.get(s["parent_id"], 0.0) + s["duration_ms"]
+
+    def stack(s):
+        names = []
+        while s is not None:
+            names.append(s["name"])
+            s = by_id.get(s.get("parent_id"))
+        return tuple(reversed(names))
+
+    summary = {}
+    for span_id, s in by_id.items():
+        entry = summary.setdefault(stack(s), {"count": 0, "total_ms": 0.0, "self_ms": 0.0})
+        entry["count"] += 1
+        entry["total_ms"] += s["duration_ms"]
+        entry["self_ms"] += max(0.0, s["duration_ms"] - children_time.get(span_id, 0.0))
+    return summary
+
+
+def print_flame(summary: Dict[tuple, Dict[str, float]], top: int = 0, width: int = 30, out=sys.stdout):
+    """
+    Imprime el resumen como un árbol indentado con barras proporcionales al tiempo total.
+    """
+    roots_total = sum(v["total_ms"] for k, v in summary.items() if len(k) == 1) or 1.0
+    # Cada pila va tras su padre y, entre hermanas, de mayor a menor tiempo total
+    stacks = sorted(summary, key=lambda k: [(-summary.get(k[:i], {"total_ms": 0.0})["total_ms"], k[i - 1]) for i in range(1, len(k) + 1)])
+    if top:
+        allowed = set(sorted(summary, key=lambda k: -summary[k]["total_ms"])[:top])
+        stacks = [k for k in stacks if k in allowed]
+    out.write(f"{'span':<60}{'llamadas':>9}{'total ms':>12}{'propio ms':>12}{'%':>7}\n")
+    for key in stacks:
+        entry = summary[key]
+        share = entry["total_ms"] / roots_total
+        label = f"{'  ' * (len(key) - 1)}{key[-1]}"
+        bar = "█" * (max(1, int(share * width)) if share > 0.001 else 0)
+        out.write(f"{label:<60}{entry['count']:>9}{entry['total_ms']:>12.1f}{entry['self_ms']:>12.1f}{share * 100:>6.1f}% {bar}\n")
+
+
+def print_folded(summary: Dict[tuple, Dict[str, float]], out=sys.stdout):
+    """
+    Imprime las pilas en formato "folded" (tiempo propio en microsegundos), compatible con flamegraph.pl y speedscope.
+    """
+    for key, entry in sorted(summary.items()):
+        out.write(f"{';'.join(key)} {int(entry['self_ms'] * 1000)}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resume un archivo de trazas JSONL de Bwere.")
+    parser.add_argument("trace_file", nargs="?", default=TRACE_FILE)
+    parser.add_argument("--trace", help="Resume solo la traza indicada (trace_id)")
+    parser.add_argument("--top", type=int, default=0, help="Muestra solo las N pilas más costosas")
+    parser.add_argument("--folded", action="store_true", help="Salida en formato folded para flame graphs")
+    args = parser.parse_args(argv)
+
+    summary = summarize(load_spans(args.trace_file), args.trace)
+    if not summary:
+        print("No se encontraron spans.")
+        return
+    if args.folded:
+        print_folded(summary)
+    else:
+        print_flame(summary, args.top)
+
+
+configure_tracing()
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,145 @@
 """
 Módulo de Entrenamientos y Rutinas.
 Define planes de ejercicio (series, repeticiones, descansos) adaptados.
+Los planes se construyen de forma determinista a partir del índice de ejercicios (`exercise_index`)
+y de los objetivos de volumen y recuperación derivados de `analysis_engine`, sin consultar a la IA.
+Los planes generados con IA se validan con el esquema `TrainingPlan` de `plan_schemas`.
 """
+from typing import Dict, Any, List
+from modules.exercise_index import get_exercise_index, DIFFICULTY_LEVELS
+from modules.plan_schemas import TrainingPlan
+from modules.structured_output import request_structured_output
 
-def generate_training_plan(user_data, analysis):
+DEFAULT_MUSCLE_GROUPS = ["legs", "chest", "back", "shoulders", "core"]
+MAX_EXERCISES_PER_SESSION = 8
+MAX_SETS_PER_EXERCISE = 4
+
+# Series por grupo muscular y sesión según el nivel del usuario
+SETS_PER_GROUP = {"beginner": 4, "intermediate": 6, "advanced": 8}
+
+# Reducción de volumen según el nivel de fatiga calculado por `analysis_engine`
+FATIGUE_VOLUME_FACTOR = {"normal": 1.0, "moderate": 0.75, "high": 0.5}
+
+# Esquema de repeticiones y descanso (segundos) según el objetivo
+GOAL_SCHEMES = {
+    "strength": {"reps": 5, "rest_seconds": 150},
+    "hypertrophy": {"reps": 10, "rest_seconds": 90},
+    "endurance": {"reps": 15, "rest_seconds": 45},
+}
+GOAL_KEYWORDS = {
+    "strength": ("fuerza", "strength", "potencia"),
+    "endurance": ("resistencia", "endurance", "perder peso", "grasa", "adelgazar", "cardio"),
+    "hypertrophy": ("músculo", "musculo", "masa", "hipertrofia", "hypertrophy", "tonificar"),
+}
+
+
+def _detect_goal(user_data: Dict[str, Any]) -> str:
+    """
+    Deduce el objetivo principal del usuario a partir de sus metas declaradas.
+
+    :param user_data: Datos del usuario.
+    :return: Objetivo ("strength", "hypertrophy" o "endurance").
+    """
+    goals = " ".join(str(user_data.get(key, "")) for key in ("goal", "training_goal", "long_term_goals")).lower()
+    for goal, keywords in GOAL_KEYWORDS.items():
+        if any(keyword in goals for keyword in keywords):
+            return goal
+    return "hypertrophy"
+
+
+def _as_list(value: Any) -> List[str]:
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def generate_training_plan(user_data: Dict[str, Any], analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Retorna un plan de entrenamiento según el análisis y el perfil del usuario.
+    Selecciona ejercicios del índice de forma voraz: recorre los grupos musculares objetivo y asigna series
+    a los ejercicios que cubren más grupos pendientes hasta alcanzar el volumen de la sesión, respetando
+    el equipamiento disponible, la dificultad máxima por nivel, las contraindicaciones y la recuperación.
+
+    :param user_data: Datos del usuario (nivel, objetivos, equipamiento, lesiones, grupos en recuperación).
+    :param analysis: Contexto de `analysis_engine.prepare_analysis_context` (nivel de fatiga).
+    :return: Lista de ejercicios con series, repeticiones, descanso en segundos y grupo muscular.
     """
-    return [
-        {"exercise": "Squats", "sets": 3, "reps": 12, "rest": "60s"},
-        {"exercise": "Push-ups", "sets": 3, "reps": 15, "rest": "45s"}
+    user_data = user_data or {}
+    analysis = analysis or {}
+    index = get_exercise_index()
+
+    level = str(user_data.get("fitness_level", user_data.get("experience_level", "beginner"))).lower()
+    if level not in DIFFICULTY_LEVELS:
+        level = "beginner"
+    scheme = GOAL_SCHEMES[_detect_goal(user_data)]
+    fatigue_factor = FATIGUE_VOLUME_FACTOR.get(analysis.get("fatigue_level"), 1.0)
+    target_sets = max(2, round(SETS_PER_GROUP[level] * fatigue_factor))
+
+    # Recuperación: se omiten los grupos trabajados recientemente
+    recovering = {group.lower() for group in _as_list(user_data.get("recovering_muscle_groups"))}
+    groups = [
+        group.lower() for group in (_as_list(user_data.get("focus_muscle_groups")) or DEFAULT_MUSCLE_GROUPS)
+        if group.lower() not in recovering
     ]
+    equipment = user_data.get("available_equipment")
+    contraindications = _as_list(user_data.get("injuries")) + _as_list(user_data.get("health_conditions"))
+
+    remaining = {group: target_sets for group in groups}
+    used = set()
+    plan = []
+    for group in groups:
+        candidates = index.query(
+            muscle_group=group,
+            equipment=_as_list(equipment) if equipment is not None else None,
+            max_difficulty=level,
+            exclude_contraindications=contraindications,
+        )
+        # Prioriza los ejercicios que cubren más grupos con volumen pendiente y, después, los más exigentes
+        candidates.sort(
+            key=lambda ex: (
+                -sum(1 for g in ex["muscle_groups"] if remaining.get(g, 0) > 0),
+                -DIFFICULTY_LEVELS[ex["difficulty"]],
+            )
+        )
+        for exercise in candidates:
+            if remaining[group] <= 0 or len(plan) >= MAX_EXERCISES_PER_SESSION:
+                break
+            if exercise["name"] in used:
+                continue
+            sets = min(MAX_SETS_PER_EXERCISE, remaining[group])
+            used.add(exercise["name"])
+            for covered in exercise["muscle_groups"]:
+                if covered in remaining:
+                    remaining[covered] = max(0, remaining[covered] - sets)
+            plan.append({
+                "exercise": exercise["name"],
+                "sets": sets,
+                "reps": scheme["reps"],
+                "rest_seconds": scheme["rest_seconds"],
+                "muscle_group": group,
+                "equipment": exercise["equipment"],
+            })
+    return plan
+
+def generate_training_plan_with_ai(user_data: Dict[str, Any], analysis: Dict[str, Any], ai_core) -> Dict[str, Any]:
+    """
+    Solicita a la IA un plan de entrenamiento estructurado (ejercicios con series, repeticiones y descanso)
+    y lo valida con el esquema `TrainingPlan`.
+
+    :param user_data: Datos del usuario.
+    :param analysis: Contexto de análisis generado por `analysis_engine`.
+    :param ai_core: Referencia al módulo `ai_core` para generar planes con la IA.
+    :return: Plan de entrenamiento como diccionario.
+    """
+    try:
+        prompt = (
+            "Eres un entrenador personal avanzado. Genera una sesión de entrenamiento personalizada "
+            "basada en el siguiente contexto:\n"
+            f"Usuario: {user_data}\n"
+            f"Análisis: {analysis}\n"
+            "Indica para cada ejercicio las series, repeticiones, descanso en segundos y grupo muscular."
+        )
+        plan = request_structured_output(ai_core.query_model, prompt, TrainingPlan, stream_fn=ai_core.stream_model)
+        return plan.model_dump()
+    except Exception as e:
+        raise RuntimeError(f"Error al generar el plan de entrenamiento con IA: {str(e)}")
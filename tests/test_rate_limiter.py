@@ -0,0 +1,75 @@
+"""
+Pruebas del middleware de limitación de peticiones (`modules/rate_limiter.py`).
+Usan una aplicación Starlette mínima, sin Firestore ni IA:
+
+    python -m pytest tests
+"""
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from modules.rate_limiter import MemoryRateLimitStore, RateLimiter, RateLimitMiddleware
+
+LIMITS = {
+    "/chat": {"user": [3, 60]},
+    "/chat/batch": {"user": [3, 60]},
+    "/history": {"user": [3, 60]},
+}
+
+
+async def echo(request: Request):
+    data = await request.json() if request.method == "POST" else {}
+    return JSONResponse({"user_id": data.get("user_id") or request.query_params.get("user_id")})
+
+
+def make_client():
+    app = Starlette(routes=[
+        Route("/chat", echo, methods=["POST"]),
+        Route("/chat/batch", echo, methods=["POST"]),
+        Route("/history", echo),
+    ])
+    limiter = RateLimiter(MemoryRateLimitStore(), LIMITS)
+    return TestClient(RateLimitMiddleware(app, limiter))
+
+
+def test_post_limits_body_user_and_ignores_query():
+    client = make_client()
+    statuses = [
+        client.post(f"/chat?user_id=rotating{i}", json={"user_id": "victim", "message": "hola"}).status_code
+        for i in range(4)
+    ]
+    assert statuses == [200, 200, 200, 429]
+
+
+def test_post_body_is_forwarded_to_the_handler():
+    client = make_client()
+    response = client.post("/chat?user_id=other", json={"user_id": "u1", "message": "hola"})
+    assert response.json() == {"user_id": "u1"}
+
+
+def test_get_limits_query_user():
+    client = make_client()
+    statuses = [client.get("/history?user_id=u1").status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    assert client.get("/history?user_id=u2").status_code == 200
+
+
+def test_batch_within_burst_is_charged_per_item():
+    client = make_client()
+    items = [{"user_id": "u1", "message": str(i)} for i in range(3)]
+    assert client.post("/chat/batch", json={"items": items}).status_code == 200
+    response = client.post("/chat/batch", json={"items": items[:1]})
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
+
+
+def test_batch_over_burst_is_rejected_as_invalid():
+    client = make_client()
+    items = [{"user_id": "u1", "message": str(i)} for i in range(4)]
+    response = client.post("/chat/batch", json={"items": items})
+    assert response.status_code == 400
+    assert "retry-after" not in response.headers
+    # El lote rechazado no consume el límite del usuario
+    assert client.post("/chat", json={"user_id": "u1", "message": "hola"}).status_code == 200
@@ -1,16 +1,15 @@
 from flask import Flask, request, jsonify
-from modules.openai_api import ask_Bwere
+from modules.chat_pipeline import run_chat_turn
 from modules.firebase_connection import init_firebase
 from flask_cors import CORS
+from modules.logging_config import configure_logging
+from modules.rate_limiter import RateLimiter, retry_after_header, user_ids_from_payload
+from modules.tracing import span
 import logging
 import re
 
-# Configurar logging
-logging.basicConfig(
-    filename='Bwere_api.log',
-    level=logging.DEBUG,  # Cambiado a DEBUG para registrar más detalles
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Configurar logging (cola en memoria + escritor en segundo plano, JSON con rotación)
+configure_logging()
 
 app = Flask(__name__)
 
@@ -20,6 +19,21 @@ CORS(app)
 # Inicializar Firebase al arrancar
 init_firebase()
 
+# Límites de frecuencia por usuario e IP (RATE_LIMITS, RATE_LIMIT_STORE)
+rate_limiter = RateLimiter()
+
+@app.before_request
+def apply_rate_limits():
+    user_ids = []
+    if rate_limiter.limits_users(request.path):
+        user_ids = user_ids_from_payload(request.get_json(silent=True))
+    allowed, retry_after = rate_limiter.check_request(request.path, request.remote_addr or "", user_ids)
+    if not allowed:
+        logging.warning(f"Límite de peticiones superado en {request.path}")
+        response = jsonify({"error": "Demasiadas peticiones. Inténtalo de nuevo más tarde."})
+        response.headers["Retry-After"] = retry_after_header(retry_after)
+        return response, 429
+
 def is_valid_user_id(user_id):
     """
     Verifica que el user_id sea válido.
@@ -52,9 +66,11 @@ def chat():
             return jsonify({"error": "El ID de usuario no es válido."}), 400
 
         # Obtener respuesta de Bwere con historial
-        response = ask_Bwere(user_id, user_message)
+        with span("http.chat", route="/chat", user_id=user_id, message_chars=len(user_message)) as current:
+            response = run_chat_turn(user_id, user_message)
+            current.set_attribute("response_chars", len(response))
 
-        logging.info(f"Respuesta generada para user_id={user_id}: {response}")
+        logging.info(f"Respuesta generada para user_id={user_id}: {response}", extra={"sample_key": "chat.reply"})
         return jsonify({"response": response})
 
     except ValueError as ve:
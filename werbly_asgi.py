@@ -0,0 +1,649 @@
+"""
+API asíncrona (ASGI) de Bwere.
+Ofrece el mismo contrato que `werbly_api.py` (rutas `/` y `/chat`) con manejadores asíncronos que esperan
+las lecturas y escrituras de Firestore y la llamada a la IA sin bloquear el bucle de eventos.
+Además, `/chat/batch` procesa varios mensajes (de uno o varios usuarios) en una sola petición, y
+`/users/{user_id}/history` y `/users/{user_id}/plans` son lecturas revalidables con ETag.
+`/ws/chat?user_id=...` mantiene una sesión WebSocket con el contexto en memoria y devuelve la respuesta por fragmentos.
+
+Ejecución en producción:
+    python werbly_asgi.py                      # uvicorn con WEB_CONCURRENCY workers (1 por defecto)
+    gunicorn -c gunicorn.conf.py werbly_asgi:app
+
+Los turnos por usuario y el control de admisión (`modules/request_control.py`) se coordinan dentro del proceso,
+así que el despliegue previsto es un único worker por instancia; con más, cada worker aplica sus propios límites.
+"""
+import os
+import re
+import time
+import signal
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import anyio
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from modules.firebase_connection import init_firebase
+from modules.ai_core import ModelStreamError
+from modules.chat_pipeline import (
+    load_chat_context, compose_chat_prompt, generate_reply, persist_turn, append_turn, persist_turns,
+    stream_reply, ChatSession
+)
+from modules.conversation_manager import get_conversation_page
+from modules.plan_store import get_plan_store
+from modules.compression import CompressionMiddleware
+from modules.http_cache import compute_etag, conditional_json_response
+from modules.logging_config import configure_logging, PER_PROCESS_LOG_FILE
+from modules.tracing import span
+from modules.request_control import AdmissionController, AdmissionRejected, KeyedSerializer
+from modules.rate_limiter import RateLimiter, RateLimitMiddleware, client_ip_from_scope, retry_after_header
+
+# Configurar logging (cola en memoria + escritor en segundo plano, JSON con rotación)
+configure_logging()
+
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", 30))
+BLOCKING_THREADS = int(os.getenv("BLOCKING_THREADS", 64))
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", 32))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", 128))
+CHAT_MAX_PENDING_PER_USER = int(os.getenv("CHAT_MAX_PENDING_PER_USER", 4))
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", 50))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", 8))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+HISTORY_MAX_PAGE_SIZE = 200
+# Expone la duración de cada etapa de /chat en la cabecera Server-Timing (usado por benchmarks/)
+EXPOSE_SERVER_TIMING = os.getenv("EXPOSE_SERVER_TIMING", "false").lower() == "true"
+WS_MAX_SESSIONS = int(os.getenv("WS_MAX_SESSIONS", 500))
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", 20))
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 64))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 10))
+
+
+class InFlightTracker:
+    """
+    Lleva la cuenta de las peticiones HTTP y de los turnos WebSocket en curso para poder drenarlos al apagar
+    el servidor.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._drain_started = asyncio.Event()
+        self._shutdown_task = None
+
+    def enter(self):
+        self.count += 1
+        self._idle.clear()
+
+    def exit(self):
+        self.count -= 1
+        if self.count == 0:
+            self._idle.set()
+
+    async def wait_draining(self):
+        """
+        Espera hasta que empiece el drenaje (las sesiones WebSocket lo usan para cerrarse con 1012).
+        """
+        await self._drain_started.wait()
+
+    def drain_on_signals(self, timeout: float):
+        """
+        Empieza a drenar en cuanto llega SIGTERM o SIGINT: las peticiones que aún entren por conexiones abiertas
+        reciben 503 y las sesiones WebSocket terminan su turno y se cierran con 1012. El manejador que ya instaló
+        el servidor (uvicorn o el worker de gunicorn) se llama después, cuando ya no queda nada en curso (o tras
+        `timeout` segundos), porque al apagarse uvicorn corta las conexiones WebSocket abiertas. Una segunda
+        señal se pasa al servidor de inmediato. Debe llamarse desde el hilo principal con el servidor ya arrancado.
+
+        :param timeout: Tiempo máximo de espera en segundos antes de ceder el apagado al servidor.
+        """
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+            if not callable(previous):
+                continue
+
+            def handler(signum, frame, previous=previous):
+                if self.draining:
+                    previous(signum, frame)
+                    return
+                self.draining = True
+                loop.call_soon_threadsafe(self._drain_then_stop, previous, signum, timeout)
+
+            try:
+                signal.signal(sig, handler)
+            except ValueError:
+                return  # Servidor en un hilo secundario (benchmarks): no gestiona señales
+
+    def _drain_then_stop(self, stop, signum: int, timeout: float):
+        async def drain_then_stop():
+            await self.drain(timeout)
+            stop(signum, None)
+
+        self._shutdown_task = asyncio.ensure_future(drain_then_stop())
+
+    async def drain(self, timeout: float):
+        """
+        Deja de aceptar peticiones y espera a que terminen las que están en curso.
+
+        :param timeout: Tiempo máximo de espera en segundos.
+        """
+        self.draining = True
+        self._drain_started.set()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            logging.info("Todas las peticiones en curso finalizaron antes del apagado.")
+        except asyncio.TimeoutError:
+            logging.warning(f"Apagado con {self.count} peticiones aún en curso tras {timeout}s.")
+
+
+class StageTimer:
+    """
+    Mide la duración de las etapas consecutivas de una petición.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def header(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages)
+
+
+class InFlightMiddleware:
+    """
+    Middleware ASGI que registra cada petición HTTP en el `InFlightTracker`.
+    Durante el apagado, las peticiones nuevas se rechazan con 503.
+    """
+
+    def __init__(self, app, tracker: InFlightTracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.tracker.draining:
+            response = JSONResponse({"error": "El servidor se está reiniciando."}, status_code=503, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+
+        self.tracker.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.exit()
+
+
+class ChatSocket:
+    """
+    Conversación de un usuario sobre WebSocket.
+
+    - El contexto (`ChatSession`) se carga al conectar y cada mensaje solo añade su turno.
+    - Los fragmentos de la respuesta pasan por una cola de envío acotada: si el cliente no la vacía
+      en `WS_SEND_TIMEOUT_SECONDS`, se cierra la conexión en lugar de acumular memoria.
+    - Un latido periódico (`ping`) detecta clientes desconectados.
+    - Cada mensaje consume el límite de frecuencia de `/chat` del usuario y de la IP, igual que un turno HTTP.
+    - Cada turno cuenta como una petición en curso (`in_flight`). Al apagar el servidor se termina el turno
+      en curso, se devuelven como error los mensajes pendientes y la sesión se cierra con 1012.
+
+    Mensajes del cliente: {"type": "message", "message": "..."} y {"type": "pong"}.
+    Mensajes del servidor: "ready", "token" (delta), "done" (respuesta completa), "error" y "ping".
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.client_ip = client_ip_from_scope(websocket.scope)
+        self.session = ChatSession(user_id)
+        self.outbox = asyncio.Queue(WS_SEND_QUEUE_SIZE)
+        self.inbox = asyncio.Queue(CHAT_MAX_PENDING_PER_USER)
+        self.closed = False
+        self.close_code = 1000
+        self.last_seen = time.monotonic()
+
+    async def enqueue(self, frame: dict):
+        """
+        Encola un mensaje para el cliente esperando como máximo `WS_SEND_TIMEOUT_SECONDS` si la cola está llena.
+        """
+        if self.closed:
+            raise ConnectionError("La conexión WebSocket está cerrada.")
+        try:
+            await asyncio.wait_for(self.outbox.put(frame), WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.close_code = 1008
+            raise ConnectionError("El cliente no consume los mensajes a tiempo.")
+
+    async def run(self):
+        await run_in_threadpool(self.session.refresh)
+        await self.enqueue({"type": "ready"})
+        tasks = [asyncio.ensure_future(task) for task in (self._sender(), self._receiver(), self._worker(), self._heartbeat())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.closed = True
+            for task in tasks:
+                task.cancel()
+            # Vaciar la cola libera al hilo de streaming si estaba esperando hueco
+            while not self.outbox.empty():
+                self.outbox.get_nowait()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _sender(self):
+        while True:
+            frame = await self.outbox.get()
+            await self.websocket.send_json(frame)
+            self.outbox.task_done()
+
+    async def _receiver(self):
+        while True:
+            try:
+                data = await self.websocket.receive_json()
+            except WebSocketDisconnect:
+                return
+            except ValueError:
+                await self.enqueue({"type": "error", "error": "Mensaje JSON inválido."})
+                continue
+            self.last_seen = time.monotonic()
+            if not isinstance(data, dict) or data.get("type") == "pong":
+                continue
+            user_message = data.get("message", "")
+            if data.get("type") != "message" or not user_message or not isinstance(user_message, str):
+                await self.enqueue({"type": "error", "error": "No se proporcionó el mensaje."})
+            elif self.inbox.full():
+                await self.enqueue({"type": "error", "error": "Demasiados mensajes pendientes.", "message": user_message})
+            else:
+                allowed, retry_after = await rate_limiter.check_request_async("/chat", self.client_ip, [self.user_id])
+                if not allowed:
+                    await self.enqueue({
+                        "type": "error", "error": "Demasiadas peticiones. Inténtalo de nuevo más tarde.",
+                        "retry_after": int(retry_after_header(retry_after)), "message": user_message,
+                    })
+                    continue
+                self.inbox.put_nowait(user_message)
+
+    async def _next_message(self):
+        """
+        Siguiente mensaje pendiente, o None si el servidor empezó a drenar.
+        """
+        if in_flight.draining:
+            return None
+        message = asyncio.ensure_future(self.inbox.get())
+        draining = asyncio.ensure_future(in_flight.wait_draining())
+        await asyncio.wait((message, draining), return_when=asyncio.FIRST_COMPLETED)
+        draining.cancel()
+        if message.done():
+            return message.result()
+        message.cancel()
+        return None
+
+    async def _close_for_restart(self):
+        while not self.inbox.empty():
+            await self.enqueue({"type": "error", "error": "El servidor se está reiniciando.", "message": self.inbox.get_nowait()})
+        # Los mensajes ya encolados (la última respuesta incluida) se envían antes de cerrar
+        try:
+            await asyncio.wait_for(self.outbox.join(), WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        # 1012: el servicio se reinicia; el cliente puede reconectarse
+        self.close_code = 1012
+
+    async def _worker(self):
+        while True:
+            user_message = await self._next_message()
+            if user_message is None:
+                await self._close_for_restart()
+                return
+            in_flight.enter()
+            try:
+                async with user_turns.hold(self.user_id), admission.admit():
+                    if self.session.is_stale():
+                        await run_in_threadpool(self.session.refresh)
+                    prompt = self.session.compose(user_message)
+                    response = await anyio.to_thread.run_sync(self._stream, prompt)
+                    await run_in_threadpool(persist_turn, self.user_id, user_message, response)
+                self.session.record(user_message, response)
+                await self.enqueue({"type": "done", "response": response})
+            except AdmissionRejected as ar:
+                await self.enqueue({"type": "error", "error": "Demasiadas peticiones. Inténtalo de nuevo más tarde.", "retry_after": ar.retry_after})
+            except ModelStreamError as e:
+                # Los fragmentos enviados no forman una respuesta: el turno no se guarda y el cliente puede reenviarlo
+                logging.error(f"Respuesta interrumpida en la sesión WebSocket de user_id={self.user_id}: {e}")
+                await self.enqueue({"type": "error", "error": "No se pudo generar la respuesta. Inténtalo de nuevo.", "message": user_message})
+            except ConnectionError:
+                return
+            except Exception as e:
+                logging.error(f"Error en la sesión WebSocket de user_id={self.user_id}: {e}", exc_info=True)
+                await self.enqueue({"type": "error", "error": "Ocurrió un error interno al procesar tu mensaje."})
+            finally:
+                in_flight.exit()
+
+    def _stream(self, prompt: str) -> str:
+        # Se ejecuta en un hilo: cada fragmento espera hueco en la cola de envío (contrapresión hacia el modelo)
+        chunks = []
+        for delta in stream_reply(prompt):
+            chunks.append(delta)
+            anyio.from_thread.run(self.enqueue, {"type": "token", "delta": delta})
+        return "".join(chunks)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_SECONDS)
+            if time.monotonic() - self.last_seen > 2 * WS_HEARTBEAT_SECONDS and self.inbox.empty():
+                logging.info(f"Sesión WebSocket de user_id={self.user_id} cerrada por inactividad del cliente.")
+                self.close_code = 1001
+                return
+            if not self.outbox.full():
+                self.outbox.put_nowait({"type": "ping"})
+
+
+in_flight = InFlightTracker()
+# Turnos en orden por usuario y límite global de conversaciones simultáneas
+user_turns = KeyedSerializer(CHAT_MAX_PENDING_PER_USER)
+admission = AdmissionController(CHAT_MAX_IN_FLIGHT, CHAT_MAX_QUEUE)
+# Sesiones WebSocket abiertas en este proceso
+ws_sessions = {"active": 0}
+# Límites de frecuencia por usuario e IP (RATE_LIMITS, RATE_LIMIT_STORE)
+rate_limiter = RateLimiter()
+
+
+def is_valid_user_id(user_id):
+    """
+    Verifica que el user_id sea válido.
+    - Debe ser alfanumérico.
+    - No debe contener caracteres especiales.
+    """
+    return isinstance(user_id, str) and bool(re.match(r"^[a-zA-Z0-9_-]+$", user_id))
+
+
+async def index(request: Request):
+    return PlainTextResponse("¡Bienvenido a la API de Bwere!")
+
+
+async def metrics(request: Request):
+    return JSONResponse({
+        "chat": {**admission.metrics(), "user_queue_depth": user_turns.waiting()},
+        "in_flight_requests": in_flight.count,
+        "websocket_sessions": ws_sessions["active"],
+    })
+
+
+async def chat(request: Request):
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not data or not isinstance(data, dict):
+            logging.warning("Solicitud sin datos proporcionados.")
+            return JSONResponse({"error": "No se proporcionaron datos en la solicitud."}, status_code=400)
+
+        user_id = data.get("user_id", "")
+        user_message = data.get("message", "")
+
+        if not user_id or not user_message:
+            logging.warning(f"Datos incompletos: user_id={user_id}")
+            return JSONResponse({"error": "No se proporcionó el ID de usuario o el mensaje."}, status_code=400)
+
+        if not is_valid_user_id(user_id):
+            logging.warning(f"Intento de uso con ID de usuario inválido: {user_id}")
+            return JSONResponse({"error": "El ID de usuario no es válido."}, status_code=400)
+
+        # Un turno a la vez por usuario y, después, un hueco en el límite global.
+        # Cada paso bloqueante (Firestore, IA) se espera en el pool de hilos.
+        timings = StageTimer()
+        with span("http.chat", route="/chat", user_id=user_id, message_chars=len(user_message)) as current:
+            async with user_turns.hold(user_id), admission.admit():
+                timings.mark("queue")
+                context = await run_in_threadpool(load_chat_context, user_id)
+                timings.mark("context")
+                prompt = compose_chat_prompt(context, user_message)
+                timings.mark("prompt")
+                response = await run_in_threadpool(generate_reply, prompt)
+                timings.mark("llm")
+                await run_in_threadpool(persist_turn, user_id, user_message, response)
+                timings.mark("persist")
+            current.set_attributes({"response_chars": len(response), "queue_ms": round(timings.stages[0][1] * 1000, 2)})
+
+        logging.info(f"Respuesta generada para user_id={user_id} ({len(response)} caracteres)", extra={"sample_key": "chat.reply"})
+        headers = {"Server-Timing": timings.header()} if EXPOSE_SERVER_TIMING else None
+        return JSONResponse({"response": response}, headers=headers)
+
+    except AdmissionRejected as ar:
+        logging.warning(f"Petición rechazada por saturación: {ar}")
+        return JSONResponse(
+            {"error": "Demasiadas peticiones. Inténtalo de nuevo más tarde."},
+            status_code=429,
+            headers={"Retry-After": str(ar.retry_after)},
+        )
+    except ValueError as ve:
+        logging.error(f"Error de valor: {ve}", exc_info=True)
+        return JSONResponse({"error": "Datos inválidos enviados."}, status_code=400)
+    except Exception as e:
+        logging.critical(f"Error inesperado en la ruta /chat: {e}", exc_info=True)
+        return JSONResponse({"error": "Ocurrió un error interno al procesar tu mensaje."}, status_code=500)
+
+
+def _item_error(user_id, message: str, status: int, **extra):
+    return {"user_id": user_id, "error": message, "status": status, **extra}
+
+
+async def _run_user_batch(user_id: str, entries, slots: asyncio.Semaphore, results: list):
+    """
+    Procesa en orden los mensajes de un usuario dentro de un lote. El contexto se carga una sola vez,
+    cada respuesta se añade al historial en memoria y todos los turnos se guardan con una escritura por lotes.
+    Las respuestas vacías se devuelven como error del elemento y no se guardan. Si falla el guardado, las
+    respuestas se devuelven igualmente marcadas con `"saved": false`.
+
+    :param user_id: Identificador del usuario.
+    :param entries: Lista de tuplas (posición en el lote, mensaje).
+    :param slots: Semáforo que limita los usuarios procesados a la vez.
+    :param results: Lista de resultados del lote, indexada por posición.
+    """
+    async with slots:
+        try:
+            async with user_turns.hold(user_id):
+                context = await run_in_threadpool(load_chat_context, user_id)
+                turns = []
+                answered = []
+                for index, user_message in entries:
+                    try:
+                        async with admission.admit():
+                            prompt = compose_chat_prompt(context, user_message)
+                            response = await run_in_threadpool(generate_reply, prompt)
+                    except AdmissionRejected as ar:
+                        results[index] = _item_error(user_id, "Demasiadas peticiones. Inténtalo de nuevo más tarde.", 429, retry_after=ar.retry_after)
+                        continue
+                    except Exception as e:
+                        logging.error(f"Error al generar la respuesta del lote para user_id={user_id}: {e}", exc_info=True)
+                        results[index] = _item_error(user_id, "Ocurrió un error interno al procesar tu mensaje.", 500)
+                        continue
+                    if not response or not response.strip():
+                        logging.warning(f"Respuesta vacía en el lote para user_id={user_id}")
+                        results[index] = _item_error(user_id, "No se pudo generar una respuesta.", 502)
+                        continue
+                    append_turn(context, user_message, response)
+                    turns.append((user_message, response))
+                    answered.append(index)
+                    results[index] = {"user_id": user_id, "response": response}
+
+                if turns:
+                    try:
+                        await run_in_threadpool(persist_turns, user_id, turns)
+                    except Exception as e:
+                        # Las respuestas ya generadas se devuelven aunque no hayan quedado en el historial
+                        logging.error(f"Error al guardar los turnos del lote para user_id={user_id}: {e}", exc_info=True)
+                        for index in answered:
+                            results[index]["saved"] = False
+        except AdmissionRejected as ar:
+            for index, _ in entries:
+                results[index] = _item_error(user_id, "Demasiadas peticiones. Inténtalo de nuevo más tarde.", 429, retry_after=ar.retry_after)
+        except Exception as e:
+            logging.error(f"Error inesperado en el lote para user_id={user_id}: {e}", exc_info=True)
+            for index, _ in entries:
+                if results[index] is None:
+                    results[index] = _item_error(user_id, "Ocurrió un error interno al procesar tu mensaje.", 500)
+
+
+async def chat_batch(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    items = data.get("items") if isinstance(data, dict) else data
+    if not items or not isinstance(items, list):
+        logging.warning("Solicitud de lote sin elementos.")
+        return JSONResponse({"error": "Se esperaba una lista de mensajes con user_id y message."}, status_code=400)
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        return JSONResponse({"error": f"El lote admite como máximo {CHAT_BATCH_MAX_ITEMS} mensajes."}, status_code=400)
+
+    # Validar cada elemento y agrupar los mensajes por usuario conservando su orden
+    results = [None] * len(items)
+    by_user = {}
+    for index, item in enumerate(items):
+        user_id = item.get("user_id", "") if isinstance(item, dict) else ""
+        user_message = item.get("message", "") if isinstance(item, dict) else ""
+        if not user_id or not user_message:
+            results[index] = _item_error(user_id or None, "No se proporcionó el ID de usuario o el mensaje.", 400)
+        elif not is_valid_user_id(user_id):
+            results[index] = _item_error(None, "El ID de usuario no es válido.", 400)
+        else:
+            by_user.setdefault(user_id, []).append((index, user_message))
+
+    slots = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+    await asyncio.gather(*(_run_user_batch(user_id, entries, slots, results) for user_id, entries in by_user.items()))
+
+    failed = sum(1 for result in results if "error" in result)
+    logging.info(f"Lote procesado: {len(results)} mensajes de {len(by_user)} usuarios ({failed} con error)")
+    return JSONResponse({"results": results})
+
+
+async def user_history(request: Request):
+    user_id = request.path_params["user_id"]
+    if not is_valid_user_id(user_id):
+        return JSONResponse({"error": "El ID de usuario no es válido."}, status_code=400)
+    try:
+        limit = min(int(request.query_params.get("limit", HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+        before = request.query_params.get("before")
+        if limit < 1:
+            raise ValueError("limit debe ser positivo")
+        page = await run_in_threadpool(get_conversation_page, user_id, limit, before)
+    except ValueError:
+        return JSONResponse({"error": "Parámetros de paginación inválidos."}, status_code=400)
+    except Exception as e:
+        logging.error(f"Error al obtener el historial de user_id={user_id}: {e}", exc_info=True)
+        return JSONResponse({"error": "Ocurrió un error interno al obtener el historial."}, status_code=500)
+
+    etag = compute_etag(user_id, limit, before, [(m["id"], m.pop("updated_at")) for m in page["messages"]])
+    return conditional_json_response(request, page, etag)
+
+
+async def user_plans(request: Request):
+    user_id = request.path_params["user_id"]
+    if not is_valid_user_id(user_id):
+        return JSONResponse({"error": "El ID de usuario no es válido."}, status_code=400)
+    try:
+        entries = await run_in_threadpool(get_plan_store().list_plans, user_id)
+    except Exception as e:
+        logging.error(f"Error al obtener los planes de user_id={user_id}: {e}", exc_info=True)
+        return JSONResponse({"error": "Ocurrió un error interno al obtener los planes."}, status_code=500)
+
+    plans = {
+        plan_type: {"plan": entry.get("plan"), "updated_at": str(entry.get("updated_at"))}
+        for plan_type, entry in sorted(entries.items())
+    }
+    etag = compute_etag(user_id, [(plan_type, plan["updated_at"]) for plan_type, plan in plans.items()])
+    return conditional_json_response(request, {"plans": plans}, etag)
+
+
+async def chat_socket(websocket: WebSocket):
+    user_id = websocket.query_params.get("user_id", "")
+    await websocket.accept()
+    if not is_valid_user_id(user_id):
+        await websocket.close(code=1008, reason="El ID de usuario no es válido.")
+        return
+    if in_flight.draining:
+        # 1012: el servicio se reinicia
+        await websocket.close(code=1012, reason="El servidor se está reiniciando.")
+        return
+    if ws_sessions["active"] >= WS_MAX_SESSIONS:
+        # 1013: inténtalo de nuevo más tarde
+        await websocket.close(code=1013, reason="Demasiadas sesiones abiertas.")
+        return
+
+    ws_sessions["active"] += 1
+    chat_session = ChatSocket(websocket, user_id)
+    try:
+        await chat_session.run()
+    except Exception as e:
+        logging.error(f"Error inesperado en /ws/chat para user_id={user_id}: {e}", exc_info=True)
+        chat_session.close_code = 1011
+    finally:
+        ws_sessions["active"] -= 1
+        try:
+            await websocket.close(code=chat_session.close_code)
+        except RuntimeError:
+            pass  # El cliente ya cerró la conexión
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Inicializar Firebase al arrancar y ampliar el pool de hilos para las llamadas bloqueantes
+    await run_in_threadpool(init_firebase)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = BLOCKING_THREADS
+    in_flight.drain_on_signals(SHUTDOWN_GRACE_SECONDS)
+    yield
+    await in_flight.drain(SHUTDOWN_GRACE_SECONDS)
+
+
+routes = [
+    Route("/", index),
+    Route("/chat", chat, methods=["POST"]),
+    Route("/chat/batch", chat_batch, methods=["POST"]),
+    Route("/users/{user_id}/history", user_history),
+    Route("/users/{user_id}/plans", user_plans),
+    Route("/metrics", metrics),
+    WebSocketRoute("/ws/chat", chat_socket),
+]
+
+middleware = [
+    Middleware(InFlightMiddleware, tracker=in_flight),
+    Middleware(RateLimitMiddleware, limiter=rate_limiter),
+    Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], expose_headers=["ETag"]),
+    Middleware(CompressionMiddleware),
+]
+
+app = Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    # Un único proceso de trabajo por defecto (ver modules/request_control.py). Con WEB_CONCURRENCY > 1,
+    # cada worker escribe en su propio archivo de log
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        logging.warning(f"{workers} workers: el orden por usuario y la admisión de /chat solo se aplican dentro de cada proceso.")
+        os.environ.setdefault("LOG_FILE", PER_PROCESS_LOG_FILE)
+    uvicorn.run(
+        "werbly_asgi:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 8000)),
+        workers=workers,
+        timeout_graceful_shutdown=int(SHUTDOWN_GRACE_SECONDS),
+        log_level="info",
+    )